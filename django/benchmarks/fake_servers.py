@@ -0,0 +1,239 @@
+"""
+Local stand-ins for the OpenAI-compatible LLM API and the Google Vision REST API, for load testing.
+
+    python -m benchmarks.fake_servers --llm-port 8001 --vision-port 8002 --latency-median 1.5 --error-rate 0.02
+
+Point the app at them with
+    LEARNJP_TRANSLATION_PROVIDER_URL=http://127.0.0.1:8001/v1
+    LEARNJP_VISION_API_ENDPOINT=http://127.0.0.1:8002
+
+The LLM server answers translation prompts with a fake translation and analysis prompts with a schema-valid
+analysis built from the input text. It supports "stream": true (server-sent events) and simulates latency
+(lognormal around a median) and errors (HTTP 500/429). The Vision server returns the uploaded image bytes,
+decoded as UTF-8, as the detected text, so a load driver can choose the OCR result by choosing the upload.
+Uploaded "PDFs" are read the same way, with pages separated by form feeds.
+"""
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import NamedTuple
+import argparse
+import base64
+import json
+import math
+import random
+import threading
+import time
+
+class LatencyProfile(NamedTuple):
+    median: float = 0.5
+    sigma: float = 0.5
+    error_rate: float = 0.0
+    # time to the first streamed chunk, as a fraction of the total latency
+    first_token_fraction: float = 0.2
+
+    def sample(self) -> float:
+        if self.median <= 0:
+            return 0.0
+        return random.lognormvariate(math.log(self.median), self.sigma)
+
+
+def fake_analysis(jp_text: str) -> str:
+    """A schema-valid analysis: one bunsetsu per few characters, one morpheme per bunsetsu."""
+    text = ''.join(jp_text.split()) or '空'
+    phrases = [text[i:i + 4] for i in range(0, len(text), 4)]
+    return json.dumps({
+        'create_datetime': datetime.now(timezone.utc).isoformat(),
+        'bunsetsu_breakdown': [
+            {
+                'index': index,
+                'japanese_phrase': phrase,
+                'english_translation': f'phrase {index}',
+                'morphological_analysis': [{
+                    'token_id': 1,
+                    'surface_form': phrase,
+                    'base_form': phrase,
+                    'POS': 'Noun',
+                    'english_explanation': f'meaning of {phrase}',
+                    'romaji': 'romaji',
+                }],
+            }
+            for index, phrase in enumerate(phrases, start=1)
+        ],
+    }, ensure_ascii=False, indent=2)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    profile = LatencyProfile()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def _send_json(self, status: int, body: dict):
+        payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _maybe_fail(self, latency: float) -> bool:
+        if random.random() >= self.profile.error_rate:
+            return False
+        time.sleep(latency / 4)
+        status = random.choice([429, 500])
+        self._send_json(status, {'error': {'message': 'simulated upstream error', 'code': status}})
+        return True
+
+
+class FakeLLMHandler(_Handler):
+
+    def do_POST(self):
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json(404, {'error': {'message': 'not found'}})
+            return
+
+        request = self._read_json()
+        latency = self.profile.sample()
+        if self._maybe_fail(latency):
+            return
+
+        messages = request.get('messages', [])
+        system_prompt = next((m['content'] for m in messages if m['role'] == 'system'), '')
+        user_prompt = next((m['content'] for m in messages if m['role'] == 'user'), '')
+        if '"translations"' in system_prompt:
+            texts = json.loads(user_prompt)['texts']
+            content = json.dumps({'translations': [
+                {'id': text['id'], 'english': f"Fake translation of {text['japanese']}"} for text in texts
+            ]}, ensure_ascii=False)
+        elif 'Bunsetsu' in system_prompt:
+            if 'Break down only' in system_prompt:
+                user_prompt = json.loads(user_prompt)['text']
+            content = fake_analysis(user_prompt)
+            if 'translate the whole' in system_prompt:
+                # combined translation and analysis
+                analysis = json.loads(content)
+                analysis['english_translation'] = f'Fake translation of {user_prompt}'
+                content = json.dumps(analysis, ensure_ascii=False)
+        else:
+            content = f'Fake translation of {user_prompt}'
+
+        usage = {
+            'prompt_tokens': len(system_prompt) // 4 + len(user_prompt),
+            'completion_tokens': len(content) // 4,
+            'total_tokens': len(system_prompt) // 4 + len(user_prompt) + len(content) // 4,
+        }
+        model = request.get('model', 'fake-model')
+
+        if request.get('stream'):
+            self._stream(model, content, latency)
+            return
+
+        time.sleep(latency)
+        self._send_json(200, {
+            'id': 'chatcmpl-fake',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': model,
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+            'usage': usage,
+        })
+
+    def _stream(self, model: str, content: str, latency: float):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+
+        chunks = [content[i:i + 20] for i in range(0, len(content), 20)] or ['']
+        time.sleep(latency * self.profile.first_token_fraction)
+        interval = latency * (1 - self.profile.first_token_fraction) / len(chunks)
+        for chunk in chunks:
+            event = {
+                'id': 'chatcmpl-fake',
+                'object': 'chat.completion.chunk',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [{'index': 0, 'delta': {'content': chunk}, 'finish_reason': None}],
+            }
+            self.wfile.write(f'data: {json.dumps(event, ensure_ascii=False)}\n\n'.encode('utf-8'))
+            self.wfile.flush()
+            time.sleep(interval)
+        self.wfile.write(b'data: [DONE]\n\n')
+        self.close_connection = True
+
+
+class FakeVisionHandler(_Handler):
+
+    def do_POST(self):
+        if not self.path.startswith(('/v1/images:annotate', '/v1/files:annotate')):
+            self._send_json(404, {'error': {'message': 'not found'}})
+            return
+
+        request = self._read_json()
+        latency = self.profile.sample()
+        if self._maybe_fail(latency):
+            return
+        time.sleep(latency)
+
+        if self.path.startswith('/v1/files:annotate'):
+            self._send_json(200, {'responses': [self._annotate_file(file_request) for file_request in request.get('requests', [])]})
+            return
+
+        responses = []
+        for image_request in request.get('requests', []):
+            content = base64.b64decode(image_request.get('image', {}).get('content', ''))
+            text = content.decode('utf-8', errors='ignore').strip()
+            responses.append({'textAnnotations': [{'description': text}]} if text else {})
+        self._send_json(200, {'responses': responses})
+
+    def _annotate_file(self, file_request: dict) -> dict:
+        # a fake "PDF" is UTF-8 text with pages separated by form feeds
+        content = base64.b64decode(file_request.get('inputConfig', {}).get('content', ''))
+        pages = content.decode('utf-8', errors='ignore').split('\f')
+        page_numbers = [int(page) for page in file_request.get('pages', [])] or list(range(1, min(len(pages), 5) + 1))
+        return {
+            'responses': [
+                {'fullTextAnnotation': {'text': pages[number - 1].strip()}, 'context': {'pageNumber': number}}
+                for number in page_numbers if number <= len(pages)
+            ],
+            'totalPages': len(pages),
+        }
+
+
+def start_server(handler_class, port: int, profile: LatencyProfile, host: str = '127.0.0.1') -> ThreadingHTTPServer:
+    """Start a fake server in a background thread. Port 0 picks a free port (see server.server_address)."""
+    handler = type(handler_class.__name__, (handler_class,), {'profile': profile})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name=handler_class.__name__, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--llm-port', type=int, default=8001)
+    parser.add_argument('--vision-port', type=int, default=8002)
+    parser.add_argument('--latency-median', type=float, default=1.0, help='Median LLM latency in seconds')
+    parser.add_argument('--latency-sigma', type=float, default=0.5, help='Lognormal sigma of the LLM latency')
+    parser.add_argument('--vision-latency-median', type=float, default=0.5)
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests that fail')
+    args = parser.parse_args()
+
+    llm = start_server(FakeLLMHandler, args.llm_port, LatencyProfile(args.latency_median, args.latency_sigma, args.error_rate))
+    vision = start_server(FakeVisionHandler, args.vision_port, LatencyProfile(args.vision_latency_median, args.latency_sigma, args.error_rate))
+    print(f'Fake LLM API on http://127.0.0.1:{llm.server_address[1]}/v1')
+    print(f'Fake Vision API on http://127.0.0.1:{vision.server_address[1]}')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,274 @@
+"""
+Load test the app under gunicorn (WSGI) and/or uvicorn (ASGI) against the fake upstream servers.
+
+    python -m benchmarks.load_test --servers gunicorn uvicorn --workers 1 4 --concurrency 1 8 32 --requests 300
+
+A fresh app server is started for every (server, workers, concurrency) combination, so every run starts with
+an empty cache. Each request posts one of --unique-texts texts (or uploads it as an "image" with --image-ratio)
+and, with --analyze, then fetches its analysis. Reports requests per second, p50/p95/p99 latency, errors and
+the cache hit rate read from /metrics.
+"""
+from benchmarks.fake_servers import FakeLLMHandler, FakeVisionHandler, LatencyProfile, start_server
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import CookieJar
+import argparse
+import json
+import os
+import random
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CSRF_PATTERN = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+KEY_PATTERN = re.compile(r'id="key" value="([^"]*)"')
+SAMPLE_PHRASES = ['今日はいい天気です', '駅はどこですか', '日本語を勉強しています', '春の海ひねもすのたりのたりかな',
+                  'ありがとうございました', '明日は雨が降るでしょう', '猫が窓の外を見ている', '東京に住んでいます']
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def make_texts(count: int) -> list[str]:
+    return [f'{random.choice(SAMPLE_PHRASES)}{i}' for i in range(count)]
+
+
+class AppServer:
+    """Runs the app under gunicorn or uvicorn in a subprocess, pointed at the fake upstream servers."""
+
+    def __init__(self, server: str, workers: int, threads: int, env: dict):
+        self.port = free_port()
+        self.base_url = f'http://127.0.0.1:{self.port}'
+        if server == 'gunicorn':
+            command = [sys.executable, '-m', 'gunicorn', 'config.wsgi:application', '--bind', f'127.0.0.1:{self.port}',
+                       '--workers', str(workers), '--threads', str(threads), '--timeout', '120']
+        elif server == 'uvicorn':
+            command = [sys.executable, '-m', 'uvicorn', 'config.asgi:application', '--host', '127.0.0.1',
+                       '--port', str(self.port), '--workers', str(workers), '--log-level', 'warning']
+        else:
+            raise ValueError(f'Unknown server {server}')
+        self.process = subprocess.Popen(command, cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def wait_ready(self, timeout: float = 30.0):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError('App server exited during startup')
+            try:
+                with urllib.request.urlopen(self.base_url + '/', timeout=2) as response:
+                    if response.status == 200:
+                        return
+            except (urllib.error.URLError, ConnectionError, OSError):
+                time.sleep(0.2)
+        raise RuntimeError('App server did not start in time')
+
+    def stop(self):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+class Session:
+    """One simulated user: keeps the CSRF cookie and posts texts or images."""
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()))
+        with self.opener.open(base_url + '/', timeout=30) as response:
+            self.csrf_token = CSRF_PATTERN.search(response.read().decode('utf-8')).group(1)
+
+    def _post(self, body: bytes, content_type: str) -> tuple[int, str]:
+        request = urllib.request.Request(self.base_url + '/', data=body, method='POST', headers={
+            'Content-Type': content_type, 'Referer': self.base_url + '/',
+        })
+        try:
+            with self.opener.open(request, timeout=120) as response:
+                return response.status, response.read().decode('utf-8')
+        except urllib.error.HTTPError as e:
+            return e.code, ''
+
+    def post_text(self, jp_text: str) -> tuple[int, str]:
+        body = urllib.parse.urlencode({'csrfmiddlewaretoken': self.csrf_token, 'jp_text': jp_text}).encode('utf-8')
+        return self._post(body, 'application/x-www-form-urlencoded')
+
+    def post_image(self, jp_text: str) -> tuple[int, str]:
+        # the fake Vision server returns the uploaded bytes as the detected text
+        boundary = uuid.uuid4().hex
+        body = (
+            f'--{boundary}\r\nContent-Disposition: form-data; name="csrfmiddlewaretoken"\r\n\r\n{self.csrf_token}\r\n'
+            f'--{boundary}\r\nContent-Disposition: form-data; name="image_file"; filename="page.jpg"\r\n'
+            f'Content-Type: image/jpeg\r\n\r\n{jp_text}\r\n--{boundary}--\r\n'
+        ).encode('utf-8')
+        return self._post(body, f'multipart/form-data; boundary={boundary}')
+
+    def analyze(self, key: str) -> int:
+        try:
+            with self.opener.open(f'{self.base_url}/analyze/?key={key}', timeout=120) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+
+def read_hit_rates(base_url: str) -> dict:
+    with urllib.request.urlopen(base_url + '/metrics', timeout=10) as response:
+        content = response.read().decode('utf-8')
+
+    counts = {}
+    for cache, result, value in re.findall(r'learnjp_cache_lookups_total\{cache="(\w+)",result="(\w+)"\} ([\d.]+)', content):
+        counts[(cache, result)] = float(value)
+    rates = {}
+    for cache in ('translation', 'analysis'):
+        hits, misses = counts.get((cache, 'hit'), 0), counts.get((cache, 'miss'), 0)
+        rates[cache] = hits / (hits + misses) if hits + misses else None
+    return rates
+
+
+def run_load(base_url: str, texts: list[str], requests: int, concurrency: int, image_ratio: float, analyze: bool) -> dict:
+    latencies, analysis_latencies = [], []
+    errors = 0
+    lock = threading.Lock()
+    counter = iter(range(requests))
+    counter_lock = threading.Lock()
+
+    def user():
+        nonlocal errors
+        session = Session(base_url)
+        while True:
+            with counter_lock:
+                if next(counter, None) is None:
+                    return
+            jp_text = random.choice(texts)
+            start_time = time.perf_counter()
+            if random.random() < image_ratio:
+                status, html = session.post_image(jp_text)
+            else:
+                status, html = session.post_text(jp_text)
+            elapsed = time.perf_counter() - start_time
+            match = KEY_PATTERN.search(html)
+
+            analysis_elapsed, analysis_status = None, 200
+            if analyze and match:
+                start_time = time.perf_counter()
+                analysis_status = session.analyze(match.group(1))
+                analysis_elapsed = time.perf_counter() - start_time
+
+            with lock:
+                latencies.append(elapsed)
+                if analysis_elapsed is not None:
+                    analysis_latencies.append(analysis_elapsed)
+                if status != 200 or not match or analysis_status != 200:
+                    errors += 1
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in [executor.submit(user) for _ in range(concurrency)]:
+            future.result()
+    duration = time.perf_counter() - start_time
+
+    return {
+        'requests': len(latencies),
+        'duration': duration,
+        'rps': len(latencies) / duration if duration else 0.0,
+        'p50': percentile(latencies, 0.50),
+        'p95': percentile(latencies, 0.95),
+        'p99': percentile(latencies, 0.99),
+        'mean': statistics.fmean(latencies) if latencies else 0.0,
+        'analysis_p50': percentile(analysis_latencies, 0.50),
+        'analysis_p95': percentile(analysis_latencies, 0.95),
+        'errors': errors,
+    }
+
+
+def ensure_static_files():
+    if not os.path.exists(os.path.join(BASE_DIR, 'staticfiles', 'staticfiles.json')):
+        subprocess.run([sys.executable, 'manage.py', 'collectstatic', '--no-input'], cwd=BASE_DIR,
+                       check=True, stdout=subprocess.DEVNULL)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--servers', nargs='+', default=['gunicorn', 'uvicorn'], choices=['gunicorn', 'uvicorn'])
+    parser.add_argument('--workers', nargs='+', type=int, default=[1, 4])
+    parser.add_argument('--threads', type=int, default=1, help='gunicorn threads per worker')
+    parser.add_argument('--concurrency', nargs='+', type=int, default=[1, 8, 32])
+    parser.add_argument('--requests', type=int, default=200, help='Translation requests per run')
+    parser.add_argument('--unique-texts', type=int, default=50, help='Distinct texts to draw requests from')
+    parser.add_argument('--image-ratio', type=float, default=0.0, help='Fraction of requests sent as image uploads')
+    parser.add_argument('--analyze', action='store_true', help='Also fetch the analysis for every translation')
+    parser.add_argument('--latency-median', type=float, default=0.5, help='Median fake LLM latency in seconds')
+    parser.add_argument('--latency-sigma', type=float, default=0.5)
+    parser.add_argument('--vision-latency-median', type=float, default=0.3)
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of fake upstream calls that fail')
+    parser.add_argument('--json', help='Also write the results to this JSON file')
+    args = parser.parse_args()
+
+    ensure_static_files()
+    llm = start_server(FakeLLMHandler, 0, LatencyProfile(args.latency_median, args.latency_sigma, args.error_rate))
+    vision = start_server(FakeVisionHandler, 0, LatencyProfile(args.vision_latency_median, args.latency_sigma, args.error_rate))
+    texts = make_texts(args.unique_texts)
+    results = []
+
+    print(f"{'server':<9} {'workers':>7} {'conc':>5} {'rps':>8} {'p50':>7} {'p95':>7} {'p99':>7} "
+          f"{'an.p50':>7} {'errors':>6} {'tr.hit':>6} {'an.hit':>6}")
+    for server in args.servers:
+        for workers in args.workers:
+            for concurrency in args.concurrency:
+                with tempfile.TemporaryDirectory() as metrics_dir:
+                    # every run starts from an empty cache: no prewarm file or snapshot, and no analyses or
+                    # cache entries shared with a server from the developer's environment
+                    env = dict(os.environ,
+                               DEBUG='False',
+                               LEARNJP_CACHE_PREWARM_FILE='',
+                               LEARNJP_CACHE_SNAPSHOT_FILE='',
+                               LEARNJP_ANALYSIS_EVENTS_DIR='',
+                               LEARNJP_CACHE_PEERS='',
+                               GROQ_API_KEY='fake',
+                               LEARNJP_DEFAULT_HOSTNAME='127.0.0.1',
+                               LEARNJP_CACHE_SIZE=str(max(args.unique_texts * 2, 10)),
+                               LEARNJP_METRICS_DIR=metrics_dir,
+                               LEARNJP_TRANSLATION_PROVIDER_URL=f'http://127.0.0.1:{llm.server_address[1]}/v1',
+                               LEARNJP_VISION_API_ENDPOINT=f'http://127.0.0.1:{vision.server_address[1]}')
+                    app = AppServer(server, workers, args.threads, env)
+                    try:
+                        app.wait_ready()
+                        result = run_load(app.base_url, texts, args.requests, concurrency, args.image_ratio, args.analyze)
+                        # workers flush their metrics at most once a second
+                        time.sleep(1.5)
+                        result['hit_rate'] = read_hit_rates(app.base_url)
+                    finally:
+                        app.stop()
+
+                result.update(server=server, workers=workers, concurrency=concurrency)
+                results.append(result)
+                hit_rate = {cache: '-' if rate is None else f'{rate:.0%}' for cache, rate in result['hit_rate'].items()}
+                print(f"{server:<9} {workers:>7} {concurrency:>5} {result['rps']:>8.1f} {result['p50']:>7.3f} "
+                      f"{result['p95']:>7.3f} {result['p99']:>7.3f} {result['analysis_p50']:>7.3f} {result['errors']:>6} "
+                      f"{hit_rate['translation']:>6} {hit_rate['analysis']:>6}", flush=True)
+
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
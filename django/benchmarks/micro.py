@@ -0,0 +1,165 @@
+"""
+Micro-benchmarks for the in-process code that runs on every request.
+
+    python -m benchmarks.micro                  # run and print
+    python -m benchmarks.micro --save           # run and store as the baseline
+    python -m benchmarks.micro --compare        # run and exit with 1 if anything is slower than the baseline
+                                                # by more than --threshold (default 25%)
+
+Each benchmark reports the best per-call time over several repeats, which is the least noisy number timeit
+gives. Baselines are machine-specific: save one on the machine (or CI runner) you compare on.
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_FILE = os.path.join(BASE_DIR, 'benchmarks', 'baseline.json')
+TEST_DATA_FILE = os.path.join(BASE_DIR, 'main', 'tests', 'test_data_valid_response.json')
+
+
+def setup_django():
+    sys.path.insert(0, BASE_DIR)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+    import django
+    django.setup()
+
+
+def scaled_analysis(bunsetsu_count: int) -> str:
+    """The valid test response with its bunsetsu repeated up to bunsetsu_count, like a long input text."""
+    with open(TEST_DATA_FILE, 'r', encoding='utf-8') as file:
+        analysis = json.load(file)
+    original = analysis['bunsetsu_breakdown']
+    analysis['bunsetsu_breakdown'] = [
+        dict(original[i % len(original)], index=i + 1) for i in range(bunsetsu_count)
+    ]
+    return json.dumps(analysis, ensure_ascii=False, indent=2)
+
+
+def get_benchmarks() -> dict:
+    """Name -> zero-argument callable. Built after Django is set up."""
+    from django.conf import settings
+    from django.template.loader import render_to_string
+    from main.cache import CacheStore
+    from main.JsonResponse import JsonResponse
+    from main.views import InputForm
+
+    jp_text = '春の海ひねもすのたりのたりかな。今日はいい天気ですね。'
+    analysis = scaled_analysis(20)
+    texts = [f'{jp_text}{i}' for i in range(settings.CACHE_SIZE * 2)]
+
+    full_store = CacheStore()
+    keys = []
+    for text in texts[:settings.CACHE_SIZE]:
+        key = full_store.add_translation(jp_text=text, en_text='The spring sea, gently rolling all day long.')
+        full_store.add_analysis(key, analysis)
+        keys.append(key)
+    hit_key = keys[-1]
+
+    add_store = CacheStore()
+    position = iter(range(10 ** 12))
+
+    def cache_add_with_eviction():
+        text = texts[next(position) % len(texts)]
+        key = add_store.add_translation(jp_text=text, en_text='translation')
+        add_store.add_analysis(key, analysis)
+
+    template_context = {
+        'error_message': '',
+        'input_text': jp_text,
+        'key': hit_key,
+        'translation': 'The spring sea, gently rolling all day long.',
+    }
+
+    return {
+        'get_key': lambda: full_store.get_key(jp_text),
+        'cache_translation_hit': lambda: full_store.has_translation(hit_key) and full_store.get_translation(hit_key),
+        'cache_analysis_hit': lambda: full_store.has_analysis(hit_key) and full_store.get_analysis(hit_key),
+        'cache_miss': lambda: full_store.has_translation('missing-key'),
+        'cache_add_with_eviction': cache_add_with_eviction,
+        'validate_analysis_20_bunsetsu': lambda: JsonResponse.model_validate_json(analysis),
+        'form_validation': lambda: InputForm({'jp_text': jp_text}).is_valid(),
+        'render_translate_html': lambda: render_to_string('translate.html', template_context),
+    }
+
+
+def run(names: list[str] | None = None, repeat: int = 5) -> dict:
+    from django.test.utils import override_settings
+    from main import metrics
+
+    results = {}
+    # no collectstatic manifest needed for rendering, and the counters the benchmarks bump (e.g. evictions) must
+    # not end up in the METRICS_DIR files that /metrics of a running server adds up
+    with override_settings(STORAGES={'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'}},
+                           METRICS_DIR=None):
+        for name, function in get_benchmarks().items():
+            if names and name not in names:
+                continue
+            timer = timeit.Timer(function)
+            number, _ = timer.autorange()
+            best = min(timer.repeat(repeat=repeat, number=number)) / number
+            results[name] = best * 1e6
+    metrics.REGISTRY.clear()
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    regressions = []
+    for name, microseconds in results.items():
+        if name in baseline and microseconds > baseline[name] * (1 + threshold):
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('names', nargs='*', help='Only run these benchmarks')
+    parser.add_argument('--save', action='store_true', help=f'Store the results as the baseline ({BASELINE_FILE})')
+    parser.add_argument('--compare', action='store_true', help='Fail if slower than the baseline beyond the threshold')
+    parser.add_argument('--threshold', type=float, default=0.25, help='Allowed slowdown, 0.25 = 25%%')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    args = parser.parse_args()
+
+    setup_django()
+    results = run(args.names, args.repeat)
+
+    baseline = {}
+    if (args.compare or not args.save) and os.path.exists(args.baseline):
+        with open(args.baseline, 'r') as file:
+            baseline = json.load(file)
+
+    print(f"{'benchmark':<32} {'us/call':>10} {'baseline':>10} {'change':>8}")
+    for name, microseconds in results.items():
+        if name in baseline:
+            change = f'{(microseconds / baseline[name] - 1) * 100:+.0f}%'
+            print(f'{name:<32} {microseconds:>10.2f} {baseline[name]:>10.2f} {change:>8}')
+        else:
+            print(f'{name:<32} {microseconds:>10.2f} {"-":>10} {"":>8}')
+
+    if args.save:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, 'r') as file:
+                baseline = json.load(file)
+        baseline.update({name: round(value, 3) for name, value in results.items()})
+        with open(args.baseline, 'w') as file:
+            json.dump(baseline, file, indent=2, sort_keys=True)
+            file.write('\n')
+        print(f'Saved baseline to {args.baseline}')
+
+    if args.compare:
+        if not baseline:
+            print(f'No baseline at {args.baseline}, run with --save first')
+            sys.exit(1)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"Slower than baseline by more than {args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+        print('No regressions')
+
+
+if __name__ == '__main__':
+    main()
@@ -3,6 +3,11 @@ ASGI config for config project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve with an ASGI server (e.g. uvicorn config.asgi:application) and set LEARNJP_ANALYSIS_EVENTS=True to
+push analyses over server-sent events at /analyze/events/: the async view waits on the event loop instead
+of holding a worker thread per open connection. Under WSGI the endpoint is disabled, since Django would
+buffer the stream until the analysis is done, and pages fetch /analyze/ instead.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from dotenv import load_dotenv
 from pathlib import Path
+from urllib.parse import urlsplit
 import os
 
 # Load variables from .env into the environment
@@ -53,6 +54,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'main.middleware.BackgroundTasksMiddleware',
+    'main.middleware.MetricsMiddleware',
+    'main.middleware.TracingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -145,7 +149,118 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 TRANSLATION_MODEL = "openai/gpt-oss-120b"
 TRANSLATION_MODEL_API_KEY = os.getenv('GROQ_API_KEY')
-TRANSLATION_MODEL_PROVIDER_URL = "https://api.groq.com/openai/v1"
+TRANSLATION_MODEL_PROVIDER_URL = os.environ.get('LEARNJP_TRANSLATION_PROVIDER_URL', default="https://api.groq.com/openai/v1")
+# e.g. http://127.0.0.1:8002 for the fake Vision server in benchmarks/fake_servers.py. Uses the REST transport
+# without credentials when set.
+GOOGLE_VISION_API_ENDPOINT = os.environ.get('LEARNJP_VISION_API_ENDPOINT')
 TRANSLATION_MODEL_REASONING_EFFORT = "low"
-CACHE_SIZE = 10
-MAX_TEXT_LENGTH = 200
\ No newline at end of file
+# Per-request routing, tried in order. The first route whose limits fit the text is used, unless its
+# failure rate for similar texts is above ROUTE_MAX_FAILURE_RATE. TRANSLATION_MODEL is the fallback, and the
+# only model used when no routes are set. Optional limits: 'tasks' ('translate', 'analyze'), 'max_length',
+# 'max_kanji_ratio'. For example, to translate short texts with a smaller model:
+# TRANSLATION_MODEL_ROUTES = [
+#     {"name": "short", "model": "openai/gpt-oss-20b", "reasoning_effort": "low", "tasks": ["translate"], "max_length": 30},
+#     {"name": "default", "model": TRANSLATION_MODEL, "reasoning_effort": TRANSLATION_MODEL_REASONING_EFFORT},
+# ]
+TRANSLATION_MODEL_ROUTES = []
+ROUTE_MAX_FAILURE_RATE = 0.2
+ROUTE_MIN_SAMPLES = 5
+# translate and analyze with one LLM call instead of two
+COMBINED_TRANSLATION_ANALYSIS = os.environ.get('LEARNJP_COMBINED_MODE', default='False').lower() == 'true'
+CACHE_SIZE = int(os.environ.get('LEARNJP_CACHE_SIZE', default='10'))
+# drop entries this many seconds after they were translated (kept until evicted if not set)
+CACHE_TTL = float(os.environ.get('LEARNJP_CACHE_TTL') or 0) or None
+# background refresher (main/refresher.py), run by each serving worker every CACHE_REFRESH_INTERVAL seconds
+# (disabled if not set): re-translates popular entries CACHE_REFRESH_AHEAD seconds before they expire and
+# analyzes popular entries that have no analysis yet, using only idle upstream capacity
+CACHE_REFRESH_INTERVAL = float(os.environ.get('LEARNJP_CACHE_REFRESH_INTERVAL') or 0) or None
+CACHE_REFRESH_AHEAD = 300
+CACHE_REFRESH_MIN_HITS = 3
+CACHE_REFRESH_BATCH = 5
+# written by "manage.py prewarm_cache" and loaded into the cache at startup. Only the last CACHE_SIZE entries are
+# loaded, so raise CACHE_SIZE to fit the corpus.
+CACHE_PREWARM_FILE = os.environ.get('LEARNJP_CACHE_PREWARM_FILE', default=BASE_DIR / 'cache_prewarm.jsonl')
+# reuse the cached translation of a near-duplicate text (estimated Jaccard similarity of character n-grams,
+# punctuation ignored) at or above this threshold, e.g. 0.9. Disabled if not set.
+NEAR_DUPLICATE_THRESHOLD = float(os.environ.get('LEARNJP_NEAR_DUPLICATE_THRESHOLD') or 0) or None
+NEAR_DUPLICATE_NGRAM = 2
+# analyze an edited text incrementally: keep the bunsetsu it shares with one of the last
+# INCREMENTAL_ANALYSIS_CANDIDATES analyzed texts, if they cover at least this share of it (e.g. 0.5), and only send
+# the changed part to the LLM, with INCREMENTAL_ANALYSIS_CONTEXT characters around it. Disabled if not set.
+INCREMENTAL_ANALYSIS_MIN_REUSE = float(os.environ.get('LEARNJP_INCREMENTAL_ANALYSIS_MIN_REUSE') or 0) or None
+INCREMENTAL_ANALYSIS_CANDIDATES = 50
+INCREMENTAL_ANALYSIS_CONTEXT = 20
+# keep cached analyses zlib-compressed in memory, decompressed on read
+CACHE_COMPRESS_ANALYSIS = True
+CACHE_COMPRESSION_LEVEL = 6
+# cache snapshot for fast restarts, saved by each serving worker every CACHE_SNAPSHOT_INTERVAL seconds and when it
+# exits, merged with what the other workers saved (disabled if not set)
+CACHE_SNAPSHOT_FILE = os.environ.get('LEARNJP_CACHE_SNAPSHOT_FILE')
+CACHE_SNAPSHOT_INTERVAL = 300
+CACHE_SNAPSHOT_COMPRESS = True
+# analyses cached in the browser's localStorage. Change the version to drop what browsers have stored
+# (e.g. after a schema or prompt change).
+CLIENT_CACHE_VERSION = os.environ.get('LEARNJP_CLIENT_CACHE_VERSION', default='1')
+CLIENT_CACHE_MAX_ENTRIES = 100
+CLIENT_CACHE_MAX_BYTES = 2 * 1024 * 1024
+# let the page get the analysis as HTML rendered (once, then cached gzipped) on the server instead of building it
+# from JSON in the browser, which is slow on low-end phones
+ANALYSIS_FRAGMENTS = os.environ.get('LEARNJP_ANALYSIS_FRAGMENTS', default='False').lower() == 'true'
+# peer cache for several nodes (see main/cluster.py): base URLs of all nodes, comma separated, and this node's
+# own URL from that list. Nodes authenticate to each other with CACHE_PEER_SECRET. Disabled if not set.
+CACHE_PEERS = [peer.strip().rstrip('/') for peer in os.environ.get('LEARNJP_CACHE_PEERS', default='').split(',') if peer.strip()]
+CACHE_SELF_URL = os.environ.get('LEARNJP_CACHE_SELF_URL', default='').rstrip('/') or None
+# peers call this node by the host in its URL, e.g. 127.0.0.1 in a local setup
+ALLOWED_HOSTS = list(dict.fromkeys(ALLOWED_HOSTS + [urlsplit(peer).hostname for peer in CACHE_PEERS]))
+CACHE_PEER_SECRET = os.environ.get('LEARNJP_CACHE_PEER_SECRET')
+CACHE_PEER_TIMEOUT = 1.0
+CACHE_PEER_DOWN_SECONDS = 30
+CACHE_PEER_VNODES = 100
+# analyses run in background jobs (at most one per key) that pages subscribe to at /analyze/events/.
+# When set, workers share running and finished jobs through files in this directory.
+ANALYSIS_EVENTS_DIR = os.environ.get('LEARNJP_ANALYSIS_EVENTS_DIR')
+# only enable the events when serving with an ASGI server (uvicorn config.asgi:application): a WSGI worker
+# buffers the whole stream and is held until the analysis is done. Pages fetch /analyze/ otherwise.
+ANALYSIS_EVENTS = os.environ.get('LEARNJP_ANALYSIS_EVENTS', default='False').lower() == 'true'
+ANALYSIS_EVENTS_TTL = 600
+ANALYSIS_EVENTS_POLL_INTERVAL = 0.25
+ANALYSIS_EVENTS_KEEPALIVE = 15
+ANALYSIS_JOB_TIMEOUT = 120
+ANALYSIS_JOB_WORKERS = 4
+# admission control, per worker: at most this many upstream LLM calls at a time (0 disables). Translations wait
+# up to ADMISSION_MAX_QUEUE_WAIT seconds for a slot, analyses don't wait and use at most ADMISSION_ANALYSIS_SHARE
+# of the slots. Rejected requests get a 503 with Retry-After. The limit is per process, so it only has an effect
+# with threaded workers (gunicorn --threads) or ASGI: a sync worker never makes more than one call at a time.
+ADMISSION_MAX_IN_FLIGHT = int(os.environ.get('LEARNJP_ADMISSION_MAX_IN_FLIGHT', default='8'))
+ADMISSION_MAX_QUEUE_WAIT = 5.0
+ADMISSION_ANALYSIS_SHARE = 0.5
+# latency SLOs in seconds (e.g. 10 and 30), which also shed load with sync workers: while the moving average of
+# a task's upstream call time is above its SLO, its calls get a 503, except one per average call time that checks
+# whether upstream has recovered. Disabled if not set.
+ADMISSION_TRANSLATE_SLO = float(os.environ.get('LEARNJP_ADMISSION_TRANSLATE_SLO') or 0) or None
+ADMISSION_ANALYZE_SLO = float(os.environ.get('LEARNJP_ADMISSION_ANALYZE_SLO') or 0) or None
+# translation misses arriving within this many seconds of each other (e.g. 0.03) are sent as one LLM call of up
+# to TRANSLATION_BATCH_MAX_SIZE texts or TRANSLATION_BATCH_MAX_CHARS characters (0 disables batching). Batches are
+# per process, so only enable it with threaded workers (gunicorn --threads) or ASGI, not sync workers.
+TRANSLATION_BATCH_WINDOW = float(os.environ.get('LEARNJP_TRANSLATION_BATCH_WINDOW') or 0)
+TRANSLATION_BATCH_MAX_SIZE = 16
+TRANSLATION_BATCH_MAX_CHARS = 2000
+# /metrics: when set, workers share their metrics through files in this directory so any worker can report totals
+METRICS_DIR = os.environ.get('LEARNJP_METRICS_DIR')
+METRICS_FLUSH_INTERVAL = 1.0
+# when set, /metrics requires "Authorization: Bearer <token>"
+METRICS_TOKEN = os.environ.get('LEARNJP_METRICS_TOKEN')
+# request tracing: spans for each stage are passed to TRACING_EXPORTER (JSON lines in TRACING_FILE by default)
+TRACING_ENABLED = os.environ.get('LEARNJP_TRACING', default='False').lower() == 'true'
+TRACING_EXPORTER = 'main.tracing.JsonLinesExporter'
+TRACING_FILE = os.environ.get('LEARNJP_TRACING_FILE', default=BASE_DIR / 'traces.jsonl')
+# profile 1 in N traced requests with cProfile (0 to disable), keep the profiles of slow ones
+TRACING_PROFILE_SAMPLE_RATE = int(os.environ.get('LEARNJP_TRACING_PROFILE_SAMPLE_RATE', default='0'))
+TRACING_SLOW_REQUEST_SECONDS = 5.0
+TRACING_PROFILE_DIR = BASE_DIR / 'profiles'
+MAX_TEXT_LENGTH = 200
+# several images or PDF pages can be uploaded at once, and are OCR'd with up to OCR_MAX_CONCURRENCY Vision calls
+# at a time
+MAX_UPLOAD_FILES = 10
+MAX_UPLOAD_PAGES = 20
+OCR_MAX_CONCURRENCY = 4
\ No newline at end of file
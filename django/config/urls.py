@@ -21,4 +21,8 @@ from main import views
 urlpatterns = [
     path('', views.index, name = 'main'),
     path('analyze/', views.analyze, name = 'analyze'),
+    path('analyze/events/', views.analysis_events, name = 'analysis_events'),
+    path('analyze/fragment/', views.analysis_fragment, name = 'analysis_fragment'),
+    path('metrics', views.metrics_view, name = 'metrics'),
+    path('internal/cache/<str:key>', views.peer_cache, name = 'peer_cache'),
 ]
@@ -0,0 +1,18 @@
+# Gunicorn reads this file from the working directory.
+import os
+
+# Import Django and the app once in the master and fork the workers from it, so each worker
+# doesn't pay for the imports again. Upstream clients are created lazily in each worker
+# (see main.services.get_openai_client and main.utils.get_vision_client), which keeps this fork-safe.
+preload_app = os.environ.get('LEARNJP_PRELOAD', default='False').lower() == 'true'
+
+
+def post_worker_init(worker):
+    # background threads belong to the workers, not to the master (see main.background)
+    from main import background
+    background.start()
+
+
+def worker_exit(server, worker):
+    from main import background
+    background.stop()
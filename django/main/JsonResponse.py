@@ -18,6 +18,8 @@ class JsonResponse(BaseModel):
 
     create_datetime: datetime
     bunsetsu_breakdown: list[Bunsetsu]
+    # only filled in combined mode (see services.openAI_translate_and_analyze)
+    english_translation: str | None = None
     
 
     
@@ -0,0 +1,133 @@
+"""
+Admission control for upstream LLM calls.
+
+Each worker allows at most settings.ADMISSION_MAX_IN_FLIGHT upstream calls at a time. Translations wait for
+a free slot for up to ADMISSION_MAX_QUEUE_WAIT seconds, and are turned away at once when the expected wait
+(from the queue length and the recent upstream latency) is longer than that. Analyses are optional, so they
+never wait and only use up to ADMISSION_ANALYSIS_SHARE of the slots, leaving room for translations.
+A rejected call raises Overloaded, which the views turn into a 503 with Retry-After. Cache hits make no
+upstream calls and are never affected.
+
+The slots are counted per process, so they only limit anything with threaded workers (gunicorn --threads)
+or ASGI: a sync worker never has more than one call in flight. The latency SLOs (ADMISSION_TRANSLATE_SLO and
+ADMISSION_ANALYZE_SLO) also work there: while the moving average of a task's call time is above its SLO, its
+calls are turned away, except one per average call time that checks whether upstream has recovered.
+"""
+from . import metrics
+from contextlib import contextmanager
+from django.conf import settings
+import math
+import threading
+import time
+
+class Overloaded(Exception):
+
+    def __init__(self, retry_after: int):
+        super().__init__(f'Upstream is saturated, retry after {retry_after} seconds')
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._in_flight = 0
+        self._waiting = 0
+        # moving average of upstream call time, None until the first call finishes
+        self._latency = None
+        # the same by task, for the SLOs, and when the task's last call started or finished
+        self._task_latency = {}
+        self._task_last_call = {}
+
+    def _limit(self, task: str) -> int:
+        if task == 'translate':
+            return settings.ADMISSION_MAX_IN_FLIGHT
+        return max(1, int(settings.ADMISSION_MAX_IN_FLIGHT * settings.ADMISSION_ANALYSIS_SHARE))
+
+    def _expected_wait(self, limit: int) -> float:
+        if self._in_flight < limit:
+            return 0.0
+        return (self._waiting + 1) * (self._latency or 0.0) / limit
+
+    def _slo(self, task: str) -> float | None:
+        return settings.ADMISSION_TRANSLATE_SLO if task == 'translate' else settings.ADMISSION_ANALYZE_SLO
+
+    def _slo_wait(self, task: str) -> float:
+        """Seconds until the next call of task may go through while upstream is slower than its SLO, else 0."""
+        slo = self._slo(task)
+        latency = self._task_latency.get(task)
+        if not slo or latency is None or latency <= slo:
+            return 0.0
+        # let one call through per average call time, to see whether upstream has recovered
+        return max(0.0, self._task_last_call.get(task, 0.0) + latency - time.monotonic())
+
+    def _moving_average(self, task: str, elapsed: float) -> float:
+        latency = self._task_latency.get(task)
+        slo = self._slo(task)
+        if latency is None or (slo and latency > slo and elapsed <= slo):
+            # the first call, or one within the SLO after upstream was slow: it has recovered
+            return elapsed
+        return 0.8 * latency + 0.2 * elapsed
+
+    def _reject(self, task: str, limit: int, retry_after: float = 0.0):
+        metrics.ADMISSION_REJECTIONS.inc(task=task)
+        retry_after = retry_after or self._expected_wait(limit) or self._latency or 1
+        raise Overloaded(max(1, math.ceil(retry_after)))
+
+    @contextmanager
+    def slot(self, task: str):
+        """Hold an upstream slot for task ('translate' or 'analyze') or raise Overloaded."""
+        if not settings.ADMISSION_MAX_IN_FLIGHT:
+            yield
+            return
+
+        limit = self._limit(task)
+        max_wait = settings.ADMISSION_MAX_QUEUE_WAIT if task == 'translate' else 0
+        start_time = time.monotonic()
+        with self._condition:
+            slo_wait = self._slo_wait(task)
+            if slo_wait:
+                self._reject(task, limit, slo_wait)
+            if self._in_flight >= limit and (not max_wait or self._expected_wait(limit) > max_wait):
+                self._reject(task, limit)
+            deadline = start_time + max_wait
+            while self._in_flight >= limit:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._reject(task, limit)
+                self._waiting += 1
+                try:
+                    self._condition.wait(remaining)
+                finally:
+                    self._waiting -= 1
+            self._in_flight += 1
+            self._task_last_call[task] = time.monotonic()
+        metrics.ADMISSION_QUEUE_SECONDS.observe(time.monotonic() - start_time, task=task)
+
+        call_start_time = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - call_start_time
+            with self._condition:
+                self._in_flight -= 1
+                self._latency = elapsed if self._latency is None else 0.8 * self._latency + 0.2 * elapsed
+                self._task_latency[task] = self._moving_average(task, elapsed)
+                self._task_last_call[task] = time.monotonic()
+                self._condition.notify_all()
+
+    def status(self) -> dict:
+        with self._condition:
+            return {'in_flight': self._in_flight, 'waiting': self._waiting, 'latency': self._latency,
+                    'task_latency': dict(self._task_latency)}
+
+    def clear(self):
+        with self._condition:
+            self._in_flight = 0
+            self._waiting = 0
+            self._latency = None
+            self._task_latency.clear()
+            self._task_last_call.clear()
+
+
+ADMISSION = AdmissionController()
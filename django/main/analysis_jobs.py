@@ -0,0 +1,214 @@
+"""
+Background analysis jobs, run at most once per key.
+
+start() runs the analysis of a cached translation in a thread pool unless it is already running (or already
+cached), and get_result() tells whether it has finished. When settings.ANALYSIS_EVENTS_DIR is set, workers
+share their jobs through that directory: a claim file marks a job as running in some worker, and a result
+file holds the finished analysis, so a client waiting on one worker gets the result computed by another and
+a client that reconnects to a different worker does not start the work again.
+"""
+from .cache import CACHE_STORE
+from .JsonResponse import JsonResponse
+from . import admission, cluster, incremental, metrics, services, tracing
+from concurrent.futures import Future, ThreadPoolExecutor
+from django.conf import settings
+from pydantic import ValidationError
+from typing import NamedTuple
+import contextvars
+import json
+import os
+import threading
+import time
+
+class AnalysisResult(NamedTuple):
+    # analysis JSON, or '{}' if the analysis failed
+    analysis: str
+    failed: bool
+    # set when admission control turned the analysis away
+    retry_after: int | None = None
+
+
+_lock = threading.Lock()
+_jobs = {}
+_executor = None
+_executor_pid = None
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor, _executor_pid
+    # a forked worker can't use the parent's threads
+    if _executor is None or _executor_pid != os.getpid():
+        _executor = ThreadPoolExecutor(max_workers=settings.ANALYSIS_JOB_WORKERS, thread_name_prefix='analysis')
+        _executor_pid = os.getpid()
+        _jobs.clear()
+    return _executor
+
+
+def run_analysis(key: str) -> AnalysisResult:
+    """Analyze the cached translation's text and cache the analysis if it is valid."""
+    jp_text = CACHE_STORE.get_original_text(key)
+    route = services.select_route(jp_text, 'analyze')
+    with admission.ADMISSION.slot('analyze'):
+        json_result = incremental.reanalyze(jp_text) or services.openAI_analyze(jp_text, route)
+
+    try:
+        with tracing.span('validation'), metrics.STAGE_SECONDS.time(stage='validation'):
+            JsonResponse.model_validate_json(json_result)
+        CACHE_STORE.add_analysis(key, json_result)
+        cluster.PEER_CACHE.publish(key)
+        return AnalysisResult(json_result, False)
+    except ValidationError as e:
+        services.record_validation_failure(route, 'analyze', jp_text)
+        if settings.DEBUG:
+            print(json_result)
+            print(e)
+        return AnalysisResult('{}', True)
+
+
+def start(key: str) -> Future | None:
+    """
+    Start analyzing key in the background. Returns the running job, or None if it runs in another worker,
+    has already finished there, or the text of key isn't cached in this worker.
+    """
+    with _lock:
+        executor = _get_executor()
+        job = _jobs.get(key)
+        if job is not None:
+            return job
+        if not CACHE_STORE.has_translation(key) or not _claim(key):
+            return None
+        result = get_result(key)
+        if result is not None and not result.failed:
+            # another worker finished it just before we claimed it
+            _release(key)
+            return None
+        job = _jobs[key] = Future()
+
+    # keep the request's trace for the spans recorded by the job
+    context = contextvars.copy_context()
+    executor.submit(context.run, _run_job, key, job, True)
+    return job
+
+def analyze(key: str) -> AnalysisResult:
+    """Run the analysis in this thread, or wait for the same analysis already running in this process."""
+    with _lock:
+        _get_executor()
+        job = _jobs.get(key)
+        if job is not None:
+            running = True
+        else:
+            running = False
+            # if another worker has claimed it, analyze anyway: a plain request does not wait on other workers
+            claimed = _claim(key)
+            job = _jobs[key] = Future()
+
+    if running:
+        return job.result()
+    return _run_job(key, job, claimed)
+
+def get_result(key: str, since: float = 0.0) -> AnalysisResult | None:
+    """The finished analysis of key, or None if it isn't available yet. Failures older than since are ignored."""
+    if CACHE_STORE.has_analysis(key):
+        return AnalysisResult(CACHE_STORE.get_analysis(key), False)
+
+    if settings.ANALYSIS_EVENTS_DIR:
+        path = _result_file(key)
+        try:
+            modified = os.path.getmtime(path)
+            with open(path, 'r', encoding='utf-8') as file:
+                result = AnalysisResult(**json.load(file))
+        except (OSError, ValueError, TypeError):
+            return None
+        if result.failed and modified < since:
+            return None
+        if not result.failed and CACHE_STORE.has_translation(key):
+            CACHE_STORE.add_analysis(key, result.analysis)
+        return result
+    return None
+
+def is_claimed(key: str) -> bool:
+    """Whether some worker is running the job of key (only known with a shared directory)."""
+    if not settings.ANALYSIS_EVENTS_DIR:
+        return False
+    return _claim_is_fresh(_claim_file(key))
+
+
+def _run_job(key: str, job: Future, claimed: bool) -> AnalysisResult:
+    try:
+        result = run_analysis(key)
+    except admission.Overloaded as e:
+        result = AnalysisResult('{}', True, e.retry_after)
+    except Exception as e:
+        print(f"Analysis job error: {e}")
+        result = AnalysisResult('{}', True)
+
+    if settings.ANALYSIS_EVENTS_DIR:
+        # being overloaded is this worker's state, not a result for the others
+        if result.retry_after is None:
+            try:
+                _publish(key, result)
+            except OSError as e:
+                print(f"Unable to publish analysis result: {e}")
+        if claimed:
+            _release(key)
+    with _lock:
+        _jobs.pop(key, None)
+    job.set_result(result)
+    return result
+
+
+def _result_file(key: str) -> str:
+    return os.path.join(settings.ANALYSIS_EVENTS_DIR, f'{key}.json')
+
+def _claim_file(key: str) -> str:
+    return os.path.join(settings.ANALYSIS_EVENTS_DIR, f'{key}.claim')
+
+def _claim_is_fresh(path: str) -> bool:
+    try:
+        return time.time() - os.path.getmtime(path) < settings.ANALYSIS_JOB_TIMEOUT
+    except OSError:
+        return False
+
+def _claim(key: str) -> bool:
+    """Take the cross-worker claim on key's job. Always succeeds without a shared directory."""
+    if not settings.ANALYSIS_EVENTS_DIR:
+        return True
+
+    os.makedirs(settings.ANALYSIS_EVENTS_DIR, exist_ok=True)
+    path = _claim_file(key)
+    if os.path.exists(path) and not _claim_is_fresh(path):
+        # the worker that claimed it died or hung
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    try:
+        fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return False
+    with os.fdopen(fd, 'w') as file:
+        file.write(str(os.getpid()))
+    return True
+
+def _publish(key: str, result: AnalysisResult):
+    path = _result_file(key)
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        json.dump(result._asdict(), file, ensure_ascii=False)
+    os.replace(temp_path, path)
+    _remove_expired_results()
+
+def _release(key: str):
+    try:
+        os.remove(_claim_file(key))
+    except OSError:
+        pass
+
+def _remove_expired_results():
+    expiry = time.time() - settings.ANALYSIS_EVENTS_TTL
+    for name in os.listdir(settings.ANALYSIS_EVENTS_DIR):
+        path = os.path.join(settings.ANALYSIS_EVENTS_DIR, name)
+        try:
+            if os.path.getmtime(path) < expiry:
+                os.remove(path)
+        except OSError:
+            continue
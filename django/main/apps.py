@@ -1,6 +1,25 @@
 from django.apps import AppConfig
+from django.conf import settings
+import os
 
 
 class MainConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'main'
+
+    def ready(self):
+        from .cache import CACHE_STORE
+
+        if settings.CACHE_PREWARM_FILE and os.path.exists(settings.CACHE_PREWARM_FILE):
+            count = CACHE_STORE.load_prewarm_file(settings.CACHE_PREWARM_FILE)
+            print(f"Loaded {count} prewarmed cache entries from {settings.CACHE_PREWARM_FILE}")
+
+        if settings.CACHE_SNAPSHOT_FILE:
+            from . import snapshot
+
+            if os.path.exists(settings.CACHE_SNAPSHOT_FILE):
+                try:
+                    CACHE_STORE.attach_snapshot(snapshot.Snapshot(settings.CACHE_SNAPSHOT_FILE))
+                except (OSError, ValueError) as e:
+                    print(f"Unable to open cache snapshot {settings.CACHE_SNAPSHOT_FILE}: {e}")
+            # the thread saving it is started by the serving workers, see background.py
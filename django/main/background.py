@@ -0,0 +1,51 @@
+"""
+Background threads of a process that serves requests: the cache snapshot thread and the refresher.
+
+They are only started in processes that serve requests: by gunicorn's post_worker_init hook (gunicorn.conf.py)
+and, under other servers, by the first request the process handles (BackgroundTasksMiddleware). The gunicorn
+master with preload_app and manage.py commands never start them, so they never save over the snapshot of
+the workers. stop() runs when the worker exits, from gunicorn's worker_exit hook or atexit.
+"""
+from django.conf import settings
+import atexit
+import os
+import threading
+
+_lock = threading.Lock()
+# pid of the process that started the threads, since a forked child doesn't inherit them
+_started_pid = None
+_stop_functions = []
+
+
+def start():
+    global _started_pid
+
+    if _started_pid == os.getpid():
+        return
+    with _lock:
+        if _started_pid == os.getpid():
+            return
+        _started_pid = os.getpid()
+        _stop_functions.clear()
+
+        if settings.CACHE_SNAPSHOT_FILE:
+            from .cache import CACHE_STORE
+            from .snapshot import start_snapshot_thread
+
+            _stop_functions.append(start_snapshot_thread(CACHE_STORE, settings.CACHE_SNAPSHOT_FILE,
+                                                         settings.CACHE_SNAPSHOT_INTERVAL,
+                                                         settings.CACHE_SNAPSHOT_COMPRESS))
+        if settings.CACHE_REFRESH_INTERVAL:
+            from .refresher import start_refresher_thread
+
+            _stop_functions.append(start_refresher_thread(settings.CACHE_REFRESH_INTERVAL))
+        atexit.register(stop)
+
+def stop():
+    with _lock:
+        if _started_pid != os.getpid():
+            return
+        stop_functions = list(_stop_functions)
+        _stop_functions.clear()
+    for stop_function in stop_functions:
+        stop_function()
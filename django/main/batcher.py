@@ -0,0 +1,102 @@
+"""
+Micro-batching of translation misses.
+
+Requests that miss the cache within settings.TRANSLATION_BATCH_WINDOW seconds of each other are translated with
+one LLM call (services.openAI_translate_batch) instead of one call each, which saves a system prompt and a
+rate-limit slot per text. A batch is sent early once it holds TRANSLATION_BATCH_MAX_SIZE texts or
+TRANSLATION_BATCH_MAX_CHARS characters. A batch of one text, and any text missing from a batch response, is
+translated on its own with services.openAI_translate. A window of 0 disables batching.
+
+Batches are per process: only requests that one process handles at the same time can share a batch. That needs
+threads (e.g. gunicorn --threads) or an ASGI server. A sync gunicorn worker handles one request at a time, so
+its batches would always hold one text and each miss would just wait out the window. Leave batching off there.
+
+Every upstream call, batched or not, holds one admission slot (admission.py) while it runs. When no slot is
+free in time, every request waiting for the batch gets Overloaded.
+"""
+from . import admission, services
+from concurrent.futures import Future
+from django.conf import settings
+import threading
+
+# a text the batch response left out, to be translated on its own
+_NOT_TRANSLATED = object()
+
+class TranslationBatcher:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # jp_text -> Future, in arrival order
+        self._pending = {}
+        self._pending_chars = 0
+        self._timer = None
+
+    def translate(self, jp_text: str) -> str | None:
+        """The translation of jp_text, None if it failed. Raises admission.Overloaded when upstream is saturated."""
+        if not settings.TRANSLATION_BATCH_WINDOW:
+            return _translate_alone(jp_text)
+
+        batch = None
+        with self._lock:
+            future = self._pending.get(jp_text)
+            if future is None:
+                future = self._pending[jp_text] = Future()
+                self._pending_chars += len(jp_text)
+                if len(self._pending) >= settings.TRANSLATION_BATCH_MAX_SIZE \
+                        or self._pending_chars >= settings.TRANSLATION_BATCH_MAX_CHARS:
+                    batch = self._take_batch()
+                elif self._timer is None:
+                    self._timer = threading.Timer(settings.TRANSLATION_BATCH_WINDOW, self._flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+
+        if batch:
+            self._send(batch)
+        result = future.result()
+        if result is _NOT_TRANSLATED:
+            return _translate_alone(jp_text)
+        return result
+
+    def _take_batch(self) -> dict:
+        batch = self._pending
+        self._pending = {}
+        self._pending_chars = 0
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        return batch
+
+    def _flush(self):
+        with self._lock:
+            self._timer = None
+            batch = self._take_batch()
+        if batch:
+            self._send(batch)
+
+    def _send(self, batch: dict):
+        texts = list(batch)
+        try:
+            with admission.ADMISSION.slot('translate'):
+                try:
+                    if len(texts) == 1:
+                        results = [services.openAI_translate(texts[0])]
+                    else:
+                        results = services.openAI_translate_batch(texts)
+                except Exception as e:
+                    print(f"Batch translation error: {e}")
+                    results = [None] * len(texts)
+        except admission.Overloaded as e:
+            for future in batch.values():
+                future.set_exception(admission.Overloaded(e.retry_after))
+            return
+
+        for text, result in zip(texts, results):
+            batch[text].set_result(result if result or len(texts) == 1 else _NOT_TRANSLATED)
+
+
+def _translate_alone(jp_text: str) -> str | None:
+    with admission.ADMISSION.slot('translate'):
+        return services.openAI_translate(jp_text)
+
+
+BATCHER = TranslationBatcher()
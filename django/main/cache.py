@@ -1,10 +1,46 @@
+from .metrics import CACHE_EVICTIONS, CACHE_EXPIRATIONS
+from .similarity import MinHashIndex, normalize_text
 from collections import deque
 from django.conf import settings
-from typing import NamedTuple
+from django.core.signals import setting_changed
+import hashlib
+import json
+import sys
+import time
+import weakref
+import zlib
 
-class Translation(NamedTuple):
-    english: str
-    japanese: str
+# Preset dictionary for analysis compression. Every analysis follows schema.json, so the key names and
+# layout below appear in all of them and zlib can refer back to them from the first byte.
+# Changing it makes existing compressed entries unreadable, which is fine for an in-memory cache.
+ANALYSIS_ZDICT = json.dumps({
+    "create_datetime": "2025-01-01T00:00:00Z",
+    "bunsetsu_breakdown": [{
+        "index": 1,
+        "japanese_phrase": "",
+        "english_translation": "",
+        "morphological_analysis": [
+            {"token_id": 1, "surface_form": "", "base_form": "", "POS": "Noun", "english_explanation": "", "romaji": ""},
+            {"token_id": 2, "surface_form": "", "base_form": "", "POS": "Particle", "english_explanation": "", "romaji": ""},
+            {"token_id": 3, "surface_form": "", "base_form": "", "POS": "Verb", "english_explanation": "", "romaji": ""},
+        ]
+    }]
+}, indent=2).encode('utf-8')
+
+class Translation:
+    __slots__ = ('english', 'japanese')
+
+    def __init__(self, english: str, japanese: str):
+        self.english = english
+        self.japanese = japanese
+
+def compress_analysis(analysis: str) -> bytes:
+    compressor = zlib.compressobj(settings.CACHE_COMPRESSION_LEVEL, zdict=ANALYSIS_ZDICT)
+    return compressor.compress(analysis.encode('utf-8')) + compressor.flush()
+
+def decompress_analysis(data: bytes) -> str:
+    decompressor = zlib.decompressobj(zdict=ANALYSIS_ZDICT)
+    return (decompressor.decompress(data) + decompressor.flush()).decode('utf-8')
 
 class CacheStore:
 
@@ -12,52 +48,267 @@ class CacheStore:
         self._request_queue = deque()
         self._translation_cache = {}
         self._analysis_cache = {}
+        # gzipped HTML of the analyses (see fragments.py), dropped whenever the analysis changes
+        self._fragment_cache = {}
+        self.snapshot = None
+        self._similarity_index = MinHashIndex(ngram=settings.NEAR_DUPLICATE_NGRAM)
+        # when each entry was translated, for CACHE_TTL, and how often its translation was served
+        self._created = {}
+        self._access_counts = {}
+        self.load_settings()
+        _STORES.add(self)
+
+    def load_settings(self):
+        # used on every lookup, where reading django.conf.settings would cost more than the lookup itself
+        self._ttl = settings.CACHE_TTL
+        self._count_access = bool(settings.CACHE_REFRESH_INTERVAL)
 
     def add_translation(self, jp_text: str, en_text: str) -> str:
         self._checkCacheLimit()        
         
-        key = str(hash(jp_text))
+        key = self.get_key(jp_text)
         self._request_queue.append(key)        
         self._translation_cache[key] = Translation(japanese=jp_text, english=en_text)
+        self._created[key] = time.time()
+        if settings.NEAR_DUPLICATE_THRESHOLD:
+            self._similarity_index.add(key, jp_text)
         
         return key
     
     def add_analysis(self, key: str, analysis: str) -> str:
+        if analysis and settings.CACHE_COMPRESS_ANALYSIS:
+            analysis = compress_analysis(analysis)
         self._analysis_cache[key] = analysis
+        self._fragment_cache.pop(key, None)
         
         return key
 
     def get_analysis(self, key: str) -> str:
+        self._load_from_snapshot(key)
         if key in self._analysis_cache:
-            return self._analysis_cache[key]
+            analysis = self._analysis_cache[key]
+            if isinstance(analysis, bytes):
+                return decompress_analysis(analysis)
+            return analysis
         return ''
 
+    def add_fragment(self, key: str, fragment: bytes):
+        if key in self._analysis_cache:
+            self._fragment_cache[key] = fragment
+
+    def get_fragment(self, key: str) -> bytes | None:
+        return self._fragment_cache.get(key)
+
     def get_key(self, jp_text: str) -> str:
-        return str(hash(jp_text))
+        # stable across processes (unlike hash()), so keys stay valid in snapshots and other workers.
+        # Normalized so that OCR variants differing only in width or whitespace share an entry.
+        return hashlib.blake2b(normalize_text(jp_text).encode('utf-8'), digest_size=8).hexdigest()
+
+    def find_similar_key(self, jp_text: str) -> str | None:
+        """Key of a cached text similar enough to jp_text to reuse its translation, if near-duplicate lookup is enabled."""
+        if not settings.NEAR_DUPLICATE_THRESHOLD:
+            return None
+        for _, key in self._similarity_index.query(jp_text, settings.NEAR_DUPLICATE_THRESHOLD):
+            if self.has_translation(key):
+                return key
+        return None
 
     def get_original_text(self, key: str) -> str:    
+        self._load_from_snapshot(key)
         if key in self._translation_cache:
             return self._translation_cache[key].japanese
         return ''
 
     def get_translation(self, key: str) -> str:
+        self._load_from_snapshot(key)
         if key in self._translation_cache:
+            # popularity is only needed by the refresher
+            if self._count_access:
+                self._access_counts[key] = self._access_counts.get(key, 0) + 1
             return self._translation_cache[key].english
         return ''
 
     def has_analysis(self, key: str) -> bool:
+        self._load_from_snapshot(key)
+        if self._ttl:
+            self._expire_if_stale(key)
         return (key in self._analysis_cache) and (self._analysis_cache[key])
     
     def has_translation(self, key: str) -> bool:
+        self._load_from_snapshot(key)
+        if self._ttl:
+            self._expire_if_stale(key)
         return (key in self._translation_cache) and (self._translation_cache[key])
 
+    def refresh_translation(self, key: str, en_text: str):
+        """Replace the translation of a cached entry and restart its TTL, keeping it from being evicted next."""
+        translation = self._translation_cache.get(key)
+        if not translation:
+            return
+        self._translation_cache[key] = Translation(japanese=translation.japanese, english=en_text)
+        self._created[key] = time.time()
+        while key in self._request_queue:
+            self._request_queue.remove(key)
+        self._request_queue.append(key)
+
+    def get_age(self, key: str) -> float | None:
+        created = self._created.get(key)
+        return time.time() - created if created else None
+
+    def get_hot_keys(self, min_count: int = 1) -> list[tuple[str, int]]:
+        """(key, access count) of cached translations served at least min_count times, most popular first."""
+        counts = dict(self._access_counts)
+        hot = [(key, count) for key, count in counts.items() if count >= min_count and self._translation_cache.get(key)]
+        return sorted(hot, key=lambda item: item[1], reverse=True)
+
+    def get_recent_analyzed_keys(self, limit: int) -> list[str]:
+        """Up to limit keys of cached entries with an analysis, most recently added first."""
+        keys = []
+        for key in reversed(list(self._request_queue)):
+            if key not in keys and self._analysis_cache.get(key):
+                keys.append(key)
+                if len(keys) >= limit:
+                    break
+        return keys
+
+    def decay_access_counts(self):
+        """Halve all access counts, so popularity follows recent traffic."""
+        for key, count in list(self._access_counts.items()):
+            if count > 1:
+                self._access_counts[key] = count // 2
+            else:
+                self._access_counts.pop(key, None)
+
+    def load_prewarm_file(self, path) -> int:
+        """
+        Load entries written by the prewarm_cache command. Returns the number of entries loaded.
+        Only the last CACHE_SIZE entries fit in the cache, so earlier ones are skipped rather than evicted.
+        """
+        entries = []
+        with open(path, 'r', encoding='utf-8') as file:
+            for line in file:
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # a partially written last line from an interrupted run
+                    continue
+
+        if len(entries) > self.capacity:
+            print(f"WARNING :: {path} has {len(entries)} entries but CACHE_SIZE is {self.capacity}, "
+                  f"only the last {self.capacity} are loaded")
+            entries = entries[-self.capacity:]
+        for entry in entries:
+            key = self.add_translation(jp_text=entry['japanese'], en_text=entry['english'])
+            if entry.get('analysis'):
+                self.add_analysis(key, entry['analysis'])
+        return len(entries)
+
+    def clear(self):
+        """Drop every entry, with its access count and similarity index entry. An attached snapshot stays attached."""
+        self._request_queue.clear()
+        self._translation_cache.clear()
+        self._analysis_cache.clear()
+        self._fragment_cache.clear()
+        self._created.clear()
+        self._access_counts.clear()
+        self._similarity_index.clear()
+
+    @property
+    def capacity(self) -> int:
+        return settings.CACHE_SIZE
+
+    def attach_snapshot(self, snapshot):
+        """Serve entries from a snapshot.Snapshot. Entries are copied into memory the first time they are looked up."""
+        self.snapshot = snapshot
+
+    def export_entries(self):
+        """Yield (key, SnapshotEntry) for every cached translation, newest first."""
+        from .snapshot import SnapshotEntry
+
+        translations = dict(self._translation_cache)
+        analyses = dict(self._analysis_cache)
+        for key in reversed(list(dict.fromkeys(self._request_queue))):
+            translation = translations.get(key)
+            if translation:
+                analysis = analyses.get(key) or ''
+                if isinstance(analysis, bytes):
+                    analysis = decompress_analysis(analysis)
+                yield key, SnapshotEntry(japanese=translation.japanese, english=translation.english, analysis=analysis,
+                                         created=self._created.get(key))
+
+    def memory_usage(self) -> dict:
+        """Approximate memory held by cache entries, in bytes. Walks every entry, so don't call it per request."""
+        translations = dict(self._translation_cache)
+        analyses = dict(self._analysis_cache)
+        fragments = dict(self._fragment_cache)
+
+        translation_bytes = sum(
+            sys.getsizeof(key) + sys.getsizeof(entry) + sys.getsizeof(entry.japanese) + sys.getsizeof(entry.english)
+            for key, entry in translations.items() if entry
+        )
+        analysis_bytes = sum(sys.getsizeof(key) + sys.getsizeof(analysis) for key, analysis in analyses.items() if analysis)
+        analysis_bytes += sum(sys.getsizeof(fragment) for fragment in fragments.values())
+        entries = len(translations)
+
+        return {
+            'entries': entries,
+            'analyses': len(analyses),
+            'translation_bytes': translation_bytes,
+            'analysis_bytes': analysis_bytes,
+            'bytes_per_entry': (translation_bytes + analysis_bytes) // entries if entries else 0,
+        }
+
+    def _load_from_snapshot(self, key: str):
+        if self.snapshot is None or key in self._translation_cache or key not in self.snapshot:
+            return
+        entry = self.snapshot.get(key)
+        created = entry.created or self.snapshot.written
+        if self._ttl and time.time() - created > self._ttl:
+            # expired since the snapshot was saved
+            return
+        self.add_translation(jp_text=entry.japanese, en_text=entry.english)
+        self._created[key] = created
+        if entry.analysis:
+            self.add_analysis(key, entry.analysis)
+
+    def _expire_if_stale(self, key: str):
+        created = self._created.get(key)
+        if created is None or time.time() - created <= self._ttl:
+            return
+        self._translation_cache.pop(key, None)
+        self._analysis_cache.pop(key, None)
+        self._fragment_cache.pop(key, None)
+        self._created.pop(key, None)
+        self._access_counts.pop(key, None)
+        self._similarity_index.remove(key)
+        # otherwise its old queue slot would evict the entry when it is added again
+        while key in self._request_queue:
+            self._request_queue.remove(key)
+        CACHE_EXPIRATIONS.inc()
+
     def _checkCacheLimit(self):
         if len(self._request_queue) >= settings.CACHE_SIZE:
             # hitting cache limit, remove the oldest entry
             del_key = self._request_queue.popleft()
+            self._similarity_index.remove(del_key)
+            CACHE_EVICTIONS.inc()
             if del_key in self._translation_cache:
                 del self._translation_cache[del_key]
             if del_key in self._analysis_cache:
                 del self._analysis_cache[del_key]
+            self._fragment_cache.pop(del_key, None)
+            self._created.pop(del_key, None)
+            self._access_counts.pop(del_key, None)
+
+_STORES = weakref.WeakSet()
+
+def _reload_settings(setting, **kwargs):
+    # e.g. override_settings in tests
+    if setting in ('CACHE_TTL', 'CACHE_REFRESH_INTERVAL'):
+        for store in list(_STORES):
+            store.load_settings()
+
+setting_changed.connect(_reload_settings)
+
 
 CACHE_STORE = CacheStore()
\ No newline at end of file
@@ -0,0 +1,177 @@
+"""
+Optional peer cache for running several nodes, each with its own CACHE_STORE.
+
+Every cache key has an owner node, chosen by consistent hashing over settings.CACHE_PEERS (base URLs of all
+nodes, this one included as settings.CACHE_SELF_URL). On a local miss a node asks the owner for the entry at
+/internal/cache/<key>, and after computing a new translation or analysis it sends the entry to the owner.
+A node that doesn't answer is skipped for CACHE_PEER_DOWN_SECONDS, during which its keys move to the next node
+on the ring. When the owner is down or doesn't have the entry, the node computes the result itself.
+Adding or removing a node only moves the keys between it and its ring neighbours.
+
+Try it locally with two processes:
+    LEARNJP_CACHE_PEERS=http://127.0.0.1:8000,http://127.0.0.1:8001 LEARNJP_CACHE_SELF_URL=http://127.0.0.1:8000 \
+        LEARNJP_CACHE_PEER_SECRET=secret python manage.py runserver 8000
+    (and the same with 8001)
+The hosts of CACHE_PEERS are added to ALLOWED_HOSTS, so the nodes accept each other's requests.
+"""
+from .cache import CACHE_STORE
+from . import metrics
+from bisect import bisect
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+import hashlib
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+
+PEER_TOKEN_HEADER = 'X-LearnJP-Peer-Token'
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class HashRing:
+    """Consistent hashing with virtual nodes: each node owns many small arcs of the ring."""
+
+    def __init__(self, nodes: list[str], vnodes: int = 100):
+        self.nodes = list(dict.fromkeys(nodes))
+        self._ring = sorted((_hash(f'{node}#{i}'), node) for node in self.nodes for i in range(vnodes))
+        self._hashes = [point for point, _ in self._ring]
+
+    def get_nodes(self, key: str):
+        """Nodes in ring order starting from the owner of key, each once."""
+        if not self._ring:
+            return
+        seen = set()
+        start = bisect(self._hashes, _hash(key))
+        for i in range(len(self._ring)):
+            node = self._ring[(start + i) % len(self._ring)][1]
+            if node not in seen:
+                seen.add(node)
+                yield node
+                if len(seen) == len(self.nodes):
+                    return
+
+    def get_node(self, key: str) -> str | None:
+        return next(self.get_nodes(key), None)
+
+
+class PeerCache:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ring = None
+        self._ring_peers = None
+        self._down_until = {}
+        self._executor = None
+        self._executor_pid = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(settings.CACHE_PEERS and settings.CACHE_SELF_URL)
+
+    def _get_ring(self) -> HashRing:
+        peers = tuple(settings.CACHE_PEERS)
+        with self._lock:
+            if self._ring is None or self._ring_peers != peers:
+                self._ring = HashRing(list(peers), settings.CACHE_PEER_VNODES)
+                self._ring_peers = peers
+            return self._ring
+
+    def get_owner(self, key: str) -> str | None:
+        """The first node on the ring for key that isn't marked down."""
+        now = time.time()
+        for node in self._get_ring().get_nodes(key):
+            if node == settings.CACHE_SELF_URL or self._down_until.get(node, 0) <= now:
+                return node
+        return None
+
+    def is_local(self, key: str) -> bool:
+        return not self.enabled or self.get_owner(key) in (None, settings.CACHE_SELF_URL)
+
+    def _request(self, method: str, url: str, body: bytes | None = None):
+        request = urllib.request.Request(url, data=body, method=method, headers={
+            PEER_TOKEN_HEADER: settings.CACHE_PEER_SECRET or '',
+            'Content-Type': 'application/json',
+        })
+        with urllib.request.urlopen(request, timeout=settings.CACHE_PEER_TIMEOUT) as response:
+            return json.loads(response.read().decode('utf-8') or 'null')
+
+    def _mark_down(self, node: str, error):
+        print(f"Cache peer {node} is not responding: {error}")
+        self._down_until[node] = time.time() + settings.CACHE_PEER_DOWN_SECONDS
+
+    def fetch(self, key: str) -> dict | None:
+        """The owner's entry for key ({japanese, english, analysis}), or None."""
+        if self.is_local(key):
+            return None
+        owner = self.get_owner(key)
+        try:
+            entry = self._request('GET', f'{owner}/internal/cache/{key}')
+        except urllib.error.HTTPError as e:
+            if e.code != 404:
+                self._mark_down(owner, e)
+            metrics.PEER_CACHE_REQUESTS.inc(operation='fetch', outcome='miss' if e.code == 404 else 'error')
+            return None
+        except (OSError, ValueError) as e:
+            self._mark_down(owner, e)
+            metrics.PEER_CACHE_REQUESTS.inc(operation='fetch', outcome='error')
+            return None
+        metrics.PEER_CACHE_REQUESTS.inc(operation='fetch', outcome='hit')
+        return entry
+
+    def fill_from_owner(self, key: str) -> bool:
+        """Copy the owner's entry for key into the local cache. Returns whether there was one."""
+        entry = self.fetch(key)
+        return bool(entry) and store_entry(key, entry)
+
+    def publish(self, key: str):
+        """Send the local entry for key to its owner in the background."""
+        entry = get_local_entry(key)
+        if entry is None or self.is_local(key):
+            return
+        with self._lock:
+            # a forked worker can't use the parent's threads
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='peer-cache')
+                self._executor_pid = os.getpid()
+        self._executor.submit(self._send, self.get_owner(key), key, entry)
+
+    def _send(self, owner: str, key: str, entry: dict):
+        try:
+            self._request('PUT', f'{owner}/internal/cache/{key}', json.dumps(entry, ensure_ascii=False).encode('utf-8'))
+            metrics.PEER_CACHE_REQUESTS.inc(operation='publish', outcome='success')
+        except (OSError, ValueError) as e:
+            self._mark_down(owner, e)
+            metrics.PEER_CACHE_REQUESTS.inc(operation='publish', outcome='error')
+
+    def clear(self):
+        self._down_until.clear()
+
+
+def get_local_entry(key: str) -> dict | None:
+    if not CACHE_STORE.has_translation(key):
+        return None
+    return {
+        'japanese': CACHE_STORE.get_original_text(key),
+        'english': CACHE_STORE.get_translation(key),
+        'analysis': CACHE_STORE.get_analysis(key) if CACHE_STORE.has_analysis(key) else None,
+    }
+
+def store_entry(key: str, entry: dict) -> bool:
+    """Add a peer's entry to the local cache. Returns False if it isn't a valid entry for key."""
+    if not isinstance(entry, dict) or not entry.get('english') or not isinstance(entry.get('japanese'), str):
+        return False
+    if CACHE_STORE.get_key(entry['japanese']) != key:
+        return False
+    if not CACHE_STORE.has_translation(key):
+        CACHE_STORE.add_translation(jp_text=entry['japanese'], en_text=entry['english'])
+    if entry.get('analysis') and not CACHE_STORE.has_analysis(key):
+        CACHE_STORE.add_analysis(key, entry['analysis'])
+    return True
+
+
+PEER_CACHE = PeerCache()
@@ -0,0 +1,44 @@
+"""
+Server-rendered analysis HTML.
+
+render_fragment() builds the same markup as returnMorphemesInHTML/showAnalysisResult in popover.js, with every
+value escaped by the template. get_fragment() keeps it gzipped next to the analysis in CACHE_STORE, so it is
+rendered once per analysis and sent as is to every client that accepts gzip.
+"""
+from .cache import CACHE_STORE
+from .JsonResponse import JsonResponse
+from django.template.loader import render_to_string
+import gzip
+
+def get_phrase_parts(bunsetsu: JsonResponse.Bunsetsu) -> list[dict]:
+    """
+    The phrase as morphemes and plain text, in order. Like popover.js, morphemes that aren't in the phrase
+    are skipped and text between morphemes is kept as plain text.
+    """
+    parts = []
+    next_index = 0
+    for morpheme in bunsetsu.morphological_analysis:
+        index = bunsetsu.japanese_phrase.find(morpheme.surface_form, next_index)
+        if index < 0:
+            continue
+        missing_words = bunsetsu.japanese_phrase[next_index:index].strip()
+        if missing_words:
+            parts.append({'text': missing_words})
+        parts.append({'morpheme': morpheme})
+        next_index = index + len(morpheme.surface_form)
+    return parts
+
+def render_fragment(analysis: JsonResponse) -> str:
+    rows = [{'parts': get_phrase_parts(bunsetsu), 'english_translation': bunsetsu.english_translation}
+            for bunsetsu in analysis.bunsetsu_breakdown]
+    return render_to_string('analysis_fragment.html', {'rows': rows})
+
+def get_fragment(key: str, json_result: str) -> bytes:
+    """Gzipped HTML of the analysis json_result of key. Raises ValidationError if it isn't a valid analysis."""
+    fragment = CACHE_STORE.get_fragment(key)
+    if fragment is None:
+        html = render_fragment(JsonResponse.model_validate_json(json_result))
+        # no timestamp, so the same analysis always gives the same bytes
+        fragment = gzip.compress(html.encode('utf-8'), mtime=0)
+        CACHE_STORE.add_fragment(key, fragment)
+    return fragment
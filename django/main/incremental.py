@@ -0,0 +1,163 @@
+"""
+Incremental analysis of edited texts.
+
+Learners often change a word and resubmit, which gives the text a new key. Instead of analyzing it from scratch,
+reanalyze() looks among the recently analyzed texts for the one that shares the most unchanged text with it at
+its start and end, keeps the bunsetsu of those unchanged parts, and only sends the bunsetsu in between to the
+LLM (services.openAI_analyze_span), with a little of the text around them as context. The bunsetsu are then
+merged and renumbered into one analysis. Used when the kept bunsetsu cover at least
+settings.INCREMENTAL_ANALYSIS_MIN_REUSE of the new text; otherwise the caller does a full analysis.
+"""
+from .cache import CACHE_STORE
+from .JsonResponse import JsonResponse
+from .similarity import normalize_text
+from . import metrics, services, tracing
+from datetime import datetime, timezone
+from django.conf import settings
+from pydantic import ValidationError
+from typing import NamedTuple
+import os
+import unicodedata
+
+class Match(NamedTuple):
+    key: str
+    # bunsetsu kept from the start and the end of the cached analysis
+    prefix: list[JsonResponse.Bunsetsu]
+    suffix: list[JsonResponse.Bunsetsu]
+    # restart token_id in each bunsetsu, like the cached analysis does
+    per_bunsetsu_tokens: bool
+    # the part of the new text to analyze, as character offsets
+    start: int
+    end: int
+
+
+def get_phrase_spans(text: str, breakdown: list[JsonResponse.Bunsetsu]) -> list[tuple[int, int]] | None:
+    """(start, end) of each bunsetsu in text, in order, or None if a phrase isn't found where expected."""
+    spans = []
+    position = 0
+    for bunsetsu in breakdown:
+        start = text.find(bunsetsu.japanese_phrase, position)
+        if start < 0:
+            return None
+        position = start + len(bunsetsu.japanese_phrase)
+        spans.append((start, position))
+    return spans
+
+def _is_covered(text: str, spans: list[tuple[int, int]]) -> bool:
+    """Whether every character of text outside spans is whitespace or punctuation."""
+    covered = set()
+    for start, end in spans:
+        covered.update(range(start, end))
+    return all(i in covered or char.isspace() or unicodedata.category(char).startswith('P')
+               for i, char in enumerate(text))
+
+def _common_suffix_length(old_text: str, new_text: str, limit: int) -> int:
+    length = 0
+    while length < limit and old_text[-1 - length] == new_text[-1 - length]:
+        length += 1
+    return length
+
+
+def match_analysis(key: str, old_text: str, analysis: JsonResponse, jp_text: str) -> Match | None:
+    """What of the cached analysis of old_text can be kept for jp_text."""
+    breakdown = analysis.bunsetsu_breakdown
+    spans = get_phrase_spans(old_text, breakdown)
+    if not spans:
+        return None
+
+    prefix_length = len(os.path.commonprefix([old_text, jp_text]))
+    suffix_length = _common_suffix_length(old_text, jp_text, min(len(old_text), len(jp_text)) - prefix_length)
+
+    # a bunsetsu that ends right where text is inserted is analyzed again, since the insertion may add a particle to it
+    inserted = len(jp_text) - prefix_length - suffix_length > 0
+    prefix_count = 0
+    while prefix_count < len(spans) and (spans[prefix_count][1] < prefix_length
+                                         or spans[prefix_count][1] == prefix_length and not inserted):
+        prefix_count += 1
+    suffix_count = 0
+    while suffix_count < len(spans) - prefix_count and spans[-1 - suffix_count][0] >= len(old_text) - suffix_length:
+        suffix_count += 1
+    if not prefix_count and not suffix_count:
+        return None
+
+    start = spans[prefix_count - 1][1] if prefix_count else 0
+    end = (spans[-suffix_count][0] if suffix_count else len(old_text)) + len(jp_text) - len(old_text)
+    per_bunsetsu_tokens = len(breakdown) > 1 and all(
+        bunsetsu.morphological_analysis[0].token_id == 1 for bunsetsu in breakdown)
+    return Match(key, breakdown[:prefix_count], breakdown[len(breakdown) - suffix_count:],
+                 per_bunsetsu_tokens, start, end)
+
+def find_match(jp_text: str) -> Match | None:
+    """The match with a recently analyzed text that keeps the most of its bunsetsu, if it keeps enough."""
+    own_key = CACHE_STORE.get_key(jp_text)
+    min_reused = settings.INCREMENTAL_ANALYSIS_MIN_REUSE * len(jp_text)
+    best, best_reused = None, 0
+
+    for key in CACHE_STORE.get_recent_analyzed_keys(settings.INCREMENTAL_ANALYSIS_CANDIDATES):
+        old_text = CACHE_STORE.get_original_text(key)
+        if key == own_key or not old_text:
+            continue
+        # cheap upper bound before parsing the analysis
+        prefix_length = len(os.path.commonprefix([old_text, jp_text]))
+        limit = min(len(old_text), len(jp_text)) - prefix_length
+        if prefix_length + _common_suffix_length(old_text, jp_text, limit) < max(min_reused, best_reused + 1):
+            continue
+        try:
+            analysis = JsonResponse.model_validate_json(CACHE_STORE.get_analysis(key))
+        except ValidationError:
+            continue
+
+        match = match_analysis(key, old_text, analysis, jp_text)
+        if match is None:
+            continue
+        reused = sum(len(bunsetsu.japanese_phrase) for bunsetsu in match.prefix + match.suffix)
+        if reused >= min_reused and reused > best_reused:
+            best, best_reused = match, reused
+    return best
+
+
+def merge(match: Match, changed: list[JsonResponse.Bunsetsu]) -> JsonResponse:
+    """One analysis from the kept and the new bunsetsu, with index and token_id numbered again."""
+    breakdown = [bunsetsu.model_copy(deep=True) for bunsetsu in match.prefix + changed + match.suffix]
+    token_id = 0
+    for index, bunsetsu in enumerate(breakdown, start=1):
+        bunsetsu.index = index
+        if match.per_bunsetsu_tokens:
+            token_id = 0
+        for morpheme in bunsetsu.morphological_analysis:
+            token_id += 1
+            morpheme.token_id = token_id
+    return JsonResponse(create_datetime=datetime.now(timezone.utc), bunsetsu_breakdown=breakdown)
+
+def reanalyze(jp_text: str) -> str | None:
+    """Analysis JSON of jp_text built from a similar cached analysis, or None to analyze it in full."""
+    if not settings.INCREMENTAL_ANALYSIS_MIN_REUSE or not normalize_text(jp_text):
+        return None
+
+    with tracing.span('incremental.match'):
+        match = find_match(jp_text)
+    if match is None:
+        metrics.INCREMENTAL_ANALYSES.inc(outcome='no_match')
+        return None
+
+    changed_text = jp_text[match.start:match.end]
+    changed = []
+    if not _is_covered(changed_text, []):
+        context = settings.INCREMENTAL_ANALYSIS_CONTEXT
+        route = services.select_route(changed_text, 'analyze')
+        json_result = services.openAI_analyze_span(changed_text, jp_text[max(0, match.start - context):match.start],
+                                                   jp_text[match.end:match.end + context], route)
+        try:
+            changed = JsonResponse.model_validate_json(json_result).bunsetsu_breakdown
+        except ValidationError:
+            services.record_validation_failure(route, 'analyze_span', changed_text)
+            metrics.INCREMENTAL_ANALYSES.inc(outcome='fallback')
+            return None
+        # the LLM must have analyzed exactly the changed part, not the context around it
+        spans = get_phrase_spans(changed_text, changed)
+        if not spans or not _is_covered(changed_text, spans):
+            metrics.INCREMENTAL_ANALYSES.inc(outcome='fallback')
+            return None
+
+    metrics.INCREMENTAL_ANALYSES.inc(outcome='reused')
+    return merge(match, changed).model_dump_json(exclude_none=True)
@@ -0,0 +1,143 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from main.cache import CACHE_STORE
+from main.JsonResponse import JsonResponse
+from main import services
+from pydantic import ValidationError
+import json
+import os
+import threading
+import time
+
+
+class RateLimiter:
+    """Spaces out upstream calls so that all workers together stay under a requests-per-minute limit."""
+
+    def __init__(self, requests_per_minute: int):
+        self._interval = 60.0 / requests_per_minute if requests_per_minute > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_time = time.monotonic()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            wait_time = self._next_time - now
+            self._next_time = max(now, self._next_time) + self._interval
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+
+class Command(BaseCommand):
+    help = 'Translate and analyze every text in a corpus file (one text per line) and save the results for the cache.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('corpus', help='Text file with one Japanese text per line')
+        parser.add_argument('--output', default=settings.CACHE_PREWARM_FILE,
+                            help='JSON lines file the results are appended to (default: CACHE_PREWARM_FILE)')
+        parser.add_argument('--workers', type=int, default=4, help='Number of concurrent upstream requests')
+        parser.add_argument('--requests-per-minute', type=int, default=30,
+                            help='Upstream rate limit shared by all workers, 0 for no limit')
+        parser.add_argument('--no-analysis', action='store_true', help='Only translate, skip morphological analysis')
+
+    def handle(self, *args, **options):
+        if not os.path.exists(options['corpus']):
+            raise CommandError(f"Corpus file not found: {options['corpus']}")
+        if not options['output']:
+            raise CommandError('No output file. Set LEARNJP_CACHE_PREWARM_FILE or use --output.')
+
+        with_analysis = not options['no_analysis']
+        texts = self._read_corpus(options['corpus'])
+        done = self._read_done(options['output'], with_analysis)
+        pending = [text for text in texts if text not in done and not self._is_cached(text, with_analysis)]
+
+        self.stdout.write(f"{len(texts)} unique texts, {len(texts) - len(pending)} already done, {len(pending)} to process")
+        if not pending:
+            return
+
+        self._rate_limiter = RateLimiter(options['requests_per_minute'])
+        self._write_lock = threading.Lock()
+        start_time = time.time()
+        completed = failed = 0
+
+        with open(options['output'], 'a', encoding='utf-8') as output, \
+                ThreadPoolExecutor(max_workers=max(options['workers'], 1)) as executor:
+            futures = [executor.submit(self._process, text, with_analysis) for text in pending]
+            for future in as_completed(futures):
+                entry = future.result()
+                if entry:
+                    with self._write_lock:
+                        output.write(json.dumps(entry, ensure_ascii=False) + '\n')
+                        output.flush()
+                    completed += 1
+                else:
+                    failed += 1
+
+                elapsed = time.time() - start_time
+                self.stdout.write(
+                    f"[{completed + failed}/{len(pending)}] {completed} done, {failed} failed, "
+                    f"{(completed + failed) / elapsed * 60:.1f} texts/min"
+                )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Finished {completed} texts in {time.time() - start_time:.1f} seconds, {failed} failed (rerun to retry)"
+        ))
+
+        total = len(self._read_done(options['output'], with_analysis=False))
+        if total > settings.CACHE_SIZE:
+            self.stdout.write(self.style.WARNING(
+                f"{options['output']} has {total} texts but CACHE_SIZE is {settings.CACHE_SIZE}, only the last "
+                f"{settings.CACHE_SIZE} are loaded at startup. Raise LEARNJP_CACHE_SIZE to keep them all."
+            ))
+
+    def _read_corpus(self, path) -> list[str]:
+        texts = []
+        seen = set()
+        with open(path, 'r', encoding='utf-8') as file:
+            for line in file:
+                # same limit as the input form
+                text = line.strip()[:settings.MAX_TEXT_LENGTH]
+                if text and text not in seen:
+                    seen.add(text)
+                    texts.append(text)
+        return texts
+
+    def _read_done(self, path, with_analysis: bool) -> set[str]:
+        # entries from previous (possibly interrupted) runs, so the command can be resumed
+        done = set()
+        if not os.path.exists(path):
+            return done
+        with open(path, 'r', encoding='utf-8') as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if entry.get('analysis') or not with_analysis:
+                    done.add(entry['japanese'])
+        return done
+
+    def _is_cached(self, jp_text: str, with_analysis: bool) -> bool:
+        key = CACHE_STORE.get_key(jp_text)
+        return CACHE_STORE.has_translation(key) and (CACHE_STORE.has_analysis(key) or not with_analysis)
+
+    def _process(self, jp_text: str, with_analysis: bool):
+        self._rate_limiter.wait()
+        en_text = services.openAI_translate(jp_text)
+        if not en_text:
+            return None
+
+        analysis = None
+        if with_analysis:
+            self._rate_limiter.wait()
+            analysis = services.openAI_analyze(jp_text)
+            try:
+                JsonResponse.model_validate_json(analysis)
+            except ValidationError:
+                return None
+
+        key = CACHE_STORE.add_translation(jp_text=jp_text, en_text=en_text)
+        if analysis:
+            CACHE_STORE.add_analysis(key, analysis)
+
+        return {'japanese': jp_text, 'english': en_text, 'analysis': analysis}
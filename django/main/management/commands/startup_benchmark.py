@@ -0,0 +1,79 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+import json
+import statistics
+import subprocess
+import sys
+
+# Runs in a fresh interpreter so nothing is already imported. Prints one JSON object with timings in seconds.
+BENCHMARK_SCRIPT = """
+import json, os, sys, time
+start = time.perf_counter()
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+import django
+django.setup()
+setup_done = time.perf_counter()
+
+from config.wsgi import application
+import main.views
+import_done = time.perf_counter()
+
+from django.conf import settings
+from django.test import Client
+settings.ALLOWED_HOSTS.append('testserver')
+response = Client().get('/')
+first_request_done = time.perf_counter()
+sdk_modules_at_boot = [name for name in ('openai', 'google.cloud.vision', 'grpc') if name in sys.modules]
+
+# what the first translation or OCR request pays on top, now that the SDKs are imported lazily
+import openai
+openai_done = time.perf_counter()
+from google.cloud import vision
+vision_done = time.perf_counter()
+
+print(json.dumps({
+    'django_setup': setup_done - start,
+    'app_import': import_done - setup_done,
+    'time_to_first_request': first_request_done - start,
+    'first_request_status': response.status_code,
+    'openai_import': openai_done - first_request_done,
+    'vision_import': vision_done - openai_done,
+    'sdk_modules_at_boot': sdk_modules_at_boot,
+}))
+"""
+
+TIMINGS = ['django_setup', 'app_import', 'time_to_first_request', 'openai_import', 'vision_import']
+
+
+class Command(BaseCommand):
+    help = 'Measure import time and time-to-first-request of a freshly started worker.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5, help='Number of fresh interpreters to start')
+        parser.add_argument('--json', action='store_true', help='Print the median timings as JSON')
+
+    def handle(self, *args, **options):
+        results = []
+        for _ in range(max(options['runs'], 1)):
+            completed = subprocess.run(
+                [sys.executable, '-c', BENCHMARK_SCRIPT],
+                cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+            )
+            # the app may print to stdout while starting, the timings are on the last line
+            results.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+
+        medians = {name: statistics.median(result[name] for result in results) for name in TIMINGS}
+        medians['first_request_status'] = results[-1]['first_request_status']
+        medians['sdk_modules_at_boot'] = results[-1]['sdk_modules_at_boot']
+
+        if options['json']:
+            self.stdout.write(json.dumps(medians))
+            return
+
+        self.stdout.write(f"Median of {len(results)} runs:")
+        self.stdout.write(f"  Django setup:            {medians['django_setup'] * 1000:8.1f} ms")
+        self.stdout.write(f"  App import:              {medians['app_import'] * 1000:8.1f} ms")
+        self.stdout.write(f"  Time to first request:   {medians['time_to_first_request'] * 1000:8.1f} ms (status {medians['first_request_status']})")
+        self.stdout.write(f"  OpenAI SDK (first use):  {medians['openai_import'] * 1000:8.1f} ms")
+        self.stdout.write(f"  Vision SDK (first use):  {medians['vision_import'] * 1000:8.1f} ms")
+        self.stdout.write(f"  SDKs imported at boot:   {', '.join(medians['sdk_modules_at_boot']) or 'none'}")
@@ -0,0 +1,244 @@
+"""
+Counters and histograms exposed at /metrics in the Prometheus text format.
+
+Each process keeps its own values. When settings.METRICS_DIR is set, every process also writes its values
+to a file there (at most once per METRICS_FLUSH_INTERVAL seconds and at exit), and /metrics adds up the
+files of all processes, so any gunicorn worker can answer for the whole server.
+"""
+from contextlib import contextmanager
+from django.conf import settings
+import atexit
+import glob
+import json
+import math
+import os
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, registry, name: str, help_text: str):
+        self._registry = registry
+        self.name = name
+        self.help_text = help_text
+
+    def inc(self, amount: float = 1, **labels):
+        self._registry.update(self, labels, lambda value: (value or 0) + amount)
+
+class Histogram:
+    type = 'histogram'
+
+    def __init__(self, registry, name: str, help_text: str, buckets=DEFAULT_BUCKETS):
+        self._registry = registry
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        def add(current):
+            # per-bucket counts (not cumulative), then sum and count
+            current = current or [0] * len(self.buckets) + [0, 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    current[i] += 1
+                    break
+            else:
+                current[len(self.buckets)] += 1
+            current[-2] += value
+            current[-1] += 1
+            return current
+
+        self._registry.update(self, labels, add)
+
+    @contextmanager
+    def time(self, **labels):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start_time, **labels)
+
+
+class Registry:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+        self._values = {}
+        self._last_flush = 0.0
+        self._exit_registered = False
+        self._flush_scheduled_pid = None
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        return self._register(Counter(self, name, help_text))
+
+    def histogram(self, name: str, help_text: str, buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(self, name, help_text, buckets))
+
+    def _register(self, metric):
+        self._metrics[metric.name] = metric
+        self._values[metric.name] = {}
+        return metric
+
+    def update(self, metric, labels: dict, function):
+        label_key = tuple(sorted((name, str(value)) for name, value in labels.items()))
+        with self._lock:
+            values = self._values[metric.name]
+            values[label_key] = function(values.get(label_key))
+        self._maybe_flush()
+
+    def get_value(self, name: str, **labels):
+        label_key = tuple(sorted((label, str(value)) for label, value in labels.items()))
+        with self._lock:
+            value = self._values[name].get(label_key)
+            return list(value) if isinstance(value, list) else value
+
+    def clear(self):
+        with self._lock:
+            for values in self._values.values():
+                values.clear()
+
+    def _local_values(self) -> dict:
+        with self._lock:
+            return {
+                name: [[list(map(list, label_key)), list(value) if isinstance(value, list) else value]
+                       for label_key, value in values.items()]
+                for name, values in self._values.items()
+            }
+
+    def _process_file(self, pid: int | None = None) -> str:
+        return os.path.join(settings.METRICS_DIR, f'metrics_{pid or os.getpid()}.json')
+
+    def _maybe_flush(self):
+        if not settings.METRICS_DIR:
+            return
+        if time.time() - self._last_flush >= settings.METRICS_FLUSH_INTERVAL:
+            self.flush()
+        elif self._flush_scheduled_pid != os.getpid():
+            # write the latest values even if no further updates come in
+            self._flush_scheduled_pid = os.getpid()
+            timer = threading.Timer(settings.METRICS_FLUSH_INTERVAL, self._scheduled_flush)
+            timer.daemon = True
+            timer.start()
+
+    def _scheduled_flush(self):
+        self._flush_scheduled_pid = None
+        self.flush()
+
+    def flush(self):
+        if not settings.METRICS_DIR:
+            return
+        self._last_flush = time.time()
+        if not self._exit_registered:
+            self._exit_registered = True
+            atexit.register(self.flush)
+
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        path = self._process_file()
+        temp_path = f'{path}.tmp'
+        with open(temp_path, 'w') as file:
+            json.dump(self._local_values(), file)
+        os.replace(temp_path, path)
+
+    def _aggregate(self) -> dict:
+        sources = [self._local_values()]
+        if settings.METRICS_DIR:
+            own_file = self._process_file()
+            for path in glob.glob(os.path.join(settings.METRICS_DIR, 'metrics_*.json')):
+                if path == own_file:
+                    continue
+                try:
+                    with open(path, 'r') as file:
+                        sources.append(json.load(file))
+                except (OSError, ValueError):
+                    continue
+
+        totals = {name: {} for name in self._metrics}
+        for source in sources:
+            for name, entries in source.items():
+                if name not in totals:
+                    continue
+                for labels, value in entries:
+                    label_key = tuple(tuple(label) for label in labels)
+                    current = totals[name].get(label_key)
+                    if isinstance(value, list):
+                        totals[name][label_key] = [a + b for a, b in zip(current, value)] if current else list(value)
+                    else:
+                        totals[name][label_key] = (current or 0) + value
+        return totals
+
+    def render(self) -> str:
+        lines = []
+        for name, values in self._aggregate().items():
+            metric = self._metrics[name]
+            lines.append(f'# HELP {name} {metric.help_text}')
+            lines.append(f'# TYPE {name} {metric.type}')
+            for label_key, value in sorted(values.items()):
+                if metric.type == 'counter':
+                    lines.append(f'{name}{_format_labels(label_key)} {_format_number(value)}')
+                    continue
+                cumulative = 0
+                for bound, count in zip(metric.buckets + (math.inf,), value):
+                    cumulative += count
+                    le = '+Inf' if bound == math.inf else _format_number(bound)
+                    lines.append(f'{name}_bucket{_format_labels(label_key + (("le", le),))} {cumulative}')
+                lines.append(f'{name}_sum{_format_labels(label_key)} {_format_number(value[-2])}')
+                lines.append(f'{name}_count{_format_labels(label_key)} {value[-1]}')
+        return '\n'.join(lines) + '\n'
+
+
+def _format_labels(label_key) -> str:
+    if not label_key:
+        return ''
+    escaped = (name + '="' + value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+               for name, value in label_key)
+    return '{' + ','.join(escaped) + '}'
+
+def _format_number(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+REGISTRY = Registry()
+
+REQUEST_SECONDS = REGISTRY.histogram('learnjp_request_seconds', 'Time to handle a request, by view.')
+STAGE_SECONDS = REGISTRY.histogram('learnjp_stage_seconds', 'Time spent in ocr, translation, analysis and validation.')
+CACHE_LOOKUPS = REGISTRY.counter('learnjp_cache_lookups_total', 'Cache lookups by cache and result (hit or miss).')
+CACHE_EVICTIONS = REGISTRY.counter('learnjp_cache_evictions_total', 'Entries evicted from the cache.')
+CACHE_EXPIRATIONS = REGISTRY.counter('learnjp_cache_expirations_total', 'Entries dropped from the cache after CACHE_TTL.')
+CACHE_REFRESHES = REGISTRY.counter('learnjp_cache_refreshes_total', 'Background refreshes of popular entries, by task and outcome.')
+INCREMENTAL_ANALYSES = REGISTRY.counter('learnjp_incremental_analyses_total', 'Analyses of edited texts, by outcome (reused, no_match or fallback).')
+UPSTREAM_REQUESTS = REGISTRY.counter('learnjp_upstream_requests_total', 'Calls to upstream APIs by service, task and outcome.')
+PEER_CACHE_REQUESTS = REGISTRY.counter('learnjp_peer_cache_requests_total', 'Requests to the cache owner node, by operation and outcome.')
+ADMISSION_REJECTIONS = REGISTRY.counter('learnjp_admission_rejections_total', 'Upstream calls turned away by admission control, by task.')
+ADMISSION_QUEUE_SECONDS = REGISTRY.histogram('learnjp_admission_queue_seconds', 'Time waited for an upstream slot, by task.')
+UPSTREAM_TOKENS = REGISTRY.counter('learnjp_upstream_tokens_total', 'LLM tokens used, by model and type (prompt or completion).')
+ROUTE_DECISIONS = REGISTRY.counter('learnjp_route_decisions_total', 'Routes picked for LLM calls, by route, task and input bucket (length-kanji).')
+ROUTE_REQUESTS = REGISTRY.counter('learnjp_route_requests_total', 'LLM calls by route, task and input bucket (length-kanji).')
+ROUTE_FAILURES = REGISTRY.counter('learnjp_route_failures_total', 'Failed LLM calls and rejected outputs, by route, task and input bucket (length-kanji).')
+ROUTE_SECONDS = REGISTRY.counter('learnjp_route_seconds_total', 'Time spent in LLM calls, by route, task and input bucket (length-kanji).')
+
+
+def record_usage(model: str, usage):
+    """Count token usage from an OpenAI-compatible response.usage."""
+    if usage is None:
+        return
+    for token_type in ('prompt', 'completion'):
+        tokens = getattr(usage, f'{token_type}_tokens', None)
+        if tokens:
+            UPSTREAM_TOKENS.inc(tokens, model=model, type=token_type)
+
+def render_cache_memory(memory: dict) -> str:
+    """Gauges from CacheStore.memory_usage(). Unlike the other metrics they are not added up across processes."""
+    lines = [
+        '# HELP learnjp_cache_entries Entries in the cache of the process that answered.',
+        '# TYPE learnjp_cache_entries gauge',
+        f'learnjp_cache_entries {memory["entries"]}',
+        '# HELP learnjp_cache_bytes Approximate memory held by cache entries in the process that answered, by type.',
+        '# TYPE learnjp_cache_bytes gauge',
+        f'learnjp_cache_bytes{{type="translation"}} {memory["translation_bytes"]}',
+        f'learnjp_cache_bytes{{type="analysis"}} {memory["analysis_bytes"]}',
+    ]
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,80 @@
+from . import background, metrics, tracing
+from django.conf import settings
+import cProfile
+import itertools
+import os
+import re
+import time
+
+REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9_.-]{1,64}$')
+
+
+class BackgroundTasksMiddleware:
+    """Starts the background threads (see background.py) in the process that handles the request, once."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        background.start()
+        return self.get_response(request)
+
+
+class MetricsMiddleware:
+    """Records how long each request takes, labelled with the name of the view that handled it."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start_time = time.perf_counter()
+        response = self.get_response(request)
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.url_name if match and match.url_name else 'unknown'
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - start_time, view=view, status=response.status_code)
+        return response
+
+
+class TracingMiddleware:
+    """
+    Traces each request under a request id (taken from the X-Request-ID header or generated) and returns the id
+    in the response. One in settings.TRACING_PROFILE_SAMPLE_RATE requests is also run under cProfile, and the
+    profile is saved to settings.TRACING_PROFILE_DIR when the request is slower than TRACING_SLOW_REQUEST_SECONDS.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self._request_counter = itertools.count(1)
+
+    def __call__(self, request):
+        if not settings.TRACING_ENABLED:
+            return self.get_response(request)
+
+        request_id = request.headers.get('X-Request-ID', '')
+        if not REQUEST_ID_PATTERN.match(request_id):
+            request_id = None
+
+        profiler = None
+        sample_rate = settings.TRACING_PROFILE_SAMPLE_RATE
+        if sample_rate and next(self._request_counter) % sample_rate == 0:
+            profiler = cProfile.Profile()
+
+        with tracing.start_trace(request_id) as trace:
+            with tracing.span('request', method=request.method, path=request.path) as record:
+                start_time = time.perf_counter()
+                if profiler:
+                    profiler.enable()
+                try:
+                    response = self.get_response(request)
+                finally:
+                    if profiler:
+                        profiler.disable()
+                record['attributes']['status'] = response.status_code
+
+        if profiler and time.perf_counter() - start_time >= settings.TRACING_SLOW_REQUEST_SECONDS:
+            os.makedirs(settings.TRACING_PROFILE_DIR, exist_ok=True)
+            profiler.dump_stats(os.path.join(settings.TRACING_PROFILE_DIR, f'{trace.request_id}.prof'))
+
+        response['X-Request-ID'] = trace.request_id
+        return response
@@ -0,0 +1,80 @@
+"""
+Background refresh of popular cache entries.
+
+Every settings.CACHE_REFRESH_INTERVAL seconds the refresher looks at the entries whose translation was served
+at least CACHE_REFRESH_MIN_HITS times (counts are halved every run, so this follows recent traffic) and
+    - re-translates and re-analyzes those that expire within CACHE_REFRESH_AHEAD seconds (with CACHE_TTL set),
+    - analyzes those that have no analysis yet,
+at most CACHE_REFRESH_BATCH of each per run. It only uses the upstream capacity that admission control gives
+to optional work, and stops for the run as soon as that is used up, so user requests always come first.
+"""
+from .admission import ADMISSION, Overloaded
+from .cache import CACHE_STORE
+from . import analysis_jobs, cluster, metrics, services
+from django.conf import settings
+from typing import Callable
+import threading
+
+
+def refresh_entry(key: str):
+    """Translate (and analyze, if it has an analysis) a cached entry again. Raises Overloaded when busy."""
+    jp_text = CACHE_STORE.get_original_text(key)
+    had_analysis = CACHE_STORE.has_analysis(key)
+
+    with ADMISSION.slot('analyze'):
+        en_text = services.openAI_translate(jp_text)
+    if not en_text:
+        metrics.CACHE_REFRESHES.inc(task='translate', outcome='error')
+        return
+    CACHE_STORE.refresh_translation(key, en_text)
+    metrics.CACHE_REFRESHES.inc(task='translate', outcome='success')
+
+    if had_analysis:
+        analyze_entry(key)
+    cluster.PEER_CACHE.publish(key)
+
+def analyze_entry(key: str):
+    result = analysis_jobs.analyze(key)
+    if result.retry_after:
+        raise Overloaded(result.retry_after)
+    metrics.CACHE_REFRESHES.inc(task='analyze', outcome='error' if result.failed else 'success')
+
+def run_once():
+    """One refresher pass. Returns the number of upstream refreshes started."""
+    hot_keys = [key for key, _ in CACHE_STORE.get_hot_keys(settings.CACHE_REFRESH_MIN_HITS)]
+    CACHE_STORE.decay_access_counts()
+
+    expiring = []
+    if settings.CACHE_TTL:
+        for key in hot_keys:
+            age = CACHE_STORE.get_age(key)
+            if age is not None and age >= settings.CACHE_TTL - settings.CACHE_REFRESH_AHEAD:
+                expiring.append(key)
+    unanalyzed = [key for key in hot_keys if key not in expiring and not CACHE_STORE.has_analysis(key)]
+
+    count = 0
+    try:
+        for key in expiring[:settings.CACHE_REFRESH_BATCH]:
+            refresh_entry(key)
+            count += 1
+        for key in unanalyzed[:settings.CACHE_REFRESH_BATCH]:
+            analyze_entry(key)
+            count += 1
+    except Overloaded:
+        # no idle capacity left, try again next run
+        metrics.CACHE_REFRESHES.inc(task='any', outcome='deferred')
+    return count
+
+def start_refresher_thread(interval: float) -> Callable[[], None]:
+    """Run the refresher every interval seconds. Returns a function that stops the thread (see background.py)."""
+    stop_event = threading.Event()
+
+    def run():
+        while not stop_event.wait(interval):
+            try:
+                run_once()
+            except Exception as e:
+                print(f"Cache refresh error: {e}")
+
+    threading.Thread(target=run, name='cache-refresher', daemon=True).start()
+    return stop_event.set
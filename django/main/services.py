@@ -1,63 +1,325 @@
+from . import metrics, tracing
+from collections import defaultdict, deque
 from django.conf import settings
-from openai import OpenAI
+from typing import NamedTuple
+import json
 import os
+import re
+import threading
+import time
 
-def get_json_schema():
+KANJI_PATTERN = re.compile(r'[\u4E00-\u9FFF]')
+
+class Route(NamedTuple):
+    name: str
+    model: str
+    reasoning_effort: str
+
+class RouteStats:
+    """
+    Per-route request, failure and latency counters, grouped by input bucket. They are also counted in the
+    learnjp_route_* metrics, which /metrics adds up across workers.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = defaultdict(lambda: {'requests': 0, 'failures': 0, 'total_latency': 0.0})
+        self.decisions = deque(maxlen=100)
+
+    def record_decision(self, route: Route, task: str, bucket: tuple):
+        with self._lock:
+            self.decisions.append((time.time(), task, route.name, bucket))
+        metrics.ROUTE_DECISIONS.inc(route=route.name, task=task, bucket=_bucket_label(bucket))
+        if settings.DEBUG:
+            print(f"Route: {task} {bucket} -> {route.name} ({route.model}, {route.reasoning_effort})")
+
+    def record_result(self, route: Route, task: str, bucket: tuple, latency: float, success: bool):
+        with self._lock:
+            entry = self._stats[(route.name, task, bucket)]
+            entry['requests'] += 1
+            entry['total_latency'] += latency
+            if not success:
+                entry['failures'] += 1
+        labels = {'route': route.name, 'task': task, 'bucket': _bucket_label(bucket)}
+        metrics.ROUTE_REQUESTS.inc(**labels)
+        metrics.ROUTE_SECONDS.inc(latency, **labels)
+        if not success:
+            metrics.ROUTE_FAILURES.inc(**labels)
+
+    def record_failure(self, route: Route, task: str, bucket: tuple):
+        # the call itself succeeded but its output was rejected later, e.g. by schema validation
+        with self._lock:
+            self._stats[(route.name, task, bucket)]['failures'] += 1
+        metrics.ROUTE_FAILURES.inc(route=route.name, task=task, bucket=_bucket_label(bucket))
+
+    def failure_rate(self, route_name: str, task: str, bucket: tuple) -> float:
+        with self._lock:
+            entry = self._stats.get((route_name, task, bucket))
+            if not entry or entry['requests'] < settings.ROUTE_MIN_SAMPLES:
+                return 0.0
+            return min(entry['failures'] / entry['requests'], 1.0)
+
+    def summary(self) -> list[dict]:
+        with self._lock:
+            return [
+                {
+                    'route': route_name, 'task': task, 'bucket': bucket,
+                    'requests': entry['requests'], 'failures': entry['failures'],
+                    'avg_latency': entry['total_latency'] / entry['requests'] if entry['requests'] else 0.0,
+                }
+                for (route_name, task, bucket), entry in self._stats.items()
+            ]
+
+    def clear(self):
+        with self._lock:
+            self._stats.clear()
+            self.decisions.clear()
+
+def _bucket_label(bucket: tuple) -> str:
+    # e.g. '1-2': 50-99 characters, kanji making up 50-74% of them (see get_text_bucket)
+    return '-'.join(str(part) for part in bucket)
+
+ROUTE_STATS = RouteStats()
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+def get_openai_client():
+    """
+    Shared OpenAI client for this process. The SDK is imported on first use to keep worker boot fast,
+    and the client is created again after a fork (e.g. gunicorn --preload) so workers never share connections.
+    """
+    global _client, _client_pid
+
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            from openai import OpenAI
+
+            _client = OpenAI(
+                base_url = settings.TRANSLATION_MODEL_PROVIDER_URL,
+                api_key = settings.TRANSLATION_MODEL_API_KEY,
+            )
+            _client_pid = os.getpid()
+        return _client
+
+def get_json_schema(include_translation: bool = False):
     current_dir = os.path.dirname(os.path.abspath(__file__))
     file_path = os.path.join(current_dir, 'schema.json')
     with open(file_path, 'r') as file:
-        return file.read()
+        schema = file.read()
+
+    if not include_translation:
+        return schema
+
+    # combined mode: the same schema plus a required top-level translation of the whole text
+    schema = json.loads(schema)
+    schema['properties']['english_translation'] = {
+        "type": "string",
+        "description": "English translation of the whole Japanese text.",
+        "minLength": 1
+    }
+    schema['required'].append('english_translation')
+    return json.dumps(schema, indent=2)
+
+def _kanji_ratio(text: str) -> float:
+    return len(KANJI_PATTERN.findall(text)) / len(text) if text else 0.0
+
+def get_text_bucket(jp_text: str) -> tuple:
+    """Group similar inputs by length and kanji density so failure rates can be tracked per group."""
+    text = ''.join((jp_text or '').split())
+    return (min(len(text) // 50, 4), int(_kanji_ratio(text) * 4))
+
+def select_route(jp_text: str, task: str) -> Route:
+    """Pick the first route in settings.TRANSLATION_MODEL_ROUTES that fits the text and is not failing for similar texts."""
+    text = ''.join((jp_text or '').split())
+    kanji_ratio = _kanji_ratio(text)
+    bucket = get_text_bucket(jp_text)
+
+    selected = Route('default', settings.TRANSLATION_MODEL, settings.TRANSLATION_MODEL_REASONING_EFFORT)
+    for route in settings.TRANSLATION_MODEL_ROUTES:
+        if 'tasks' in route and task not in route['tasks']:
+            continue
+        if 'max_length' in route and len(text) > route['max_length']:
+            continue
+        if 'max_kanji_ratio' in route and kanji_ratio > route['max_kanji_ratio']:
+            continue
+        if ROUTE_STATS.failure_rate(route['name'], task, bucket) > settings.ROUTE_MAX_FAILURE_RATE:
+            # this route keeps failing for similar texts, escalate to the next one
+            continue
+        selected = Route(route['name'], route['model'], route['reasoning_effort'])
+        break
 
-def openAI_translate(jp_text: str):
+    ROUTE_STATS.record_decision(selected, task, bucket)
+    return selected
+
+def record_validation_failure(route: Route, task: str, jp_text: str):
+    ROUTE_STATS.record_failure(route, task, get_text_bucket(jp_text))
+
+def _record_call(route: Route, task: str, jp_text: str, latency: float, result, response):
+    ROUTE_STATS.record_result(route, task, get_text_bucket(jp_text), latency, bool(result))
+    metrics.STAGE_SECONDS.observe(latency, stage=task)
+    metrics.UPSTREAM_REQUESTS.inc(service='llm', task=task, outcome='success' if result else 'error')
+    if response is not None:
+        metrics.record_usage(route.model, getattr(response, 'usage', None))
+
+def openAI_translate(jp_text: str, route: Route | None = None):
+    route = route or select_route(jp_text, 'translate')
+    start_time = time.time()
+    result = None
+    response = None
+
+    with tracing.span('llm.client'):
+        client = get_openai_client()
 
-    client = OpenAI(
-        base_url = settings.TRANSLATION_MODEL_PROVIDER_URL,
-        api_key = settings.TRANSLATION_MODEL_API_KEY,
-    )
-    
     try:
-        response = client.chat.completions.create(
-            model= settings.TRANSLATION_MODEL,
-            messages=[
-                #to turn off reasoning for qwen3-235b-a22b: add /no_think at the beginning of system prompt,
-                #to turn off reasoning for glm-4.5-air: add /nothink at the end of each user prompt,
-                {"role": "system", "content": "You are an experienced Japanese to English translator. For a given user prompt, translate the Japanese text into English. Do not add any explanation."},
-                {"role": "user", "content": jp_text}
-            ],
-            reasoning_effort = settings.TRANSLATION_MODEL_REASONING_EFFORT
-        )
-        return response.choices[0].message.content
+        with tracing.span('llm.generate', task='translate', model=route.model):
+            response = client.chat.completions.create(
+                model= route.model,
+                messages=[
+                    #to turn off reasoning for qwen3-235b-a22b: add /no_think at the beginning of system prompt,
+                    #to turn off reasoning for glm-4.5-air: add /nothink at the end of each user prompt,
+                    {"role": "system", "content": "You are an experienced Japanese to English translator. For a given user prompt, translate the Japanese text into English. Do not add any explanation."},
+                    {"role": "user", "content": jp_text}
+                ],
+                reasoning_effort = route.reasoning_effort
+            )
+        result = response.choices[0].message.content
 
     except Exception as e:
         print(f"Translation API error: {e}")
         if 'response' in locals() and response and response.choices:
-            print(response.choices[0].message.content) 
-        return None
-
-    
-def openAI_analyze(jp_text: str):
-    client = OpenAI(
-        base_url = settings.TRANSLATION_MODEL_PROVIDER_URL,
-        api_key = settings.TRANSLATION_MODEL_API_KEY,
-    )
-    
+            print(response.choices[0].message.content)
+
+    _record_call(route, 'translate', jp_text, time.time() - start_time, result, response)
+    return result
+
+
+def openAI_analyze(jp_text: str, route: Route | None = None):
+    route = route or select_route(jp_text, 'analyze')
+    start_time = time.time()
+    result = None
+    response = None
+
+    with tracing.span('llm.client'):
+        client = get_openai_client()
+
     try:
-        response = client.chat.completions.create(
-            model= settings.TRANSLATION_MODEL,
-            messages=[
-                #to turn off reasoning for qwen3-235b-a22b: add /no_think at the beginning of system prompt,
-                #to turn off reasoning for glm-4.5-air: add /nothink at the end of each user prompt,
-                {"role": "system", "content": "You are an experienced Japanese to English translator. For a given user prompt, " +
-                "break down the Japanese text using Bunsetsu and do morphological analysis for each of them. Return the result in JSON using this schema. Do not add any text before or after the JSON." + get_json_schema()},
-                {"role": "user", "content": jp_text}
-            ],
-            reasoning_effort = settings.TRANSLATION_MODEL_REASONING_EFFORT
-        )
-        result = response.choices[0].message.content.lstrip("```json").rstrip("`")        
+        with tracing.span('llm.generate', task='analyze', model=route.model):
+            response = client.chat.completions.create(
+                model= route.model,
+                messages=[
+                    #to turn off reasoning for qwen3-235b-a22b: add /no_think at the beginning of system prompt,
+                    #to turn off reasoning for glm-4.5-air: add /nothink at the end of each user prompt,
+                    {"role": "system", "content": "You are an experienced Japanese to English translator. For a given user prompt, " +
+                    "break down the Japanese text using Bunsetsu and do morphological analysis for each of them. Return the result in JSON using this schema. Do not add any text before or after the JSON." + get_json_schema()},
+                    {"role": "user", "content": jp_text}
+                ],
+                reasoning_effort = route.reasoning_effort
+            )
+        result = response.choices[0].message.content.lstrip("```json").rstrip("`")
 
     except Exception as e:
         print(f"Analysis API error: {e}")
-        if 'response' in locals() and response and response.choices:
-            result = None    
 
-    return result
\ No newline at end of file
+    _record_call(route, 'analyze', jp_text, time.time() - start_time, result, response)
+    return result
+
+
+def openAI_analyze_span(jp_text: str, before: str, after: str, route: Route | None = None):
+    """Analyze part of a text, with the text around it given as context only (see incremental.py)."""
+    route = route or select_route(jp_text, 'analyze')
+    start_time = time.time()
+    result = None
+    response = None
+
+    with tracing.span('llm.client'):
+        client = get_openai_client()
+
+    try:
+        with tracing.span('llm.generate', task='analyze_span', model=route.model):
+            response = client.chat.completions.create(
+                model= route.model,
+                messages=[
+                    {"role": "system", "content": "You are an experienced Japanese to English translator. The user prompt is a JSON object with part of " +
+                    "a Japanese text in \"text\", and the text just before and after it in \"before\" and \"after\". Break down only the part in \"text\" " +
+                    "using Bunsetsu and do morphological analysis for each of them, using the surrounding text only to understand it. " +
+                    "Return the result in JSON using this schema. Do not add any text before or after the JSON." + get_json_schema()},
+                    {"role": "user", "content": json.dumps({"before": before, "text": jp_text, "after": after}, ensure_ascii=False)}
+                ],
+                reasoning_effort = route.reasoning_effort
+            )
+        result = response.choices[0].message.content.lstrip("```json").rstrip("`")
+
+    except Exception as e:
+        print(f"Analysis API error: {e}")
+
+    _record_call(route, 'analyze_span', jp_text, time.time() - start_time, result, response)
+    return result
+
+
+def openAI_translate_and_analyze(jp_text: str, route: Route | None = None):
+    route = route or select_route(jp_text, 'analyze')
+    start_time = time.time()
+    result = None
+    response = None
+
+    with tracing.span('llm.client'):
+        client = get_openai_client()
+
+    try:
+        with tracing.span('llm.generate', task='translate_and_analyze', model=route.model):
+            response = client.chat.completions.create(
+                model= route.model,
+                messages=[
+                    {"role": "system", "content": "You are an experienced Japanese to English translator. For a given user prompt, " +
+                    "translate the whole Japanese text into English, then break down the Japanese text using Bunsetsu and do morphological analysis for each of them. " +
+                    "Return both in JSON using this schema. Do not add any text before or after the JSON." + get_json_schema(include_translation=True)},
+                    {"role": "user", "content": jp_text}
+                ],
+                response_format = {"type": "json_object"},
+                reasoning_effort = route.reasoning_effort
+            )
+        result = response.choices[0].message.content.lstrip("```json").rstrip("`")
+
+    except Exception as e:
+        print(f"Translation and analysis API error: {e}")
+
+    _record_call(route, 'analyze', jp_text, time.time() - start_time, result, response)
+    return result
+
+
+def openAI_translate_batch(jp_texts: list[str], route: Route | None = None) -> list[str | None]:
+    """Translate several texts with one call. Returns a translation or None (missing from the response) per text."""
+    route = route or select_route(max(jp_texts, key=len), 'translate')
+    start_time = time.time()
+    results = [None] * len(jp_texts)
+    response = None
+
+    with tracing.span('llm.client'):
+        client = get_openai_client()
+
+    try:
+        with tracing.span('llm.generate', task='translate_batch', model=route.model, size=len(jp_texts)):
+            response = client.chat.completions.create(
+                model= route.model,
+                messages=[
+                    {"role": "system", "content": "You are an experienced Japanese to English translator. The user prompt is a JSON object " +
+                    "with numbered Japanese texts. Translate each text into English on its own. Return only JSON in the form " +
+                    '{"translations": [{"id": <id of the text>, "english": "<translation>"}]}, with one entry per text. Do not add any explanation.'},
+                    {"role": "user", "content": json.dumps({"texts": [{"id": i, "japanese": text} for i, text in enumerate(jp_texts, start=1)]}, ensure_ascii=False)}
+                ],
+                response_format = {"type": "json_object"},
+                reasoning_effort = route.reasoning_effort
+            )
+        content = response.choices[0].message.content.lstrip("```json").rstrip("`")
+        for item in json.loads(content).get('translations', []):
+            index = int(item.get('id', 0)) - 1
+            if 0 <= index < len(jp_texts) and isinstance(item.get('english'), str) and item['english'].strip():
+                results[index] = item['english']
+
+    except Exception as e:
+        print(f"Batch translation API error: {e}")
+
+    _record_call(route, 'translate_batch', '\n'.join(jp_texts), time.time() - start_time, any(results), response)
+    return results
@@ -0,0 +1,106 @@
+"""
+Text normalization and a MinHash/LSH index for finding near-duplicate cached texts,
+e.g. the same page OCR'd twice with different line breaks or stray punctuation.
+"""
+from collections import defaultdict
+import random
+import threading
+import unicodedata
+import zlib
+
+# Mersenne prime larger than any 32-bit shingle hash
+PRIME = (1 << 61) - 1
+
+def normalize_text(text: str) -> str:
+    """Fold full-/half-width forms (NFKC) and drop whitespace, which Japanese text doesn't need."""
+    return ''.join(unicodedata.normalize('NFKC', text or '').split())
+
+def _fold_punctuation(text: str) -> str:
+    return ''.join(char for char in text if not unicodedata.category(char).startswith('P'))
+
+def get_shingles(text: str, ngram: int) -> set[str]:
+    text = _fold_punctuation(normalize_text(text))
+    if len(text) <= ngram:
+        return {text} if text else set()
+    return {text[i:i + ngram] for i in range(len(text) - ngram + 1)}
+
+
+class MinHashIndex:
+    """Approximate Jaccard similarity over character n-grams, with LSH banding to find candidates quickly."""
+
+    def __init__(self, num_perm: int = 64, bands: int = 16, ngram: int = 2, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError('num_perm must be a multiple of bands')
+        self.ngram = ngram
+        self._bands = bands
+        self._rows = num_perm // bands
+        generator = random.Random(seed)
+        self._permutations = [(generator.randrange(1, PRIME), generator.randrange(0, PRIME)) for _ in range(num_perm)]
+        self._lock = threading.Lock()
+        self._signatures = {}
+        self._buckets = defaultdict(set)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._signatures
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def signature(self, text: str) -> tuple[int, ...] | None:
+        hashes = [zlib.crc32(shingle.encode('utf-8')) for shingle in get_shingles(text, self.ngram)]
+        if not hashes:
+            return None
+        return tuple(min((a * h + b) % PRIME for h in hashes) for a, b in self._permutations)
+
+    def _band_keys(self, signature: tuple[int, ...]):
+        for band in range(self._bands):
+            yield band, signature[band * self._rows:(band + 1) * self._rows]
+
+    def add(self, key: str, text: str):
+        signature = self.signature(text)
+        if signature is None:
+            return
+        with self._lock:
+            self._remove(key)
+            self._signatures[key] = signature
+            for band_key in self._band_keys(signature):
+                self._buckets[band_key].add(key)
+
+    def remove(self, key: str):
+        with self._lock:
+            self._remove(key)
+
+    def _remove(self, key: str):
+        signature = self._signatures.pop(key, None)
+        if signature is None:
+            return
+        for band_key in self._band_keys(signature):
+            bucket = self._buckets.get(band_key)
+            if bucket:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band_key]
+
+    def clear(self):
+        with self._lock:
+            self._signatures.clear()
+            self._buckets.clear()
+
+    def query(self, text: str, threshold: float) -> list[tuple[float, str]]:
+        """Return (estimated similarity, key) pairs at or above threshold, most similar first."""
+        signature = self.signature(text)
+        if signature is None:
+            return []
+
+        with self._lock:
+            candidates = set()
+            for band_key in self._band_keys(signature):
+                candidates.update(self._buckets.get(band_key, ()))
+            scored = []
+            for key in candidates:
+                other = self._signatures[key]
+                similarity = sum(1 for a, b in zip(signature, other) if a == b) / len(signature)
+                if similarity >= threshold:
+                    scored.append((similarity, key))
+
+        return sorted(scored, reverse=True)
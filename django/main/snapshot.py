@@ -0,0 +1,192 @@
+"""
+On-disk snapshot of the translation and analysis caches, so a new worker can start with a warm cache.
+
+File layout (all integers little-endian):
+    header:  magic (8 bytes) | flags (uint32) | entry count (uint32) | index offset (uint64)
+    records: length (uint32) | payload, one per entry. The payload is a JSON object with
+             japanese, english, analysis and created, zlib-compressed when FLAG_COMPRESSED is set.
+    index:   key length (uint16) | key (utf-8) | record offset (uint64) | record length (uint32), one per entry
+
+Only the index is parsed when a snapshot is opened. Records are read from the memory-mapped
+file the first time their key is looked up.
+"""
+from typing import Callable, NamedTuple
+import json
+import mmap
+import os
+import struct
+import threading
+import zlib
+
+MAGIC = b'LJPSNAP1'
+FLAG_COMPRESSED = 1
+HEADER = struct.Struct('<8sIIQ')
+RECORD_LENGTH = struct.Struct('<I')
+INDEX_KEY_LENGTH = struct.Struct('<H')
+INDEX_ENTRY = struct.Struct('<QI')
+
+class SnapshotEntry(NamedTuple):
+    japanese: str
+    english: str
+    analysis: str
+    # when the entry was translated (time.time()), for CACHE_TTL. Missing in older snapshots.
+    created: float | None = None
+
+class Snapshot:
+    """Read-only, lazily decoded view of a snapshot file."""
+
+    def __init__(self, path):
+        self.path = path
+        # the age of entries without a created time
+        self.written = os.path.getmtime(path)
+        with open(path, 'rb') as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            self._index = self._read_index()
+        except (struct.error, UnicodeDecodeError, ValueError) as e:
+            # e.g. a file cut short by a full disk or a crash while copying it
+            self._mmap.close()
+            raise ValueError(f'{path} is not a cache snapshot or is truncated: {e}') from e
+
+    def _read_index(self) -> dict:
+        magic, self._flags, count, index_offset = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError('bad magic number')
+
+        index = {}
+        position = index_offset
+        for _ in range(count):
+            (key_length,) = INDEX_KEY_LENGTH.unpack_from(self._mmap, position)
+            position += INDEX_KEY_LENGTH.size
+            key = self._mmap[position:position + key_length].decode('utf-8')
+            position += key_length
+            offset, length = INDEX_ENTRY.unpack_from(self._mmap, position)
+            position += INDEX_ENTRY.size
+            if offset + length > len(self._mmap):
+                raise ValueError(f'record of {key} is past the end of the file')
+            index[key] = (offset, length)
+        return index
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def keys(self):
+        return self._index.keys()
+
+    def get(self, key: str) -> SnapshotEntry | None:
+        if key not in self._index:
+            return None
+        payload = self.get_raw(key)
+        if self._flags & FLAG_COMPRESSED:
+            payload = zlib.decompress(payload)
+        return SnapshotEntry(**json.loads(payload))
+
+    def get_raw(self, key: str) -> bytes:
+        offset, length = self._index[key]
+        return self._mmap[offset:offset + length]
+
+    @property
+    def compressed(self) -> bool:
+        return bool(self._flags & FLAG_COMPRESSED)
+
+    def close(self):
+        self._mmap.close()
+
+
+def write_snapshot(path, entries, compress: bool = True, previous: Snapshot | None = None, limit: int | None = None) -> int:
+    """
+    Write (key, SnapshotEntry) pairs to path. Entries of a previous snapshot that are not in entries are
+    carried over (without decoding them) until limit is reached. The file is replaced atomically.
+    Returns the number of entries written.
+    """
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    index = []
+
+    with open(temp_path, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, 0, 0, 0))
+
+        def write_record(key: str, payload: bytes):
+            offset = file.tell() + RECORD_LENGTH.size
+            file.write(RECORD_LENGTH.pack(len(payload)))
+            file.write(payload)
+            index.append((key, offset, len(payload)))
+
+        for key, entry in entries:
+            payload = json.dumps(entry._asdict(), ensure_ascii=False).encode('utf-8')
+            write_record(key, zlib.compress(payload) if compress else payload)
+
+        if previous is not None:
+            written = {key for key, _, _ in index}
+            for key in previous.keys():
+                if limit is not None and len(index) >= limit:
+                    break
+                if key in written:
+                    continue
+                if previous.compressed == compress:
+                    write_record(key, previous.get_raw(key))
+                else:
+                    entry = previous.get(key)
+                    payload = json.dumps(entry._asdict(), ensure_ascii=False).encode('utf-8')
+                    write_record(key, zlib.compress(payload) if compress else payload)
+
+        index_offset = file.tell()
+        for key, offset, length in index:
+            encoded_key = key.encode('utf-8')
+            file.write(INDEX_KEY_LENGTH.pack(len(encoded_key)))
+            file.write(encoded_key)
+            file.write(INDEX_ENTRY.pack(offset, length))
+
+        file.seek(0)
+        file.write(HEADER.pack(MAGIC, FLAG_COMPRESSED if compress else 0, len(index), index_offset))
+
+    os.replace(temp_path, path)
+    return len(index)
+
+
+def save_cache_snapshot(cache_store, path, compress: bool = True) -> int:
+    """
+    Save the entries of cache_store to path, merged with the snapshot currently on disk, which other workers
+    may have saved since this one started. A concurrent save can still drop the other worker's newest entries,
+    until it saves them again.
+    """
+    try:
+        on_disk = Snapshot(path)
+    except (OSError, ValueError):
+        # not saved yet, or unreadable: it is replaced
+        on_disk = None
+    previous = on_disk if on_disk is not None else cache_store.snapshot
+    try:
+        return write_snapshot(path, cache_store.export_entries(), compress=compress, previous=previous,
+                              limit=cache_store.capacity)
+    finally:
+        if on_disk is not None:
+            on_disk.close()
+
+
+def start_snapshot_thread(cache_store, path, interval: float, compress: bool = True) -> Callable[[], None]:
+    """
+    Save the cache every interval seconds. Returns a function that stops the thread and saves once more,
+    for when the process exits (see background.py).
+    """
+    stop_event = threading.Event()
+
+    def save():
+        try:
+            save_cache_snapshot(cache_store, path, compress)
+        except Exception as e:
+            print(f"Cache snapshot error: {e}")
+
+    def run():
+        while not stop_event.wait(interval):
+            save()
+
+    def stop():
+        stop_event.set()
+        save()
+
+    threading.Thread(target=run, name='cache-snapshot', daemon=True).start()
+    return stop
@@ -13,39 +13,213 @@ function debounce(callback, delay) {
   };
 }
 
+// Analyses are kept in localStorage under CACHE_PREFIX + key, where key is the server's hash of the text.
+// The index lists the cached keys with their sizes, least recently used first. The version, entry limit and
+// size limit come from the server (hidden inputs in translate.html); a new version drops all stored analyses.
+const CACHE_PREFIX = 'learnjp_analysis:';
+const CACHE_INDEX = 'learnjp_analysis_index';
+
+function cacheSettings() {
+    return {
+        version: $('#client_cache_version').val(),
+        maxEntries: parseInt($('#client_cache_max_entries').val()) || 0,
+        maxBytes: parseInt($('#client_cache_max_bytes').val()) || 0
+    };
+}
+
+function loadCacheIndex(settings) {
+    let index = null;
+    try {
+        index = JSON.parse(localStorage.getItem(CACHE_INDEX));
+    } catch (e) {}
+
+    if (!index || index.version !== settings.version || !Array.isArray(index.entries)) {
+        if (index && Array.isArray(index.entries)) {
+            index.entries.forEach(([oldKey]) => localStorage.removeItem(CACHE_PREFIX + oldKey));
+        }
+        index = {version: settings.version, entries: []};
+    }
+    return index;
+}
+
+function getCachedAnalysis(key) {
+    const settings = cacheSettings();
+    if (!key || !settings.version || settings.maxEntries <= 0) 
+        return null;
+
+    try {
+        const index = loadCacheIndex(settings);
+        if (!index.entries.some(([cachedKey]) => cachedKey === key)) 
+            return null;
+        return JSON.parse(localStorage.getItem(CACHE_PREFIX + key));
+    } catch (e) {
+        return null;
+    }
+}
+
+function storeCachedAnalysis(key, etag, data) {
+    const settings = cacheSettings();
+    if (!key || !settings.version || settings.maxEntries <= 0) 
+        return;
+
+    try {
+        const value = JSON.stringify({etag: etag, data: data});
+        const size = value.length * 2;  // localStorage strings are UTF-16
+        if (size > settings.maxBytes) 
+            return;
+
+        const index = loadCacheIndex(settings);
+        index.entries = index.entries.filter(([cachedKey]) => cachedKey !== key);
+        index.entries.push([key, size]);
+        let total = index.entries.reduce((sum, [, entrySize]) => sum + entrySize, 0);
+        while (index.entries.length > settings.maxEntries || total > settings.maxBytes) {
+            const [oldKey, oldSize] = index.entries.shift();
+            localStorage.removeItem(CACHE_PREFIX + oldKey);
+            total -= oldSize;
+        }
+        localStorage.setItem(CACHE_PREFIX + key, value);
+        localStorage.setItem(CACHE_INDEX, JSON.stringify(index));
+    } catch (e) {
+        // storage full or disabled (e.g. private browsing)
+        console.log('Unable to cache analysis: ' + e);
+    }
+}
+
+// With settings.ANALYSIS_FRAGMENTS the server sends the analysis as ready HTML, stored here as {fragment: html}.
+function useFragments() {
+    return $('#analysis_fragments').val() === 'True';
+}
+
+// Server-sent events are only enabled (settings.ANALYSIS_EVENTS) when the server runs under ASGI,
+// and they carry JSON, so they aren't used for fragments.
+function useEvents() {
+    return !!window.EventSource && $('#analysis_events').val() === 'True' && !useFragments();
+}
+
+function escapeHtml(text) {
+    return $('<div>').text(text || '').html();
+}
+
+function showAnalysis(data, startTime) {
+    const endTime = performance.now();
+    const timeTaken = (endTime - startTime)/1000;
+    
+    let mode = $('#mode').val();
+    if (mode.toLowerCase() == 'debug') 
+        $('#ma_time').text(`Time taken: ${timeTaken.toFixed(2)} seconds`);
+
+    $('#translation_animation').hide();
+    showAnalysisResult(data);
+}
+
+const MAX_BUSY_RETRIES = 3;
+let busyRetries = 0;
+
+// The server turned the analysis away because it is busy. Try again when it says to.
+function retryWhenNotBusy(key, retryAfter) {
+    if (busyRetries >= MAX_BUSY_RETRIES) {
+        $('#translation_animation').hide();
+        $('#bunsetsu_container').show();
+        $('#ma_error').text('The server is busy. Unable to do morphological analysis right now.');
+        return;
+    }
+    busyRetries += 1;
+    setTimeout(() => {
+        if (useEvents())
+            subscribeMA(key);
+        else
+            fetchMA(key);
+    }, (parseInt(retryAfter) || 5) * 1000);
+}
+
 function fetchMA(key) {
 
     const startTime = performance.now();
-    fetch("/analyze?key=" + key)
+    const fragments = useFragments();
+    const cached = getCachedAnalysis(key);
+    if (cached && cached.data) {
+        // show the stored analysis right away, then check it is still current
+        showAnalysis(cached.data, startTime);
+    }
+
+    let etag = null;
+    const headers = (cached && cached.etag) ? {'If-None-Match': cached.etag} : {};
+    fetch((fragments ? "/analyze/fragment/?key=" : "/analyze/?key=") + key, {headers: headers, cache: 'no-store'})
         .then(response => {
+            if (response.status == 304) 
+                return null;
+            if (response.status == 503) {
+                retryWhenNotBusy(key, response.headers.get('Retry-After'));
+                return undefined;
+            }
+            if (response.status == 204) 
+                return {};
             if (!response.ok) {
                 throw new Error(`HTTP error! Status: ${response.status}`);
             }
+            etag = response.headers.get('ETag');
+            if (fragments) 
+                return response.text().then(html => ({fragment: html}));
             return response.json();
         })
         .then(data => {
-            const endTime = performance.now();
-            const timeTaken = (endTime - startTime)/1000;
-            
-            let mode = $('#mode').val();
-            if (mode.toLowerCase() == 'debug') 
-                $('#ma_time').text(`Time taken: ${timeTaken.toFixed(2)} seconds`);
-
-            $('#translation_animation').hide();
-            showAnalysisResult(data);            
+            if (data === undefined) 
+                return;
+            if (data === null) {
+                // not modified: mark as recently used
+                storeCachedAnalysis(key, cached.etag, cached.data);
+                return;
+            }
+            if (data && (data.bunsetsu_breakdown || data.fragment)) {
+                storeCachedAnalysis(key, etag, data);
+            }
+            else if (cached && cached.data) {
+                // keep showing the stored analysis rather than an error
+                return;
+            }
+            showAnalysis(data, startTime);
         })
         .catch(error => {
             console.error('There was a problem with the fetch operation:', error);
         });
 }
 
+// Receive the analysis from the server when it is ready. If the connection drops, EventSource reconnects
+// and the server waits for the analysis that is already running.
+function subscribeMA(key) {
+
+    const startTime = performance.now();
+    const source = new EventSource("/analyze/events/?key=" + key);
+
+    source.addEventListener('analysis', event => {
+        source.close();
+        const data = JSON.parse(event.data);
+        storeCachedAnalysis(key, event.lastEventId, data);
+        showAnalysis(data, startTime);
+    });
+    source.addEventListener('failed', event => {
+        source.close();
+        const data = JSON.parse(event.data);
+        if (data.retry_after)
+            retryWhenNotBusy(key, data.retry_after);
+        else
+            showAnalysis({}, startTime);
+    });
+    source.onerror = () => {
+        if (source.readyState === EventSource.CLOSED) {
+            // the browser gave up reconnecting
+            fetchMA(key);
+        }
+    };
+}
+
 function handleMouseOver() {
     $(this).addClass('bg-warning');
     $(this).popover({        
         placement: 'bottom',
         html: true,
-        title: $(this).data('romaji'),
-        content: $(this).data('baseForm') + '&nbsp;[' + $(this).data('pos') + ']' + '<hr>' + $(this).data('english')
+        title: escapeHtml($(this).data('romaji')),
+        content: escapeHtml($(this).data('baseForm')) + '&nbsp;[' + escapeHtml($(this).data('pos')) + ']' + '<hr>' + escapeHtml($(this).data('english'))
     });
     $(this).popover('show');
 }
@@ -91,8 +265,13 @@ function showAnalysisResult(result) {
     var $bunsetsu = $('#bunsetsu_container');
     $bunsetsu.show();    
     
-    if (!result || !result.bunsetsu_breakdown) {
+    if (result && result.fragment) {
+        // rendered and escaped on the server
+        $('#bunsetsu_phrases').html(result.fragment);
+    }
+    else if (!result || !result.bunsetsu_breakdown) {
         $('#ma_error').html('Something went wrong. Unable to do morthological analysis.');
+        return;
     }
     else {
         resultHtml = '';
@@ -102,11 +281,12 @@ function showAnalysisResult(result) {
             resultHtml += "<div class='row border-bottom pb-2 mb-2'><div class='col-4'>" + morphemes + "</div><div class='col'>" + bunsetsu.english_translation + "</div></div>";
         });
         $('#bunsetsu_phrases').html(resultHtml);
-
-        //Delegate the event only targetting 'span' elements 
-        $bunsetsu.on('mouseenter', 'span', handleMouseOver);
-        $bunsetsu.on('mouseleave', 'span', handleMouseLeave);    
     }
+
+    //Delegate the event only targetting 'span' elements 
+    $bunsetsu.off('mouseenter mouseleave', 'span');
+    $bunsetsu.on('mouseenter', 'span', handleMouseOver);
+    $bunsetsu.on('mouseleave', 'span', handleMouseLeave);    
 }
 
 $(document).ready(function() {
@@ -114,5 +294,8 @@ $(document).ready(function() {
     $bunsetsu.hide();
 
     key = $('#key').val();
-    fetchMA(key);                
+    if (useEvents() && !getCachedAnalysis(key))
+        subscribeMA(key);
+    else
+        fetchMA(key);                
 });
\ No newline at end of file
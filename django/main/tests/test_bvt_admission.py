@@ -0,0 +1,122 @@
+from django.test import SimpleTestCase, Client, override_settings
+from django.urls import reverse
+from unittest.mock import patch
+from main.admission import ADMISSION, Overloaded
+from main.cache import CACHE_STORE
+import threading
+import time
+
+@override_settings(ADMISSION_MAX_IN_FLIGHT=1, ADMISSION_MAX_QUEUE_WAIT=0)
+@patch('main.views.services.openAI_translate')
+@patch('main.views.services.openAI_analyze')
+class BVTAdmissionTest(SimpleTestCase):
+    """Business Validation Tests for admission control with mocked dependencies"""
+
+    def setUp(self):
+        """Set up test client and common test data"""
+        self.client = Client()
+        self.test_jp_text = "今日はいい天気です"
+        self.test_en_translation = "Nice weather today"
+        ADMISSION.clear()
+
+    def tearDown(self):
+        """Clean up after each test"""
+        CACHE_STORE._request_queue.clear()
+        CACHE_STORE._translation_cache.clear()
+        CACHE_STORE._analysis_cache.clear()
+        ADMISSION.clear()
+
+    def test_translation_rejected_when_saturated(self, mock_analyze, mock_translate):
+        """BVT: A translation miss should get a fast 503 with Retry-After when all upstream slots are busy"""
+        mock_translate.return_value = self.test_en_translation
+
+        with ADMISSION.slot('translate'):
+            response = self.client.post(reverse('main'), {'jp_text': self.test_jp_text})
+
+        self.assertEqual(response.status_code, 503)
+        self.assertTrue(int(response['Retry-After']) >= 1)
+        self.assertIn('busy', response.context['error_message'])
+        mock_translate.assert_not_called()
+
+    def test_cache_hit_served_when_saturated(self, mock_analyze, mock_translate):
+        """BVT: Cache hits should be served while upstream is saturated"""
+        CACHE_STORE.add_translation(jp_text=self.test_jp_text, en_text=self.test_en_translation)
+
+        with ADMISSION.slot('translate'):
+            response = self.client.post(reverse('main'), {'jp_text': self.test_jp_text})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, self.test_en_translation)
+
+    def test_analysis_rejected_when_saturated(self, mock_analyze, mock_translate):
+        """BVT: Analysis misses should be turned away with a 503 while translations use the slots"""
+        key = CACHE_STORE.add_translation(jp_text=self.test_jp_text, en_text=self.test_en_translation)
+
+        with ADMISSION.slot('translate'):
+            response = self.client.get(reverse('analyze') + f'?key={key}')
+
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response)
+        mock_analyze.assert_not_called()
+
+    @override_settings(ADMISSION_MAX_QUEUE_WAIT=2.0)
+    def test_translation_waits_for_slot(self, mock_analyze, mock_translate):
+        """BVT: A translation should wait for a slot that frees up within the queue wait limit"""
+        mock_translate.return_value = self.test_en_translation
+        acquired = threading.Event()
+
+        def hold_slot():
+            with ADMISSION.slot('translate'):
+                acquired.set()
+                time.sleep(0.2)
+        thread = threading.Thread(target=hold_slot)
+        thread.start()
+        acquired.wait(5)
+
+        response = self.client.post(reverse('main'), {'jp_text': self.test_jp_text})
+        thread.join()
+
+        self.assertEqual(response.status_code, 200)
+        mock_translate.assert_called_once()
+
+    @override_settings(ADMISSION_MAX_IN_FLIGHT=8, ADMISSION_TRANSLATE_SLO=0.05)
+    def test_translation_rejected_while_upstream_slow(self, mock_analyze, mock_translate):
+        """BVT: Translations should get a 503 while upstream is slower than the SLO, even with free slots"""
+        def slow_translate(jp_text):
+            time.sleep(0.1)
+            return self.test_en_translation
+        mock_translate.side_effect = slow_translate
+        self.client.post(reverse('main'), {'jp_text': self.test_jp_text})
+
+        response = self.client.post(reverse('main'), {'jp_text': "明日は雨です"})
+
+        self.assertEqual(response.status_code, 503)
+        self.assertTrue(int(response['Retry-After']) >= 1)
+        mock_translate.assert_called_once()
+
+    @override_settings(ADMISSION_MAX_IN_FLIGHT=8, ADMISSION_TRANSLATE_SLO=0.05)
+    def test_slo_recovery(self, mock_analyze, mock_translate):
+        """BVT: One call per average call time should go through, and a fast one should end the shedding"""
+        with ADMISSION.slot('translate'):
+            time.sleep(0.1)
+        with self.assertRaises(Overloaded):
+            with ADMISSION.slot('translate'):
+                pass
+        with ADMISSION.slot('analyze'):
+            pass
+
+        time.sleep(0.1)
+        with ADMISSION.slot('translate'):
+            pass
+        with ADMISSION.slot('translate'):
+            pass
+
+    @override_settings(ADMISSION_MAX_IN_FLIGHT=4, ADMISSION_ANALYSIS_SHARE=0.5)
+    def test_analysis_share(self, mock_analyze, mock_translate):
+        """BVT: Analyses should only use their share of the slots"""
+        with ADMISSION.slot('analyze'), ADMISSION.slot('analyze'):
+            with self.assertRaises(Overloaded):
+                with ADMISSION.slot('analyze'):
+                    pass
+            with ADMISSION.slot('translate'):
+                self.assertEqual(ADMISSION.status()['in_flight'], 3)
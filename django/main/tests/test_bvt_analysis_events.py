@@ -0,0 +1,121 @@
+from django.test import SimpleTestCase, AsyncClient, Client, override_settings
+from django.urls import reverse
+from unittest.mock import patch
+from main.cache import CACHE_STORE
+from main import analysis_jobs
+import json
+import os
+import tempfile
+import threading
+
+@override_settings(ANALYSIS_EVENTS=True)
+@patch('main.views.services.openAI_analyze')
+class BVTAnalysisEventsTest(SimpleTestCase):
+    """Business Validation Tests for pushed analysis events with mocked dependencies"""
+
+    def setUp(self):
+        """Set up test client and common test data"""
+        self.client = AsyncClient()
+        self.test_jp_text = "今日はいい天気です"
+        self.test_en_translation = "Nice weather today"
+        current_dir = os.path.dirname(os.path.abspath(__file__))
+        with open(os.path.join(current_dir, "test_data_valid_response.json"), 'r', encoding='utf-8') as file:
+            self.json_response = file.read()
+        self.key = CACHE_STORE.add_translation(jp_text=self.test_jp_text, en_text=self.test_en_translation)
+
+    def tearDown(self):
+        """Clean up after each test"""
+        CACHE_STORE._request_queue.clear()
+        CACHE_STORE._translation_cache.clear()
+        CACHE_STORE._analysis_cache.clear()
+
+    async def _read_events(self, key):
+        response = await self.client.get(reverse('analysis_events') + f'?key={key}')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        content = b''.join([chunk async for chunk in response.streaming_content])
+        return content.decode('utf-8')
+
+    @override_settings(ANALYSIS_EVENTS=False)
+    async def test_disabled(self, mock_analyze):
+        """BVT: Without ANALYSIS_EVENTS the endpoint should not exist, so pages fetch /analyze/"""
+        response = await self.client.get(reverse('analysis_events') + f'?key={self.key}')
+
+        self.assertEqual(response.status_code, 404)
+        mock_analyze.assert_not_called()
+
+    def test_not_served_under_wsgi(self, mock_analyze):
+        """BVT: Under WSGI the stream would be buffered, so the endpoint should not be served"""
+        response = Client().get(reverse('analysis_events') + f'?key={self.key}')
+
+        self.assertEqual(response.status_code, 404)
+        mock_analyze.assert_not_called()
+
+    async def test_analysis_event(self, mock_analyze):
+        """BVT: The analysis should be pushed as an event and cached"""
+        mock_analyze.return_value = self.json_response
+
+        content = await self._read_events(self.key)
+
+        self.assertIn('event: analysis', content)
+        self.assertIn('id: "', content)
+        data = ''.join(line[len('data: '):] for line in content.splitlines() if line.startswith('data: '))
+        self.assertEqual(json.loads(data), json.loads(self.json_response))
+        self.assertTrue(CACHE_STORE.has_analysis(self.key))
+
+    async def test_cached_analysis_event(self, mock_analyze):
+        """BVT: A cached analysis should be pushed without calling the API"""
+        CACHE_STORE.add_analysis(self.key, self.json_response)
+
+        content = await self._read_events(self.key)
+
+        self.assertIn('event: analysis', content)
+        mock_analyze.assert_not_called()
+
+    async def test_failed_event(self, mock_analyze):
+        """BVT: An invalid analysis should be reported as a failed event"""
+        mock_analyze.return_value = 'not json'
+
+        content = await self._read_events(self.key)
+
+        self.assertIn('event: failed', content)
+        self.assertFalse(CACHE_STORE.has_analysis(self.key))
+
+    async def test_unknown_key(self, mock_analyze):
+        """BVT: An unknown key should fail without calling the API"""
+        content = await self._read_events('unknown')
+
+        self.assertIn('event: failed', content)
+        mock_analyze.assert_not_called()
+
+    def test_single_flight(self, mock_analyze):
+        """BVT: Concurrent requests for the same key should share one analysis"""
+        release = threading.Event()
+
+        def slow_analyze(jp_text, route=None):
+            release.wait(5)
+            return self.json_response
+        mock_analyze.side_effect = slow_analyze
+
+        job = analysis_jobs.start(self.key)
+        self.assertIs(analysis_jobs.start(self.key), job)
+        release.set()
+
+        self.assertFalse(job.result(timeout=5).failed)
+        self.assertEqual(mock_analyze.call_count, 1)
+
+    def test_shared_result_from_other_worker(self, mock_analyze):
+        """BVT: A job claimed by another worker should not run again, and its result should be picked up"""
+        with tempfile.TemporaryDirectory() as events_dir, override_settings(ANALYSIS_EVENTS_DIR=events_dir):
+            with open(os.path.join(events_dir, f'{self.key}.claim'), 'w') as file:
+                file.write('12345')
+            self.assertIsNone(analysis_jobs.start(self.key))
+            self.assertTrue(analysis_jobs.is_claimed(self.key))
+            self.assertIsNone(analysis_jobs.get_result(self.key))
+
+            with open(os.path.join(events_dir, f'{self.key}.json'), 'w', encoding='utf-8') as file:
+                json.dump({'analysis': self.json_response, 'failed': False}, file)
+            result = analysis_jobs.get_result(self.key)
+
+            self.assertEqual(result.analysis, self.json_response)
+            self.assertTrue(CACHE_STORE.has_analysis(self.key))
+            mock_analyze.assert_not_called()
@@ -0,0 +1,168 @@
+from django.test import SimpleTestCase, Client, override_settings
+from django.urls import reverse
+from unittest.mock import MagicMock, patch
+from main.admission import ADMISSION, Overloaded
+from main.batcher import BATCHER
+from main.cache import CACHE_STORE
+from main import services
+import json
+import threading
+
+
+@override_settings(TRANSLATION_BATCH_WINDOW=0.05, TRANSLATION_BATCH_MAX_SIZE=16, TRANSLATION_BATCH_MAX_CHARS=2000)
+@patch('main.batcher.services.openAI_translate_batch')
+@patch('main.batcher.services.openAI_translate')
+class BVTTranslationBatcherTest(SimpleTestCase):
+    """Business Validation Tests for translation micro-batching with mocked dependencies"""
+
+    def setUp(self):
+        """Set up test client and common test data"""
+        self.client = Client()
+        self.test_jp_texts = ["今日はいい天気です", "明日は雨です", "猫が好きです"]
+
+    def tearDown(self):
+        """Clean up after each test"""
+        CACHE_STORE._request_queue.clear()
+        CACHE_STORE._translation_cache.clear()
+        CACHE_STORE._analysis_cache.clear()
+        ADMISSION.clear()
+
+    def _translate_concurrently(self, jp_texts):
+        results = {}
+        def translate(jp_text):
+            results[jp_text] = BATCHER.translate(jp_text)
+        threads = [threading.Thread(target=translate, args=(jp_text,)) for jp_text in jp_texts]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        return results
+
+    def test_concurrent_misses_batched(self, mock_translate, mock_batch):
+        """BVT: Misses within the window should be sent as one batch and fanned back out"""
+        mock_batch.side_effect = lambda texts: [f'EN {text}' for text in texts]
+
+        results = self._translate_concurrently(self.test_jp_texts)
+
+        self.assertEqual(results, {text: f'EN {text}' for text in self.test_jp_texts})
+        mock_batch.assert_called_once()
+        self.assertCountEqual(mock_batch.call_args[0][0], self.test_jp_texts)
+        mock_translate.assert_not_called()
+
+    def test_duplicate_texts_share_entry(self, mock_translate, mock_batch):
+        """BVT: The same text requested twice within a window should be translated once"""
+        mock_batch.side_effect = lambda texts: [f'EN {text}' for text in texts]
+        mock_translate.side_effect = lambda text: f'EN {text}'
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(BATCHER.translate(self.test_jp_texts[0])))
+                   for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(results, [f'EN {self.test_jp_texts[0]}'] * 3)
+        self.assertEqual(mock_translate.call_count + mock_batch.call_count, 1)
+
+    def test_single_miss_uses_plain_translation(self, mock_translate, mock_batch):
+        """BVT: A batch of one text should use the plain translation call"""
+        mock_translate.return_value = "Nice weather today"
+
+        self.assertEqual(BATCHER.translate(self.test_jp_texts[0]), "Nice weather today")
+        mock_batch.assert_not_called()
+
+    @override_settings(TRANSLATION_BATCH_WINDOW=5.0, TRANSLATION_BATCH_MAX_SIZE=3)
+    def test_full_batch_sent_early(self, mock_translate, mock_batch):
+        """BVT: A batch should be sent without waiting for the window once it is full"""
+        mock_batch.side_effect = lambda texts: [f'EN {text}' for text in texts]
+
+        results = self._translate_concurrently(self.test_jp_texts)
+
+        self.assertEqual(len(results), 3)
+        mock_batch.assert_called_once()
+
+    def test_missing_items_fall_back(self, mock_translate, mock_batch):
+        """BVT: Texts left out of a batch response should be translated on their own"""
+        mock_batch.side_effect = lambda texts: [f'EN {text}' if i else None for i, text in enumerate(texts)]
+        mock_translate.side_effect = lambda text: f'Alone {text}'
+
+        results = self._translate_concurrently(self.test_jp_texts)
+
+        self.assertEqual(sum(result.startswith('Alone') for result in results.values()), 1)
+        mock_translate.assert_called_once()
+
+    @override_settings(ADMISSION_MAX_IN_FLIGHT=1, ADMISSION_MAX_QUEUE_WAIT=0)
+    def test_batch_takes_one_slot(self, mock_translate, mock_batch):
+        """BVT: A batch should hold one admission slot for its upstream call, not one per waiting request"""
+        in_flight = []
+        def translate_batch(texts):
+            in_flight.append(ADMISSION.status()['in_flight'])
+            return [f'EN {text}' for text in texts]
+        mock_batch.side_effect = translate_batch
+
+        results = self._translate_concurrently(self.test_jp_texts)
+
+        self.assertEqual(results, {text: f'EN {text}' for text in self.test_jp_texts})
+        self.assertEqual(in_flight, [1])
+        self.assertEqual(ADMISSION.status()['in_flight'], 0)
+
+    @override_settings(ADMISSION_MAX_IN_FLIGHT=1, ADMISSION_MAX_QUEUE_WAIT=0)
+    def test_saturated_batch_rejected(self, mock_translate, mock_batch):
+        """BVT: Every request waiting for a batch should get Overloaded when no upstream slot is free"""
+        errors = []
+        def translate(jp_text):
+            try:
+                BATCHER.translate(jp_text)
+            except Overloaded as e:
+                errors.append(e)
+        threads = [threading.Thread(target=translate, args=(jp_text,)) for jp_text in self.test_jp_texts]
+
+        with ADMISSION.slot('translate'):
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join(5)
+
+        self.assertEqual(len(errors), 3)
+        mock_batch.assert_not_called()
+        mock_translate.assert_not_called()
+
+    @override_settings(TRANSLATION_BATCH_WINDOW=0)
+    def test_disabled(self, mock_translate, mock_batch):
+        """BVT: With no window every miss should be translated on its own"""
+        mock_translate.return_value = "Nice weather today"
+
+        response = self.client.post(reverse('main'), {'jp_text': self.test_jp_texts[0]})
+
+        self.assertContains(response, "Nice weather today")
+        mock_translate.assert_called_once()
+        mock_batch.assert_not_called()
+
+
+@patch('main.services.get_openai_client')
+class BVTTranslateBatchTest(SimpleTestCase):
+    """Business Validation Tests for the batched translation call with a mocked LLM client"""
+
+    def _client(self, content):
+        client = MagicMock()
+        client.chat.completions.create.return_value.choices[0].message.content = content
+        client.chat.completions.create.return_value.usage = None
+        return client
+
+    def test_results_in_order(self, mock_client):
+        """BVT: Translations should be matched to the texts by id, whatever their order in the response"""
+        mock_client.return_value = self._client(json.dumps({'translations': [
+            {'id': 2, 'english': 'Rain tomorrow'}, {'id': 1, 'english': 'Nice weather today'}]}))
+
+        results = services.openAI_translate_batch(["今日はいい天気です", "明日は雨です", "猫が好きです"])
+
+        self.assertEqual(results, ['Nice weather today', 'Rain tomorrow', None])
+        messages = mock_client.return_value.chat.completions.create.call_args.kwargs['messages']
+        self.assertEqual(len(json.loads(messages[1]['content'])['texts']), 3)
+
+    def test_invalid_response(self, mock_client):
+        """BVT: An unparseable response should leave every text untranslated"""
+        mock_client.return_value = self._client('not json')
+
+        self.assertEqual(services.openAI_translate_batch(["今日はいい天気です", "明日は雨です"]), [None, None])
@@ -160,3 +160,24 @@ class BVTCacheTest(SimpleTestCase):
         
 
     
+
+    def test_analysis_stored_compressed(self, mock_translate):
+        """BVT: Cached analyses should be kept compressed and returned unchanged"""
+        analysis = self._read_file_content("test_data_valid_response.json")
+        key = CACHE_STORE.add_translation(jp_text=self.test_jp_text, en_text=self.test_en_translation)
+        CACHE_STORE.add_analysis(key, analysis)
+
+        self.assertIsInstance(CACHE_STORE._analysis_cache[key], bytes)
+        self.assertLess(len(CACHE_STORE._analysis_cache[key]), len(analysis.encode('utf-8')) // 2)
+        self.assertEqual(CACHE_STORE.get_analysis(key), analysis)
+
+    def test_cache_memory_usage(self, mock_translate):
+        """BVT: Cache should report memory used by its entries"""
+        key = CACHE_STORE.add_translation(jp_text=self.test_jp_text, en_text=self.test_en_translation)
+        CACHE_STORE.add_analysis(key, self._read_file_content("test_data_valid_response.json"))
+
+        memory = CACHE_STORE.memory_usage()
+        self.assertEqual(memory['entries'], 1)
+        self.assertEqual(memory['analyses'], 1)
+        self.assertGreater(memory['analysis_bytes'], 0)
+        self.assertEqual(memory['bytes_per_entry'], memory['translation_bytes'] + memory['analysis_bytes'])
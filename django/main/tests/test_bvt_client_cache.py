@@ -0,0 +1,102 @@
+from django.test import SimpleTestCase, Client, override_settings
+from django.urls import reverse
+from unittest.mock import patch
+from main.cache import CACHE_STORE
+import os
+
+@patch('main.views.services.openAI_translate')
+@patch('main.views.services.openAI_analyze')
+class BVTClientCacheTest(SimpleTestCase):
+    """Business Validation Tests for browser-side analysis caching with mocked dependencies"""
+
+    def setUp(self):
+        """Set up test client and common test data"""
+        self.client = Client()
+        self.test_jp_text = "今日はいい天気です"
+        self.test_en_translation = "Nice weather today"
+        current_dir = os.path.dirname(os.path.abspath(__file__))
+        with open(os.path.join(current_dir, "test_data_valid_response.json"), 'r', encoding='utf-8') as file:
+            self.json_response = file.read()
+
+    def tearDown(self):
+        """Clean up after each test"""
+        CACHE_STORE._request_queue.clear()
+        CACHE_STORE._translation_cache.clear()
+        CACHE_STORE._analysis_cache.clear()
+
+    def _get_key(self, mock_translate):
+        mock_translate.return_value = self.test_en_translation
+        response = self.client.post(reverse('main'), {'jp_text': self.test_jp_text})
+        return response.context['key']
+
+    @override_settings(CLIENT_CACHE_VERSION='7')
+    def test_translate_page_has_cache_version(self, mock_analyze, mock_translate):
+        """BVT: The translation page should pass the client cache version and limits to the browser"""
+        mock_translate.return_value = self.test_en_translation
+        response = self.client.post(reverse('main'), {'jp_text': self.test_jp_text})
+
+        self.assertContains(response, 'id="client_cache_version" value="7"')
+        self.assertContains(response, 'id="client_cache_max_entries"')
+
+    def test_analysis_has_etag(self, mock_analyze, mock_translate):
+        """BVT: Analyses should be returned with an ETag and revalidated on every use"""
+        mock_analyze.return_value = self.json_response
+        key = self._get_key(mock_translate)
+
+        response = self.client.get(reverse('analyze') + f'?key={key}')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['ETag'].startswith('"'))
+        self.assertIn('no-cache', response['Cache-Control'])
+
+    def test_not_modified(self, mock_analyze, mock_translate):
+        """BVT: A matching If-None-Match should get 304 without calling the API again"""
+        mock_analyze.return_value = self.json_response
+        key = self._get_key(mock_translate)
+        etag = self.client.get(reverse('analyze') + f'?key={key}')['ETag']
+
+        response = self.client.get(reverse('analyze') + f'?key={key}', HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(mock_analyze.call_count, 1)
+
+    def test_not_modified_without_server_copy(self, mock_analyze, mock_translate):
+        """BVT: A current-version ETag should get 304 without a new analysis when the server lost its copy"""
+        mock_analyze.return_value = self.json_response
+        key = self._get_key(mock_translate)
+        etag = self.client.get(reverse('analyze') + f'?key={key}')['ETag']
+        CACHE_STORE._analysis_cache.clear()
+
+        response = self.client.get(reverse('analyze') + f'?key={key}', HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(mock_analyze.call_count, 1)
+
+        with override_settings(CLIENT_CACHE_VERSION='new'):
+            response = self.client.get(reverse('analyze') + f'?key={key}', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(mock_analyze.call_count, 2)
+
+    def test_version_change_invalidates_etag(self, mock_analyze, mock_translate):
+        """BVT: Changing the client cache version should make stored analyses stale"""
+        mock_analyze.return_value = self.json_response
+        key = self._get_key(mock_translate)
+        etag = self.client.get(reverse('analyze') + f'?key={key}')['ETag']
+
+        with override_settings(CLIENT_CACHE_VERSION='new'):
+            response = self.client.get(reverse('analyze') + f'?key={key}', HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_invalid_analysis_has_no_etag(self, mock_analyze, mock_translate):
+        """BVT: Failed analyses should not be cacheable by the browser"""
+        mock_analyze.return_value = None
+        key = self._get_key(mock_translate)
+
+        response = self.client.get(reverse('analyze') + f'?key={key}')
+
+        self.assertEqual(response.content.decode(), '{}')
+        self.assertFalse(response.has_header('ETag'))
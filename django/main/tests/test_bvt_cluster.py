@@ -0,0 +1,115 @@
+from django.test import SimpleTestCase, Client, override_settings
+from django.urls import reverse
+from unittest.mock import patch
+from main.cache import CACHE_STORE
+from main.cluster import HashRing, PEER_CACHE, PEER_TOKEN_HEADER
+import json
+import threading
+import urllib.error
+
+SELF_URL = 'http://node-a'
+OTHER_URL = 'http://node-b'
+
+@override_settings(CACHE_PEERS=[SELF_URL, OTHER_URL], CACHE_SELF_URL=SELF_URL, CACHE_PEER_SECRET='secret')
+@patch('main.views.services.openAI_translate')
+class BVTClusterTest(SimpleTestCase):
+    """Business Validation Tests for the peer cache with mocked peers"""
+
+    def setUp(self):
+        """Set up test client and common test data"""
+        self.client = Client()
+        self.test_jp_text = "今日はいい天気です"
+        self.test_en_translation = "Nice weather today"
+        PEER_CACHE.clear()
+
+    def tearDown(self):
+        """Clean up after each test"""
+        CACHE_STORE._request_queue.clear()
+        CACHE_STORE._translation_cache.clear()
+        CACHE_STORE._analysis_cache.clear()
+        PEER_CACHE.clear()
+
+    def _remote_text(self):
+        """A text whose key is owned by the other node"""
+        for i in range(100):
+            jp_text = f'{self.test_jp_text}{i}'
+            if PEER_CACHE.get_owner(CACHE_STORE.get_key(jp_text)) == OTHER_URL:
+                return jp_text
+
+    def test_hash_ring_rebalance(self, mock_translate):
+        """BVT: Adding a node should only move keys to the new node"""
+        keys = [f'key{i}' for i in range(2000)]
+        ring = HashRing(['a', 'b', 'c'])
+        bigger_ring = HashRing(['a', 'b', 'c', 'd'])
+
+        moved = [key for key in keys if ring.get_node(key) != bigger_ring.get_node(key)]
+
+        self.assertTrue(all(bigger_ring.get_node(key) == 'd' for key in moved))
+        self.assertLess(len(moved) / len(keys), 0.4)
+        self.assertEqual(sorted(ring.get_nodes('key1')), ['a', 'b', 'c'])
+
+    def test_fetch_from_owner(self, mock_translate):
+        """BVT: A local miss owned by another node should be served from that node"""
+        jp_text = self._remote_text()
+        entry = {'japanese': jp_text, 'english': self.test_en_translation, 'analysis': None}
+
+        with patch.object(PEER_CACHE, '_request', return_value=entry) as mock_request:
+            response = self.client.post(reverse('main'), {'jp_text': jp_text})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, self.test_en_translation)
+        mock_translate.assert_not_called()
+        self.assertEqual(mock_request.call_args[0][:2], ('GET', f'{OTHER_URL}/internal/cache/{CACHE_STORE.get_key(jp_text)}'))
+
+    def test_owner_down_falls_back(self, mock_translate):
+        """BVT: When the owner is down the node should translate locally and stop asking the owner"""
+        mock_translate.return_value = self.test_en_translation
+        jp_text = self._remote_text()
+        key = CACHE_STORE.get_key(jp_text)
+
+        with patch.object(PEER_CACHE, '_request', side_effect=urllib.error.URLError('refused')):
+            response = self.client.post(reverse('main'), {'jp_text': jp_text})
+
+        self.assertEqual(response.status_code, 200)
+        mock_translate.assert_called_once()
+        self.assertEqual(PEER_CACHE.get_owner(key), SELF_URL)
+
+    def test_publish_to_owner(self, mock_translate):
+        """BVT: A new translation should be sent to the owner node"""
+        mock_translate.return_value = self.test_en_translation
+        jp_text = self._remote_text()
+        sent = threading.Event()
+        requests = []
+
+        def request(method, url, body=None):
+            requests.append((method, url, body))
+            if method == 'PUT':
+                sent.set()
+                return None
+            raise urllib.error.HTTPError(url, 404, 'Not Found', None, None)
+
+        with patch.object(PEER_CACHE, '_request', side_effect=request):
+            self.client.post(reverse('main'), {'jp_text': jp_text})
+            self.assertTrue(sent.wait(5))
+
+        method, url, body = requests[-1]
+        self.assertEqual(method, 'PUT')
+        self.assertEqual(json.loads(body)['english'], self.test_en_translation)
+
+    def test_peer_endpoint(self, mock_translate):
+        """BVT: The internal endpoint should store and return entries for authenticated peers only"""
+        key = CACHE_STORE.get_key(self.test_jp_text)
+        url = reverse('peer_cache', args=[key])
+        entry = {'japanese': self.test_jp_text, 'english': self.test_en_translation, 'analysis': None}
+        headers = {f'HTTP_{PEER_TOKEN_HEADER.upper().replace("-", "_")}': 'secret'}
+
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.get(url, **headers).status_code, 404)
+        response = self.client.put(url, json.dumps(entry), content_type='application/json', **headers)
+        self.assertEqual(response.status_code, 204)
+        response = self.client.get(url, **headers)
+        self.assertEqual(response.json()['english'], self.test_en_translation)
+
+        wrong_key = dict(entry, japanese='別のテキスト')
+        response = self.client.put(url, json.dumps(wrong_key), content_type='application/json', **headers)
+        self.assertEqual(response.status_code, 400)
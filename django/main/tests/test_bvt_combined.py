@@ -0,0 +1,65 @@
+from django.test import SimpleTestCase, Client
+from django.urls import reverse
+from unittest.mock import patch
+from main.cache import CACHE_STORE
+import json
+import os
+
+@patch('main.views.services.openAI_translate')
+@patch('main.views.services.openAI_analyze')
+@patch('main.views.services.openAI_translate_and_analyze')
+class BVTCombinedTest(SimpleTestCase):
+    """Business Validation Tests for combined translation and analysis mode with mocked dependencies"""
+
+    def setUp(self):
+        """Set up test client and common test data"""
+        self.client = Client()
+        self.test_jp_text = "今日はいい天気です"
+        self.test_en_translation = "Nice weather today"
+
+    def tearDown(self):
+        """Clean up after each test"""
+        CACHE_STORE._request_queue.clear()
+        CACHE_STORE._translation_cache.clear()
+        CACHE_STORE._analysis_cache.clear()
+
+    # Helper function to read file
+    def _read_file_content(self, filename):
+        current_dir = os.path.dirname(os.path.abspath(__file__))
+        file_path = os.path.join(current_dir, filename)
+        with open(file_path, 'r', encoding='utf-8') as file:
+            json_result = file.read()
+
+        return json_result
+
+    def test_combined_mode_fills_both_caches(self, mock_combined, mock_analyze, mock_translate):
+        """BVT: One combined call should fill both translation and analysis caches"""
+        combined = json.loads(self._read_file_content("test_data_valid_response.json"))
+        combined['english_translation'] = self.test_en_translation
+        mock_combined.return_value = json.dumps(combined)
+
+        with self.settings(COMBINED_TRANSLATION_ANALYSIS=True):
+            response = self.client.post(reverse('main'), {'jp_text': self.test_jp_text})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, self.test_en_translation)
+        key = response.context['key']
+        self.assertTrue(CACHE_STORE.has_analysis(key))
+
+        response = self.client.get(reverse('analyze') + f'?key={key}')
+        self.assertEqual(response.status_code, 200)
+        mock_translate.assert_not_called()
+        mock_analyze.assert_not_called()
+
+    def test_combined_mode_invalid_response_falls_back(self, mock_combined, mock_analyze, mock_translate):
+        """BVT: Invalid combined response should fall back to translation only"""
+        mock_combined.return_value = self._read_file_content("test_data_invalid_response.json")
+        mock_translate.return_value = self.test_en_translation
+
+        with self.settings(COMBINED_TRANSLATION_ANALYSIS=True):
+            response = self.client.post(reverse('main'), {'jp_text': self.test_jp_text})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, self.test_en_translation)
+        self.assertFalse(CACHE_STORE.has_analysis(response.context['key']))
+        mock_translate.assert_called_once()
@@ -0,0 +1,146 @@
+from django.test import SimpleTestCase, Client, override_settings
+from django.urls import reverse
+from unittest.mock import patch
+from main.cache import CACHE_STORE
+from main.JsonResponse import JsonResponse
+from main import fragments
+import gzip
+import json
+import os
+
+@patch('main.views.services.openAI_analyze')
+class BVTAnalysisFragmentTest(SimpleTestCase):
+    """Business Validation Tests for server-rendered analysis HTML with mocked dependencies"""
+
+    def setUp(self):
+        """Set up test client and common test data"""
+        self.client = Client()
+        self.test_jp_text = "今日はいい天気です"
+        self.test_en_translation = "Nice weather today"
+        current_dir = os.path.dirname(os.path.abspath(__file__))
+        with open(os.path.join(current_dir, "test_data_valid_response.json"), 'r', encoding='utf-8') as file:
+            self.json_response = file.read()
+        self.key = CACHE_STORE.add_translation(jp_text=self.test_jp_text, en_text=self.test_en_translation)
+
+    def tearDown(self):
+        """Clean up after each test"""
+        CACHE_STORE._request_queue.clear()
+        CACHE_STORE._translation_cache.clear()
+        CACHE_STORE._analysis_cache.clear()
+        CACHE_STORE._fragment_cache.clear()
+
+    def _get_fragment(self, **headers):
+        return self.client.get(reverse('analysis_fragment') + f'?key={self.key}', **headers)
+
+    def test_gzipped_fragment(self, mock_analyze):
+        """BVT: The fragment should be sent gzipped, with an ETag, to clients that accept gzip"""
+        mock_analyze.return_value = self.json_response
+
+        response = self._get_fragment(HTTP_ACCEPT_ENCODING='gzip, deflate')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertTrue(response['ETag'].startswith('W/"'))
+        self.assertIn('Accept-Encoding', response['Vary'])
+        html = gzip.decompress(response.content).decode('utf-8')
+        first_bunsetsu = json.loads(self.json_response)['bunsetsu_breakdown'][0]
+        self.assertIn(first_bunsetsu['english_translation'], html)
+        self.assertIn('<span data-base-form=', html)
+
+    def test_plain_fragment(self, mock_analyze):
+        """BVT: Clients that don't accept gzip should get plain HTML"""
+        mock_analyze.return_value = self.json_response
+
+        response = self._get_fragment()
+
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertContains(response, "class=\"row border-bottom pb-2 mb-2\"")
+
+    def test_fragment_cached(self, mock_analyze):
+        """BVT: The fragment should be rendered once and kept next to the analysis"""
+        mock_analyze.return_value = self.json_response
+
+        with patch('main.fragments.render_fragment', wraps=fragments.render_fragment) as mock_render:
+            first = self._get_fragment(HTTP_ACCEPT_ENCODING='gzip')
+            second = self._get_fragment(HTTP_ACCEPT_ENCODING='gzip')
+
+        mock_render.assert_called_once()
+        mock_analyze.assert_called_once()
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(CACHE_STORE.get_fragment(self.key), first.content)
+
+        CACHE_STORE.add_analysis(self.key, self.json_response)
+        self.assertIsNone(CACHE_STORE.get_fragment(self.key))
+
+    def test_not_modified(self, mock_analyze):
+        """BVT: A matching If-None-Match should get 304"""
+        mock_analyze.return_value = self.json_response
+        etag = self._get_fragment()['ETag']
+
+        response = self._get_fragment(HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+
+    def test_not_modified_without_server_copy(self, mock_analyze):
+        """BVT: A current-version ETag should get 304 without a new analysis when the server lost its copy"""
+        mock_analyze.return_value = self.json_response
+        etag = self._get_fragment()['ETag']
+        CACHE_STORE._analysis_cache.clear()
+
+        response = self._get_fragment(HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        mock_analyze.assert_called_once()
+
+    def test_invalid_analysis(self, mock_analyze):
+        """BVT: An invalid analysis should give 204 and nothing to insert"""
+        mock_analyze.return_value = "invalid response"
+
+        response = self._get_fragment()
+
+        self.assertEqual(response.status_code, 204)
+        self.assertIsNone(CACHE_STORE.get_fragment(self.key))
+
+    @override_settings(ANALYSIS_FRAGMENTS=True)
+    @patch('main.views.services.openAI_translate')
+    def test_translate_page_enables_fragments(self, mock_translate, mock_analyze):
+        """BVT: The translation page should tell the browser to use fragments"""
+        mock_translate.return_value = self.test_en_translation
+        response = self.client.post(reverse('main'), {'jp_text': "明日は雨です"})
+
+        self.assertContains(response, 'id="analysis_fragments" value="True"')
+
+
+class BVTRenderFragmentTest(SimpleTestCase):
+    """Business Validation Tests for rendering analyses as HTML"""
+
+    def _analysis(self, phrase, morphemes):
+        return JsonResponse.model_validate({
+            'create_datetime': '2025-01-01T00:00:00Z',
+            'bunsetsu_breakdown': [{
+                'index': 1, 'japanese_phrase': phrase, 'english_translation': "it's <b>bold</b>",
+                'morphological_analysis': [
+                    {'token_id': i, 'surface_form': surface_form, 'base_form': surface_form, 'POS': 'Noun',
+                     'english_explanation': "<script>alert('x')</script>", 'romaji': 'romaji'}
+                    for i, surface_form in enumerate(morphemes, start=1)
+                ],
+            }],
+        })
+
+    def test_values_escaped(self):
+        """BVT: Values from the LLM should be escaped in text and attributes"""
+        html = fragments.render_fragment(self._analysis('猫が', ['猫', 'が']))
+
+        self.assertNotIn('<script>', html)
+        self.assertNotIn('<b>', html)
+        self.assertIn('data-english="&lt;script&gt;alert(&#x27;x&#x27;)&lt;/script&gt;"', html)
+        self.assertIn('it&#x27;s &lt;b&gt;bold&lt;/b&gt;', html)
+
+    def test_unknown_and_missing_morphemes(self):
+        """BVT: Unknown morphemes should be skipped and text without a morpheme kept as plain text"""
+        analysis = self._analysis('猫がいる', ['猫', '犬', 'いる'])
+
+        parts = fragments.get_phrase_parts(analysis.bunsetsu_breakdown[0])
+
+        self.assertEqual([part.get('text') or part['morpheme'].surface_form for part in parts], ['猫', 'が', 'いる'])
+        self.assertEqual([('morpheme' in part) for part in parts], [True, False, True])
@@ -0,0 +1,146 @@
+from django.test import SimpleTestCase, Client, override_settings
+from django.urls import reverse
+from unittest.mock import patch
+from main.cache import CACHE_STORE
+from main.JsonResponse import JsonResponse
+from main import incremental
+import json
+
+
+def make_analysis(phrases, per_bunsetsu_tokens=False):
+    breakdown = []
+    token_id = 0
+    for index, phrase in enumerate(phrases, start=1):
+        if per_bunsetsu_tokens:
+            token_id = 0
+        morphemes = []
+        for surface_form in phrase.split('|'):
+            token_id += 1
+            morphemes.append({'token_id': token_id, 'surface_form': surface_form, 'base_form': surface_form,
+                              'POS': 'Noun', 'english_explanation': f'meaning of {surface_form}', 'romaji': 'romaji'})
+        breakdown.append({'index': index, 'japanese_phrase': phrase.replace('|', ''),
+                          'english_translation': f'phrase {phrase}', 'morphological_analysis': morphemes})
+    return json.dumps({'create_datetime': '2025-01-01T00:00:00Z', 'bunsetsu_breakdown': breakdown}, ensure_ascii=False)
+
+
+@override_settings(INCREMENTAL_ANALYSIS_MIN_REUSE=0.5)
+@patch('main.views.services.openAI_analyze_span')
+@patch('main.views.services.openAI_analyze')
+class BVTIncrementalAnalysisTest(SimpleTestCase):
+    """Business Validation Tests for incremental analysis of edited texts with mocked dependencies"""
+
+    def setUp(self):
+        """Set up test client and common test data"""
+        self.client = Client()
+        self.old_text = "私は|毎朝|公園で|犬と|散歩します"
+        self.old_key = CACHE_STORE.add_translation(jp_text=self.old_text.replace('|', ''), en_text="I walk every morning")
+        CACHE_STORE.add_analysis(self.old_key, make_analysis(self.old_text.split('|')))
+
+    def tearDown(self):
+        """Clean up after each test"""
+        CACHE_STORE._request_queue.clear()
+        CACHE_STORE._translation_cache.clear()
+        CACHE_STORE._analysis_cache.clear()
+
+    def _analyze(self, jp_text):
+        key = CACHE_STORE.add_translation(jp_text=jp_text, en_text="Edited translation")
+        response = self.client.get(reverse('analyze') + f'?key={key}')
+        self.assertEqual(response.status_code, 200)
+        return JsonResponse.model_validate_json(response.content)
+
+    def test_only_changed_span_analyzed(self, mock_analyze, mock_analyze_span):
+        """BVT: Editing one word should only send the changed bunsetsu, with context, to the LLM"""
+        mock_analyze_span.return_value = make_analysis(['公園で', '猫と'])
+
+        analysis = self._analyze("私は毎朝公園で猫と散歩します")
+
+        mock_analyze.assert_not_called()
+        # the bunsetsu before the edit is analyzed again, in case the edit adds a particle to it
+        changed_text, before, after = mock_analyze_span.call_args[0][:3]
+        self.assertEqual(changed_text, '公園で猫と')
+        self.assertTrue(before.endswith('毎朝'))
+        self.assertTrue(after.startswith('散歩します'))
+        self.assertEqual([bunsetsu.japanese_phrase for bunsetsu in analysis.bunsetsu_breakdown],
+                         ['私は', '毎朝', '公園で', '猫と', '散歩します'])
+        self.assertEqual([bunsetsu.index for bunsetsu in analysis.bunsetsu_breakdown], [1, 2, 3, 4, 5])
+
+    def test_token_ids_renumbered(self, mock_analyze, mock_analyze_span):
+        """BVT: Merged morphemes should be numbered again in order"""
+        mock_analyze_span.return_value = make_analysis(['公園|で', '子供|と'])
+
+        analysis = self._analyze("私は毎朝公園で子供と犬と散歩します")
+
+        token_ids = [morpheme.token_id for bunsetsu in analysis.bunsetsu_breakdown
+                     for morpheme in bunsetsu.morphological_analysis]
+        self.assertEqual(token_ids, list(range(1, len(token_ids) + 1)))
+        self.assertEqual(len(analysis.bunsetsu_breakdown), 6)
+
+    def test_deleted_bunsetsu_needs_no_call(self, mock_analyze, mock_analyze_span):
+        """BVT: Deleting a whole bunsetsu should reuse the rest without any LLM call"""
+        analysis = self._analyze("私は公園で犬と散歩します")
+
+        mock_analyze.assert_not_called()
+        mock_analyze_span.assert_not_called()
+        self.assertEqual([bunsetsu.japanese_phrase for bunsetsu in analysis.bunsetsu_breakdown],
+                         ['私は', '公園で', '犬と', '散歩します'])
+
+    def test_unrelated_text_analyzed_in_full(self, mock_analyze, mock_analyze_span):
+        """BVT: A text with too little in common should get a full analysis"""
+        mock_analyze.return_value = make_analysis(['今日は', 'いい', '天気です'])
+
+        self._analyze("今日はいい天気です")
+
+        mock_analyze.assert_called_once()
+        mock_analyze_span.assert_not_called()
+
+    def test_span_including_context_falls_back(self, mock_analyze, mock_analyze_span):
+        """BVT: A span analysis that doesn't match the changed text should fall back to a full analysis"""
+        mock_analyze_span.return_value = make_analysis(['毎朝', '公園で', '猫と'])
+        mock_analyze.return_value = make_analysis(['私は', '毎朝', '公園で', '猫と', '散歩します'])
+
+        self._analyze("私は毎朝公園で猫と散歩します")
+
+        mock_analyze.assert_called_once()
+
+    @override_settings(INCREMENTAL_ANALYSIS_MIN_REUSE=None)
+    def test_disabled(self, mock_analyze, mock_analyze_span):
+        """BVT: With incremental analysis disabled every text should get a full analysis"""
+        mock_analyze.return_value = make_analysis(['私は', '毎朝', '公園で', '猫と', '散歩します'])
+
+        self._analyze("私は毎朝公園で猫と散歩します")
+
+        mock_analyze.assert_called_once()
+        mock_analyze_span.assert_not_called()
+
+
+class BVTMatchAnalysisTest(SimpleTestCase):
+    """Business Validation Tests for aligning an edited text with a cached analysis"""
+
+    def _match(self, old_phrases, jp_text, per_bunsetsu_tokens=False):
+        analysis = JsonResponse.model_validate_json(make_analysis(old_phrases, per_bunsetsu_tokens))
+        return incremental.match_analysis('key', ''.join(old_phrases).replace('|', ''), analysis, jp_text)
+
+    def test_added_particle_reanalyzes_previous_bunsetsu(self):
+        """BVT: A bunsetsu directly before an insertion should be analyzed again"""
+        match = self._match(['本を', '読む'], '本をよく読む')
+
+        self.assertEqual(match.prefix, [])
+        self.assertEqual([bunsetsu.japanese_phrase for bunsetsu in match.suffix], ['読む'])
+        self.assertEqual('本をよく読む'[match.start:match.end], '本をよく')
+
+    def test_per_bunsetsu_token_ids_kept(self):
+        """BVT: Token ids restarting in each bunsetsu should stay that way after merging"""
+        match = self._match(['私|は', '毎朝', '走る'], '私は毎晩走る', per_bunsetsu_tokens=True)
+        changed = JsonResponse.model_validate_json(make_analysis(['毎晩'])).bunsetsu_breakdown
+
+        merged = incremental.merge(match, changed)
+
+        self.assertTrue(match.per_bunsetsu_tokens)
+        self.assertEqual([[morpheme.token_id for morpheme in bunsetsu.morphological_analysis]
+                          for bunsetsu in merged.bunsetsu_breakdown], [[1, 2], [1], [1]])
+
+    def test_unaligned_analysis(self):
+        """BVT: An analysis whose phrases aren't in the cached text should not be reused"""
+        analysis = JsonResponse.model_validate_json(make_analysis(['私は', '走る']))
+
+        self.assertIsNone(incremental.match_analysis('key', '彼は走る', analysis, '彼は歩く'))
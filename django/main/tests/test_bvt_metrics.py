@@ -0,0 +1,91 @@
+from django.test import SimpleTestCase, Client
+from django.urls import reverse
+from types import SimpleNamespace
+from unittest.mock import patch
+from main.cache import CACHE_STORE
+from main.services import ROUTE_STATS
+from main import metrics
+import json
+import os
+import tempfile
+
+@patch('main.views.services.openAI_translate')
+class BVTMetricsTest(SimpleTestCase):
+    """Business Validation Tests for the metrics endpoint with mocked dependencies"""
+
+    def setUp(self):
+        """Set up test client and common test data"""
+        self.client = Client()
+        self.test_jp_text = "今日はいい天気です"
+        self.test_en_translation = "Nice weather today"
+        CACHE_STORE.clear()
+        ROUTE_STATS.clear()
+        metrics.REGISTRY.clear()
+
+    def tearDown(self):
+        """Clean up after each test"""
+        CACHE_STORE.clear()
+        ROUTE_STATS.clear()
+        metrics.REGISTRY.clear()
+
+    def test_cache_hit_and_miss_counters(self, mock_translate):
+        """BVT: Translation cache hits and misses should be counted"""
+        mock_translate.return_value = self.test_en_translation
+        self.client.post(reverse('main'), {'jp_text': self.test_jp_text})
+        self.client.post(reverse('main'), {'jp_text': self.test_jp_text})
+
+        self.assertEqual(metrics.REGISTRY.get_value('learnjp_cache_lookups_total', cache='translation', result='miss'), 1)
+        self.assertEqual(metrics.REGISTRY.get_value('learnjp_cache_lookups_total', cache='translation', result='hit'), 1)
+        request_count = metrics.REGISTRY.get_value('learnjp_request_seconds', view='main', status=200)[-1]
+        self.assertEqual(request_count, 2)
+
+    def test_metrics_endpoint(self, mock_translate):
+        """BVT: /metrics should return counters and histograms in Prometheus text format"""
+        metrics.STAGE_SECONDS.observe(0.3, stage='translate')
+        metrics.record_usage('test-model', SimpleNamespace(prompt_tokens=12, completion_tokens=30))
+
+        response = self.client.get(reverse('metrics'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        content = response.content.decode()
+        self.assertIn('# TYPE learnjp_stage_seconds histogram', content)
+        self.assertIn('learnjp_stage_seconds_bucket{stage="translate",le="0.25"} 0', content)
+        self.assertIn('learnjp_stage_seconds_bucket{stage="translate",le="0.5"} 1', content)
+        self.assertIn('learnjp_stage_seconds_count{stage="translate"} 1', content)
+        self.assertIn('learnjp_upstream_tokens_total{model="test-model",type="completion"} 30', content)
+
+    def test_cache_memory_gauges(self, mock_translate):
+        """BVT: /metrics should report the memory held by the cache, measured when scraped"""
+        CACHE_STORE.add_translation(jp_text=self.test_jp_text, en_text=self.test_en_translation)
+
+        with patch.object(CACHE_STORE, 'memory_usage', wraps=CACHE_STORE.memory_usage) as mock_memory_usage:
+            mock_translate.return_value = self.test_en_translation
+            with self.settings(DEBUG=True):
+                self.client.post(reverse('main'), {'jp_text': "明日は雨です"})
+            mock_memory_usage.assert_not_called()
+
+            content = self.client.get(reverse('metrics')).content.decode()
+
+        mock_memory_usage.assert_called_once()
+        self.assertIn('# TYPE learnjp_cache_entries gauge', content)
+        self.assertIn('learnjp_cache_entries 2', content)
+        self.assertIn('learnjp_cache_bytes{type="translation"}', content)
+
+    def test_metrics_token(self, mock_translate):
+        """BVT: /metrics should require the bearer token when one is configured"""
+        with self.settings(METRICS_TOKEN='secret'):
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+            response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+            self.assertEqual(response.status_code, 200)
+
+    def test_metrics_aggregated_across_processes(self, mock_translate):
+        """BVT: Values written by other worker processes should be added up"""
+        with tempfile.TemporaryDirectory() as metrics_dir, self.settings(METRICS_DIR=metrics_dir):
+            metrics.CACHE_EVICTIONS.inc(2)
+            with open(os.path.join(metrics_dir, 'metrics_999999.json'), 'w') as file:
+                json.dump({'learnjp_cache_evictions_total': [[[], 3]]}, file)
+
+            content = self.client.get(reverse('metrics')).content.decode()
+
+        self.assertIn('learnjp_cache_evictions_total 5', content)
@@ -0,0 +1,135 @@
+from django.test import SimpleTestCase, Client, override_settings
+from django.urls import reverse
+from unittest.mock import MagicMock, patch
+from django.core.files.uploadedfile import SimpleUploadedFile
+from google.cloud import vision
+from main.cache import CACHE_STORE
+from main import utils
+
+
+@patch('main.views.services.openAI_translate')
+@patch('main.views.utils.extract_text_from_files')
+@patch('main.views.utils.extract_text_from_image')
+class BVTMultiImageTest(SimpleTestCase):
+    """Business Validation Tests for multi-image and PDF upload with mocked dependencies"""
+
+    def setUp(self):
+        """Set up test client and common test data"""
+        self.client = Client()
+        self.test_jp_text = "今日はいい天気です"
+        self.test_en_translation = "Nice weather today"
+
+    def tearDown(self):
+        """Clean up after each test"""
+        CACHE_STORE._request_queue.clear()
+        CACHE_STORE._translation_cache.clear()
+        CACHE_STORE._analysis_cache.clear()
+
+    def _image(self, name):
+        return SimpleUploadedFile(name, b'fake image content', content_type="image/jpeg")
+
+    def test_multiple_images(self, mock_ocr, mock_batch_ocr, mock_translate):
+        """BVT: Several images should be OCR'd as one batch and translated together"""
+        mock_batch_ocr.return_value = self.test_jp_text
+        mock_translate.return_value = self.test_en_translation
+
+        response = self.client.post(reverse('main'), {
+            'image_file': [self._image('page1.jpg'), self._image('page2.jpg')]
+        })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'translate.html')
+        self.assertContains(response, self.test_en_translation)
+        mock_ocr.assert_not_called()
+        uploaded_files = mock_batch_ocr.call_args[0][0]
+        self.assertEqual([uploaded_file.name for uploaded_file in uploaded_files], ['page1.jpg', 'page2.jpg'])
+        mock_translate.assert_called_once()
+
+    def test_pdf_upload(self, mock_ocr, mock_batch_ocr, mock_translate):
+        """BVT: A PDF should be OCR'd page by page through the batch path"""
+        mock_batch_ocr.return_value = self.test_jp_text
+        mock_translate.return_value = self.test_en_translation
+        pdf = SimpleUploadedFile("pages.pdf", b'%PDF-1.4 fake', content_type="application/pdf")
+
+        response = self.client.post(reverse('main'), {'image_file': pdf})
+
+        self.assertEqual(response.status_code, 200)
+        mock_ocr.assert_not_called()
+        mock_batch_ocr.assert_called_once()
+
+    @override_settings(MAX_UPLOAD_FILES=2)
+    def test_too_many_files(self, mock_ocr, mock_batch_ocr, mock_translate):
+        """BVT: Uploading more files than allowed should be rejected"""
+        response = self.client.post(reverse('main'), {
+            'image_file': [self._image(f'page{i}.jpg') for i in range(3)]
+        })
+
+        self.assertTemplateUsed(response, 'index.html')
+        self.assertIn('Invalid input', response.context['error_message'])
+        mock_batch_ocr.assert_not_called()
+
+
+@patch('main.utils.get_vision_client')
+class BVTBatchOCRTest(SimpleTestCase):
+    """Business Validation Tests for batched OCR with a mocked Vision client"""
+
+    def _image_response(self, text):
+        return vision.AnnotateImageResponse(text_annotations=[vision.EntityAnnotation(description=text)])
+
+    def _page_response(self, text, page):
+        return vision.AnnotateImageResponse(full_text_annotation=vision.TextAnnotation(text=text),
+                                            context=vision.ImageAnnotationContext(page_number=page))
+
+    @override_settings(MAX_UPLOAD_PAGES=20)
+    def test_page_order(self, mock_client):
+        """BVT: Texts should be merged in upload order and page order, with one call per batch"""
+        client = MagicMock()
+        client.batch_annotate_images.return_value = vision.BatchAnnotateImagesResponse(
+            responses=[self._image_response('一枚目'), self._image_response('三枚目')])
+
+        def annotate_files(requests):
+            pages = list(requests[0].pages) or [1, 2, 3, 4, 5]
+            return vision.BatchAnnotateFilesResponse(responses=[vision.AnnotateFileResponse(
+                responses=[self._page_response(f'ページ{page}', page) for page in pages], total_pages=7)])
+        client.batch_annotate_files.side_effect = annotate_files
+        mock_client.return_value = client
+
+        files = [
+            SimpleUploadedFile('a.jpg', b'a', content_type='image/jpeg'),
+            SimpleUploadedFile('b.pdf', b'b', content_type='application/pdf'),
+            SimpleUploadedFile('c.jpg', b'c', content_type='image/jpeg'),
+        ]
+        text = utils.extract_text_from_files(files)
+
+        pages = '\n'.join(f'ページ{page}' for page in range(1, 8))
+        self.assertEqual(text, f'一枚目\n{pages}\n三枚目')
+        client.batch_annotate_images.assert_called_once()
+        self.assertEqual(client.batch_annotate_files.call_count, 2)
+
+    @override_settings(MAX_UPLOAD_PAGES=20)
+    def test_stops_at_max_length(self, mock_client):
+        """BVT: Pages and files after max_length characters should not be OCR'd"""
+        client = MagicMock()
+        client.batch_annotate_files.return_value = vision.BatchAnnotateFilesResponse(
+            responses=[vision.AnnotateFileResponse(
+                responses=[self._page_response(f'ページ{page}', page) for page in range(1, 6)], total_pages=20)])
+        mock_client.return_value = client
+
+        files = [SimpleUploadedFile(f'{i}.pdf', b'x', content_type='application/pdf') for i in range(3)]
+        text = utils.extract_text_from_files(files, max_length=10)
+
+        self.assertEqual(text, '\n'.join(f'ページ{page}' for page in range(1, 6)))
+        # only the first call of each PDF, none for their remaining pages
+        self.assertLessEqual(client.batch_annotate_files.call_count, 3)
+        self.assertFalse(any(call.kwargs['requests'][0].pages for call in client.batch_annotate_files.call_args_list))
+
+    def test_no_text(self, mock_client):
+        """BVT: No text in any page should return None"""
+        client = MagicMock()
+        client.batch_annotate_images.return_value = vision.BatchAnnotateImagesResponse(
+            responses=[vision.AnnotateImageResponse(), vision.AnnotateImageResponse()])
+        mock_client.return_value = client
+
+        files = [SimpleUploadedFile(f'{i}.jpg', b'x', content_type='image/jpeg') for i in range(2)]
+
+        self.assertIsNone(utils.extract_text_from_files(files))
@@ -0,0 +1,96 @@
+from django.core.management import call_command
+from django.test import SimpleTestCase
+from unittest.mock import patch
+from main.cache import CACHE_STORE, CacheStore
+from io import StringIO
+import json
+import os
+import tempfile
+
+@patch('main.services.openAI_translate')
+@patch('main.services.openAI_analyze')
+class BVTPrewarmTest(SimpleTestCase):
+    """Business Validation Tests for the prewarm_cache management command with mocked dependencies"""
+
+    def setUp(self):
+        """Set up corpus and output files"""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.corpus = os.path.join(self.temp_dir.name, 'corpus.txt')
+        self.output = os.path.join(self.temp_dir.name, 'prewarm.jsonl')
+        with open(self.corpus, 'w', encoding='utf-8') as file:
+            file.write("今日はいい天気です\n\nおはようございます\n今日はいい天気です\n")
+
+        current_dir = os.path.dirname(os.path.abspath(__file__))
+        with open(os.path.join(current_dir, 'test_data_valid_response.json'), 'r', encoding='utf-8') as file:
+            self.analysis = file.read()
+
+    def tearDown(self):
+        """Clean up after each test"""
+        self.temp_dir.cleanup()
+        CACHE_STORE._request_queue.clear()
+        CACHE_STORE._translation_cache.clear()
+        CACHE_STORE._analysis_cache.clear()
+
+    def _read_output(self):
+        with open(self.output, 'r', encoding='utf-8') as file:
+            return [json.loads(line) for line in file]
+
+    def test_prewarm_dedupes_and_writes_results(self, mock_analyze, mock_translate):
+        """BVT: Each unique corpus text should be translated and analyzed once"""
+        mock_translate.return_value = "translation"
+        mock_analyze.return_value = self.analysis
+
+        call_command('prewarm_cache', self.corpus, output=self.output, requests_per_minute=0, stdout=StringIO())
+
+        entries = self._read_output()
+        self.assertEqual(sorted(entry['japanese'] for entry in entries), sorted(["今日はいい天気です", "おはようございます"]))
+        self.assertEqual(mock_translate.call_count, 2)
+        self.assertEqual(mock_analyze.call_count, 2)
+        self.assertTrue(CACHE_STORE.has_analysis(CACHE_STORE.get_key("おはようございます")))
+
+    def test_prewarm_is_resumable(self, mock_analyze, mock_translate):
+        """BVT: A rerun should only process texts that failed or were not reached"""
+        mock_translate.side_effect = lambda text: None if text == "おはようございます" else "translation"
+        mock_analyze.return_value = self.analysis
+        call_command('prewarm_cache', self.corpus, output=self.output, requests_per_minute=0, stdout=StringIO())
+        self.assertEqual(len(self._read_output()), 1)
+
+        CACHE_STORE._request_queue.clear()
+        CACHE_STORE._translation_cache.clear()
+        CACHE_STORE._analysis_cache.clear()
+        mock_translate.reset_mock()
+        mock_translate.side_effect = None
+        mock_translate.return_value = "translation"
+
+        call_command('prewarm_cache', self.corpus, output=self.output, requests_per_minute=0, stdout=StringIO())
+
+        mock_translate.assert_called_once_with("おはようございます")
+        self.assertEqual(len(self._read_output()), 2)
+
+    def test_prewarm_file_is_loaded_into_cache(self, mock_analyze, mock_translate):
+        """BVT: Results written by the command should load into a cache store"""
+        mock_translate.return_value = "translation"
+        mock_analyze.return_value = self.analysis
+        call_command('prewarm_cache', self.corpus, output=self.output, requests_per_minute=0, stdout=StringIO())
+
+        cache_store = CacheStore()
+        self.assertEqual(cache_store.load_prewarm_file(self.output), 2)
+        key = cache_store.get_key("今日はいい天気です")
+        self.assertEqual(cache_store.get_translation(key), "translation")
+        self.assertEqual(cache_store.get_analysis(key), self.analysis)
+
+    def test_prewarm_file_larger_than_cache(self, mock_analyze, mock_translate):
+        """BVT: Only the last CACHE_SIZE entries should be loaded, with a warning from the command"""
+        mock_translate.return_value = "translation"
+        mock_analyze.return_value = self.analysis
+        stdout = StringIO()
+
+        with self.settings(CACHE_SIZE=1):
+            call_command('prewarm_cache', self.corpus, output=self.output, requests_per_minute=0, stdout=stdout)
+            cache_store = CacheStore()
+            with patch('builtins.print'):
+                self.assertEqual(cache_store.load_prewarm_file(self.output), 1)
+
+        self.assertIn('CACHE_SIZE is 1', stdout.getvalue())
+        last_text = self._read_output()[-1]['japanese']
+        self.assertTrue(cache_store.has_translation(cache_store.get_key(last_text)))
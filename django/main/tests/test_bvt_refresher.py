@@ -0,0 +1,134 @@
+from django.test import SimpleTestCase, override_settings
+from unittest.mock import patch
+from main.admission import ADMISSION
+from main.cache import CACHE_STORE
+from main.services import ROUTE_STATS
+from main import metrics, refresher
+import os
+import time
+
+@override_settings(CACHE_REFRESH_INTERVAL=60)
+@patch('main.services.openAI_translate')
+@patch('main.services.openAI_analyze')
+class BVTRefresherTest(SimpleTestCase):
+    """Business Validation Tests for popularity tracking, TTL and background refresh with mocked dependencies"""
+
+    def setUp(self):
+        """Set up common test data"""
+        self.test_jp_text = "今日はいい天気です"
+        self.test_en_translation = "Nice weather today"
+        current_dir = os.path.dirname(os.path.abspath(__file__))
+        with open(os.path.join(current_dir, "test_data_valid_response.json"), 'r', encoding='utf-8') as file:
+            self.json_response = file.read()
+        CACHE_STORE.clear()
+        ADMISSION.clear()
+        ROUTE_STATS.clear()
+        metrics.REGISTRY.clear()
+
+    def tearDown(self):
+        """Clean up after each test"""
+        CACHE_STORE.clear()
+        ADMISSION.clear()
+        ROUTE_STATS.clear()
+        metrics.REGISTRY.clear()
+
+    def _add_hot_entry(self, hits=3, age=0):
+        key = CACHE_STORE.add_translation(jp_text=self.test_jp_text, en_text=self.test_en_translation)
+        CACHE_STORE._created[key] = time.time() - age
+        for _ in range(hits):
+            CACHE_STORE.get_translation(key)
+        return key
+
+    @override_settings(CACHE_TTL=60)
+    def test_ttl_expiry(self, mock_analyze, mock_translate):
+        """BVT: Entries older than the TTL should be treated as misses"""
+        key = self._add_hot_entry(hits=0, age=120)
+        CACHE_STORE.add_analysis(key, self.json_response)
+
+        self.assertFalse(CACHE_STORE.has_translation(key))
+        self.assertFalse(CACHE_STORE.has_analysis(key))
+
+    @override_settings(CACHE_TTL=60, CACHE_SIZE=3)
+    def test_expired_entry_leaves_queue(self, mock_analyze, mock_translate):
+        """BVT: An expired entry added again should not be evicted by its old queue slot"""
+        key = self._add_hot_entry(age=120)
+        self.assertFalse(CACHE_STORE.has_translation(key))
+        self.assertNotIn(key, CACHE_STORE._request_queue)
+        self.assertNotIn(key, CACHE_STORE._access_counts)
+
+        CACHE_STORE.add_translation(jp_text=self.test_jp_text, en_text=self.test_en_translation)
+        CACHE_STORE.add_translation(jp_text="一つ目", en_text="first")
+        CACHE_STORE.add_translation(jp_text="二つ目", en_text="second")
+
+        self.assertTrue(CACHE_STORE.has_translation(key))
+
+    @override_settings(CACHE_REFRESH_INTERVAL=None)
+    def test_no_access_counts_without_refresher(self, mock_analyze, mock_translate):
+        """BVT: Served translations should not be counted when nothing uses the counts"""
+        self._add_hot_entry(hits=4)
+
+        self.assertEqual(CACHE_STORE.get_hot_keys(1), [])
+
+    def test_access_counts(self, mock_analyze, mock_translate):
+        """BVT: Served translations should be counted, and counts should decay"""
+        key = self._add_hot_entry(hits=4)
+
+        self.assertEqual(CACHE_STORE.get_hot_keys(3), [(key, 4)])
+        CACHE_STORE.decay_access_counts()
+        self.assertEqual(CACHE_STORE.get_hot_keys(3), [])
+        self.assertEqual(CACHE_STORE.get_hot_keys(1), [(key, 2)])
+
+    @override_settings(CACHE_TTL=600, CACHE_REFRESH_AHEAD=300)
+    def test_refresh_before_expiry(self, mock_analyze, mock_translate):
+        """BVT: Popular entries about to expire should be translated and analyzed again"""
+        mock_translate.return_value = "Nice weather today!"
+        mock_analyze.return_value = self.json_response
+        key = self._add_hot_entry(age=400)
+        CACHE_STORE.add_analysis(key, self.json_response)
+
+        self.assertEqual(refresher.run_once(), 1)
+
+        self.assertEqual(CACHE_STORE.get_translation(key), "Nice weather today!")
+        self.assertLess(CACHE_STORE.get_age(key), 10)
+        mock_translate.assert_called_once()
+        mock_analyze.assert_called_once()
+
+    @override_settings(CACHE_TTL=600, CACHE_REFRESH_AHEAD=300)
+    def test_unpopular_entries_not_refreshed(self, mock_analyze, mock_translate):
+        """BVT: Entries below the hit threshold should be left to expire"""
+        self._add_hot_entry(hits=1, age=400)
+
+        self.assertEqual(refresher.run_once(), 0)
+        mock_translate.assert_not_called()
+
+    def test_analyze_popular_entries(self, mock_analyze, mock_translate):
+        """BVT: Popular entries without an analysis should be analyzed in the background"""
+        mock_analyze.return_value = self.json_response
+        key = self._add_hot_entry()
+
+        refresher.run_once()
+
+        self.assertTrue(CACHE_STORE.has_analysis(key))
+        mock_translate.assert_not_called()
+
+    @override_settings(ADMISSION_MAX_IN_FLIGHT=1)
+    def test_no_refresh_without_idle_capacity(self, mock_analyze, mock_translate):
+        """BVT: The refresher should not take upstream capacity from user requests"""
+        key = self._add_hot_entry()
+
+        with ADMISSION.slot('translate'):
+            self.assertEqual(refresher.run_once(), 0)
+
+        mock_analyze.assert_not_called()
+        self.assertFalse(CACHE_STORE.has_analysis(key))
+
+    @override_settings(CACHE_SIZE=2)
+    def test_refreshed_entry_not_evicted_next(self, mock_analyze, mock_translate):
+        """BVT: A refreshed entry should move to the back of the eviction queue"""
+        first = CACHE_STORE.add_translation(jp_text="一つ目", en_text="first")
+        second = CACHE_STORE.add_translation(jp_text="二つ目", en_text="second")
+        CACHE_STORE.refresh_translation(first, "first again")
+        CACHE_STORE.add_translation(jp_text="三つ目", en_text="third")
+
+        self.assertTrue(CACHE_STORE.has_translation(first))
+        self.assertFalse(CACHE_STORE.has_translation(second))
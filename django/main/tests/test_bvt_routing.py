@@ -0,0 +1,69 @@
+from django.test import SimpleTestCase
+from main import metrics, services
+
+
+class BVTRoutingTest(SimpleTestCase):
+    """Business Validation Tests for per-request model routing"""
+
+    ROUTES = [
+        {"name": "short", "model": "small-model", "reasoning_effort": "low", "tasks": ["translate"], "max_length": 10},
+        {"name": "default", "model": "large-model", "reasoning_effort": "medium"},
+    ]
+
+    def tearDown(self):
+        """Clean up after each test"""
+        services.ROUTE_STATS.clear()
+        metrics.REGISTRY.clear()
+
+    def test_short_text_uses_small_route(self):
+        """BVT: Short texts should be routed to the first matching route"""
+        with self.settings(TRANSLATION_MODEL_ROUTES=self.ROUTES):
+            route = services.select_route("こんにちは", 'translate')
+
+        self.assertEqual(route.name, 'short')
+        self.assertEqual(route.model, 'small-model')
+
+    def test_long_text_and_analysis_use_default_route(self):
+        """BVT: Texts exceeding route limits or other tasks should fall through to later routes"""
+        with self.settings(TRANSLATION_MODEL_ROUTES=self.ROUTES):
+            self.assertEqual(services.select_route("今日はいい天気ですね。散歩に行きましょう。", 'translate').name, 'default')
+            self.assertEqual(services.select_route("こんにちは", 'analyze').name, 'default')
+
+    def test_failing_route_escalates(self):
+        """BVT: A route with a high validation failure rate for similar texts should be skipped"""
+        with self.settings(TRANSLATION_MODEL_ROUTES=self.ROUTES, ROUTE_MIN_SAMPLES=2, ROUTE_MAX_FAILURE_RATE=0.5):
+            route = services.select_route("こんにちは", 'translate')
+            for _ in range(2):
+                services.ROUTE_STATS.record_result(route, 'translate', services.get_text_bucket("こんにちは"), 0.1, True)
+                services.record_validation_failure(route, 'translate', "こんにちは")
+
+            self.assertEqual(services.select_route("こんばんは", 'translate').name, 'default')
+            # texts in a different bucket are not affected
+            self.assertEqual(services.select_route("日本語", 'translate').name, 'short')
+
+    def test_route_stats_summary(self):
+        """BVT: Route latency should be recorded per route"""
+        route = services.Route('default', 'large-model', 'low')
+        services.ROUTE_STATS.record_result(route, 'analyze', (0, 0), 2.0, True)
+        services.ROUTE_STATS.record_result(route, 'analyze', (0, 0), 4.0, True)
+
+        summary = services.ROUTE_STATS.summary()
+        self.assertEqual(len(summary), 1)
+        self.assertEqual(summary[0]['requests'], 2)
+        self.assertAlmostEqual(summary[0]['avg_latency'], 3.0)
+
+    def test_route_metrics(self):
+        """BVT: Route decisions, calls, failures and latency should be exported as metrics"""
+        route = services.Route('default', 'large-model', 'low')
+        services.ROUTE_STATS.record_decision(route, 'analyze', (1, 2))
+        services.ROUTE_STATS.record_result(route, 'analyze', (1, 2), 2.0, True)
+        services.ROUTE_STATS.record_result(route, 'analyze', (1, 2), 4.0, False)
+        services.ROUTE_STATS.record_failure(route, 'analyze', (1, 2))
+
+        labels = {'route': 'default', 'task': 'analyze', 'bucket': '1-2'}
+        self.assertEqual(metrics.REGISTRY.get_value('learnjp_route_decisions_total', **labels), 1)
+        self.assertEqual(metrics.REGISTRY.get_value('learnjp_route_requests_total', **labels), 2)
+        self.assertEqual(metrics.REGISTRY.get_value('learnjp_route_failures_total', **labels), 2)
+        self.assertAlmostEqual(metrics.REGISTRY.get_value('learnjp_route_seconds_total', **labels), 6.0)
+        self.assertIn('learnjp_route_requests_total{bucket="1-2",route="default",task="analyze"} 2',
+                      metrics.REGISTRY.render())
@@ -0,0 +1,77 @@
+from django.test import SimpleTestCase, Client
+from django.urls import reverse
+from unittest.mock import patch
+from main.cache import CACHE_STORE
+from main.similarity import MinHashIndex, normalize_text
+
+@patch('main.views.services.openAI_translate')
+class BVTSimilarityTest(SimpleTestCase):
+    """Business Validation Tests for normalized and near-duplicate cache lookups with mocked dependencies"""
+
+    def setUp(self):
+        """Set up test client and common test data"""
+        self.client = Client()
+        self.test_jp_text = "今日はいい天気ですね。散歩に行きましょう。公園の桜がとてもきれいです。"
+        self.test_en_translation = "Nice weather today. Let us go for a walk. The cherry blossoms in the park are beautiful."
+
+    def tearDown(self):
+        """Clean up after each test"""
+        CACHE_STORE._request_queue.clear()
+        CACHE_STORE._translation_cache.clear()
+        CACHE_STORE._analysis_cache.clear()
+        CACHE_STORE._similarity_index.clear()
+
+    def test_normalize_text(self, mock_translate):
+        """BVT: Width variants and whitespace should normalize to the same text"""
+        self.assertEqual(normalize_text("ＡＢＣ　今日は\n いい天気"), "ABC今日はいい天気")
+        self.assertEqual(CACHE_STORE.get_key("今日は\nいい天気"), CACHE_STORE.get_key("今日は いい天気"))
+
+    def test_whitespace_variant_uses_cache(self, mock_translate):
+        """BVT: OCR output differing only in line breaks should hit the cache"""
+        mock_translate.return_value = self.test_en_translation
+        self.client.post(reverse('main'), {'jp_text': self.test_jp_text})
+        mock_translate.reset_mock()
+
+        response = self.client.post(reverse('main'), {'jp_text': self.test_jp_text.replace("。", "。\n")})
+
+        self.assertEqual(response.status_code, 200)
+        mock_translate.assert_not_called()
+
+    def test_near_duplicate_reuses_translation(self, mock_translate):
+        """BVT: A near-duplicate text should reuse the cached translation when a threshold is set"""
+        mock_translate.return_value = self.test_en_translation
+        variant = self.test_jp_text.replace("。", "、", 1) + "・"
+
+        with self.settings(NEAR_DUPLICATE_THRESHOLD=0.7):
+            first = self.client.post(reverse('main'), {'jp_text': self.test_jp_text})
+            mock_translate.reset_mock()
+            response = self.client.post(reverse('main'), {'jp_text': variant})
+
+        self.assertEqual(response.status_code, 200)
+        mock_translate.assert_not_called()
+        self.assertEqual(response.context['key'], first.context['key'])
+        self.assertContains(response, self.test_en_translation)
+
+    def test_near_duplicate_disabled_by_default(self, mock_translate):
+        """BVT: Without a threshold, a different text should be translated again"""
+        mock_translate.return_value = self.test_en_translation
+
+        with self.settings(NEAR_DUPLICATE_THRESHOLD=None):
+            self.client.post(reverse('main'), {'jp_text': self.test_jp_text})
+            mock_translate.reset_mock()
+            self.client.post(reverse('main'), {'jp_text': self.test_jp_text + "・"})
+
+        mock_translate.assert_called_once()
+
+    def test_minhash_index(self, mock_translate):
+        """BVT: The index should find similar texts and forget removed ones"""
+        index = MinHashIndex()
+        index.add('a', self.test_jp_text)
+        index.add('b', "全く関係のない文章を書きました")
+
+        results = index.query(self.test_jp_text + "!", 0.8)
+        self.assertEqual([key for _, key in results], ['a'])
+
+        index.remove('a')
+        self.assertEqual(index.query(self.test_jp_text, 0.8), [])
+        self.assertEqual(len(index), 1)
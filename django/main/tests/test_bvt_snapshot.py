@@ -0,0 +1,134 @@
+from django.test import SimpleTestCase, override_settings
+from main.cache import CacheStore
+from main.snapshot import Snapshot, save_cache_snapshot, start_snapshot_thread
+from main import background
+from unittest.mock import patch
+import os
+import tempfile
+import time
+
+
+class BVTSnapshotTest(SimpleTestCase):
+    """Business Validation Tests for cache snapshots"""
+
+    def setUp(self):
+        """Set up a cache store with a few entries"""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, 'cache.snapshot')
+        self.cache_store = CacheStore()
+        self.key = self.cache_store.add_translation(jp_text="今日はいい天気です", en_text="Nice weather today")
+        self.cache_store.add_analysis(self.key, '{"bunsetsu_breakdown": []}')
+        self.cache_store.add_translation(jp_text="おはようございます", en_text="Good morning")
+
+    def tearDown(self):
+        """Clean up after each test"""
+        self.temp_dir.cleanup()
+
+    def test_snapshot_round_trip(self):
+        """BVT: A new cache store should serve entries from a snapshot"""
+        for compress in (True, False):
+            self.assertEqual(save_cache_snapshot(self.cache_store, self.path, compress=compress), 2)
+
+            snapshot = Snapshot(self.path)
+            new_store = CacheStore()
+            new_store.attach_snapshot(snapshot)
+
+            self.assertTrue(new_store.has_translation(self.key))
+            self.assertEqual(new_store.get_translation(self.key), "Nice weather today")
+            self.assertEqual(new_store.get_analysis(self.key), '{"bunsetsu_breakdown": []}')
+            self.assertFalse(new_store.has_analysis(new_store.get_key("おはようございます")))
+            snapshot.close()
+
+    def test_snapshot_loads_lazily(self):
+        """BVT: Entries should only be copied into memory when they are looked up"""
+        save_cache_snapshot(self.cache_store, self.path)
+        new_store = CacheStore()
+        new_store.attach_snapshot(Snapshot(self.path))
+
+        self.assertEqual(len(new_store._translation_cache), 0)
+        new_store.get_translation(self.key)
+        self.assertEqual(len(new_store._translation_cache), 1)
+
+    def test_snapshot_keeps_entries_not_loaded(self):
+        """BVT: Saving again should keep snapshot entries that were never looked up"""
+        save_cache_snapshot(self.cache_store, self.path)
+        new_store = CacheStore()
+        new_store.attach_snapshot(Snapshot(self.path))
+        new_store.add_translation(jp_text="こんばんは", en_text="Good evening")
+
+        self.assertEqual(save_cache_snapshot(new_store, self.path), 3)
+        self.assertIn(self.key, Snapshot(self.path))
+
+    def test_workers_keep_each_others_entries(self):
+        """BVT: Workers saving to the same file should keep each other's entries"""
+        other_store = CacheStore()
+        other_key = other_store.add_translation(jp_text="こんばんは", en_text="Good evening")
+
+        save_cache_snapshot(self.cache_store, self.path)
+        save_cache_snapshot(other_store, self.path)
+        save_cache_snapshot(other_store, self.path)
+
+        snapshot = Snapshot(self.path)
+        self.assertEqual(len(snapshot), 3)
+        self.assertIn(self.key, snapshot)
+        self.assertIn(other_key, snapshot)
+        snapshot.close()
+
+    @override_settings(CACHE_TTL=60)
+    def test_expired_entries_not_loaded(self):
+        """BVT: Entries that expired since the snapshot was saved should not be served again"""
+        self.cache_store._created[self.key] = time.time() - 120
+        save_cache_snapshot(self.cache_store, self.path)
+        new_store = CacheStore()
+        new_store.attach_snapshot(Snapshot(self.path))
+
+        self.assertFalse(new_store.has_translation(self.key))
+        self.assertEqual(new_store.get_translation(self.key), '')
+        self.assertTrue(new_store.has_translation(new_store.get_key("おはようございます")))
+
+    @override_settings(CACHE_TTL=60)
+    def test_expired_entry_not_reloaded(self):
+        """BVT: An entry that expires in memory should not come back from the snapshot with a new TTL"""
+        save_cache_snapshot(self.cache_store, self.path)
+        new_store = CacheStore()
+        new_store.attach_snapshot(Snapshot(self.path))
+        self.assertTrue(new_store.has_translation(self.key))
+
+        with override_settings(CACHE_TTL=0.001):
+            time.sleep(0.01)
+            self.assertFalse(new_store.has_translation(self.key))
+            self.assertFalse(new_store.has_translation(self.key))
+
+    def test_invalid_snapshot_file(self):
+        """BVT: Files that are not snapshots should be rejected"""
+        with open(self.path, 'wb') as file:
+            file.write(b'not a snapshot' * 4)
+
+        with self.assertRaises(ValueError):
+            Snapshot(self.path)
+
+    def test_truncated_snapshot_file(self):
+        """BVT: A snapshot file that was cut short should be rejected like any other invalid file"""
+        save_cache_snapshot(self.cache_store, self.path)
+        with open(self.path, 'rb') as file:
+            data = file.read()
+
+        for length in (10, len(data) - 5):
+            with open(self.path, 'wb') as file:
+                file.write(data[:length])
+            with self.assertRaises(ValueError):
+                Snapshot(self.path)
+
+    def test_thread_started_once_per_worker(self):
+        """BVT: The snapshot thread should only start with the first request of a process and save when it stops"""
+        with override_settings(CACHE_SNAPSHOT_FILE=self.path, CACHE_SNAPSHOT_INTERVAL=3600), \
+                patch('main.background._started_pid', None), patch('main.background.atexit'), \
+                patch('main.cache.CACHE_STORE', self.cache_store), \
+                patch('main.snapshot.start_snapshot_thread', wraps=start_snapshot_thread) as mock_start:
+            background.start()
+            background.start()
+            mock_start.assert_called_once()
+            self.assertFalse(os.path.exists(self.path))
+
+            background.stop()
+            self.assertIn(self.key, Snapshot(self.path))
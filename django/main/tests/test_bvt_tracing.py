@@ -0,0 +1,76 @@
+from django.test import SimpleTestCase, Client
+from django.urls import reverse
+from unittest.mock import patch
+from main.cache import CACHE_STORE
+import json
+import os
+import tempfile
+
+
+class MemoryExporter:
+    """Keeps exported spans in memory for the tests"""
+    spans = []
+
+    def export(self, spans):
+        MemoryExporter.spans.extend(spans)
+
+
+@patch('main.views.services.openAI_translate')
+class BVTTracingTest(SimpleTestCase):
+    """Business Validation Tests for request tracing with mocked dependencies"""
+
+    def setUp(self):
+        """Set up test client and common test data"""
+        self.client = Client()
+        self.test_jp_text = "今日はいい天気です"
+        self.test_en_translation = "Nice weather today"
+        MemoryExporter.spans = []
+
+    def tearDown(self):
+        """Clean up after each test"""
+        CACHE_STORE._request_queue.clear()
+        CACHE_STORE._translation_cache.clear()
+        CACHE_STORE._analysis_cache.clear()
+
+    def test_request_spans(self, mock_translate):
+        """BVT: Each stage of a request should be recorded under the request id"""
+        mock_translate.return_value = self.test_en_translation
+
+        with self.settings(TRACING_ENABLED=True, TRACING_EXPORTER='main.tests.test_bvt_tracing.MemoryExporter'):
+            response = self.client.post(reverse('main'), {'jp_text': self.test_jp_text}, HTTP_X_REQUEST_ID='test-request-1')
+
+        self.assertEqual(response['X-Request-ID'], 'test-request-1')
+        names = [record['name'] for record in MemoryExporter.spans]
+        self.assertIn('upload', names)
+        self.assertIn('cache.lookup', names)
+        self.assertEqual(names[-1], 'request')
+        root = MemoryExporter.spans[-1]
+        self.assertTrue(all(record['request_id'] == 'test-request-1' for record in MemoryExporter.spans))
+        self.assertTrue(all(record['parent_id'] == root['span_id'] for record in MemoryExporter.spans[:-1]))
+
+    def test_tracing_disabled(self, mock_translate):
+        """BVT: No spans should be exported when tracing is disabled"""
+        mock_translate.return_value = self.test_en_translation
+
+        with self.settings(TRACING_ENABLED=False, TRACING_EXPORTER='main.tests.test_bvt_tracing.MemoryExporter'):
+            response = self.client.post(reverse('main'), {'jp_text': self.test_jp_text})
+
+        self.assertFalse(response.has_header('X-Request-ID'))
+        self.assertEqual(MemoryExporter.spans, [])
+
+    def test_json_lines_exporter_and_profiler(self, mock_translate):
+        """BVT: Spans should be written as JSON lines and sampled slow requests profiled"""
+        mock_translate.return_value = self.test_en_translation
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            trace_file = os.path.join(temp_dir, 'traces.jsonl')
+            profile_dir = os.path.join(temp_dir, 'profiles')
+            with self.settings(TRACING_ENABLED=True, TRACING_FILE=trace_file, TRACING_PROFILE_SAMPLE_RATE=1,
+                               TRACING_SLOW_REQUEST_SECONDS=0, TRACING_PROFILE_DIR=profile_dir):
+                response = self.client.post(reverse('main'), {'jp_text': self.test_jp_text})
+
+            with open(trace_file, 'r', encoding='utf-8') as file:
+                spans = [json.loads(line) for line in file]
+            self.assertEqual(spans[-1]['name'], 'request')
+            self.assertEqual(spans[-1]['attributes']['status'], 200)
+            self.assertEqual(os.listdir(profile_dir), [f"{response['X-Request-ID']}.prof"])
@@ -0,0 +1,91 @@
+"""
+Lightweight request tracing. TracingMiddleware starts a trace for each request, span() records timed stages
+inside it, and the finished spans are handed to the exporter named by settings.TRACING_EXPORTER.
+Outside of a traced request span() does nothing.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.utils.module_loading import import_string
+import json
+import threading
+import time
+import uuid
+
+_current_trace = ContextVar('current_trace', default=None)
+_current_span = ContextVar('current_span', default=None)
+
+class Trace:
+
+    def __init__(self, request_id: str):
+        self.request_id = request_id
+        self.spans = []
+
+@contextmanager
+def span(name: str, **attributes):
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+
+    record = {
+        'request_id': trace.request_id,
+        'span_id': uuid.uuid4().hex[:16],
+        'parent_id': _current_span.get(),
+        'name': name,
+        'start': time.time(),
+        'attributes': attributes,
+    }
+    token = _current_span.set(record['span_id'])
+    start_time = time.perf_counter()
+    try:
+        yield record
+    except Exception as e:
+        record['error'] = repr(e)
+        raise
+    finally:
+        record['duration'] = time.perf_counter() - start_time
+        _current_span.reset(token)
+        trace.spans.append(record)
+
+def current_request_id() -> str | None:
+    trace = _current_trace.get()
+    return trace.request_id if trace else None
+
+@contextmanager
+def start_trace(request_id: str | None = None):
+    """Collect the spans of one unit of work (usually a request) and export them when it ends."""
+    trace = Trace(request_id or uuid.uuid4().hex)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+        try:
+            get_exporter().export(trace.spans)
+        except Exception as e:
+            print(f"Trace export error: {e}")
+
+
+class JsonLinesExporter:
+    """Appends one JSON object per span to settings.TRACING_FILE."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def export(self, spans: list[dict]):
+        if not spans:
+            return
+        lines = ''.join(json.dumps(record, ensure_ascii=False, default=str) + '\n' for record in spans)
+        with self._lock, open(settings.TRACING_FILE, 'a', encoding='utf-8') as file:
+            file.write(lines)
+
+_exporter = None
+_exporter_path = None
+
+def get_exporter():
+    global _exporter, _exporter_path
+    if _exporter is None or _exporter_path != settings.TRACING_EXPORTER:
+        _exporter = import_string(settings.TRACING_EXPORTER)()
+        _exporter_path = settings.TRACING_EXPORTER
+    return _exporter
@@ -1,19 +1,58 @@
-from google.cloud import vision
-from google.oauth2 import service_account
+from . import metrics, tracing
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
 import os
 import base64
+import contextvars
 import json
+import threading
+
+# per call limits of the Vision API: images in batch_annotate_images, pages in batch_annotate_files
+VISION_MAX_IMAGES_PER_CALL = 16
+VISION_MAX_PAGES_PER_CALL = 5
+
+_vision_client = None
+_vision_client_pid = None
+_vision_client_lock = threading.Lock()
+
+def get_vision_client():
+    # the SDK (grpc, protobuf) is imported on first use, and the client is created again after a fork
+    global _vision_client, _vision_client_pid
+    from google.cloud import vision
+
+    with _vision_client_lock:
+        if _vision_client is None or _vision_client_pid != os.getpid():
+            if settings.GOOGLE_VISION_API_ENDPOINT:
+                from google.auth.credentials import AnonymousCredentials
+
+                _vision_client = vision.ImageAnnotatorClient(
+                    credentials=AnonymousCredentials(),
+                    transport='rest',
+                    client_options={'api_endpoint': settings.GOOGLE_VISION_API_ENDPOINT},
+                )
+            else:
+                _vision_client = vision.ImageAnnotatorClient(credentials=get_google_api_credentials())
+            _vision_client_pid = os.getpid()
+        return _vision_client
 
 def extract_text_from_image(image_file):
-    
+    from google.cloud import vision
+
     # Instantiates a client
-    google_client = vision.ImageAnnotatorClient(credentials=get_google_api_credentials())
+    with tracing.span('ocr.client'):
+        google_client = get_vision_client()
     
     content = image_file.read()
     image = vision.Image(content=content)
 
     # Performs text detection on the image
-    response = google_client.text_detection(image=image)
+    with tracing.span('ocr.text_detection', size=len(content)), metrics.STAGE_SECONDS.time(stage='ocr'):
+        try:
+            response = google_client.text_detection(image=image)
+        except Exception:
+            metrics.UPSTREAM_REQUESTS.inc(service='vision', task='ocr', outcome='error')
+            raise
+    metrics.UPSTREAM_REQUESTS.inc(service='vision', task='ocr', outcome='error' if response.error.message else 'success')
     texts = response.text_annotations
 
     if not texts:
@@ -28,11 +67,139 @@ def extract_text_from_image(image_file):
     else:
         return texts[0].description
     
+def is_pdf(uploaded_file) -> bool:
+    return uploaded_file.content_type == 'application/pdf' or uploaded_file.name.lower().endswith('.pdf')
+
+def extract_text_from_files(uploaded_files, max_length: int | None = None):
+    """
+    OCR several images and PDFs as one job. Images are sent in batch_annotate_images calls, PDFs in
+    batch_annotate_files calls of up to 5 pages, with at most settings.OCR_MAX_CONCURRENCY calls at a time.
+    The texts are joined in upload order, and in page order within a PDF.
+    With max_length, files and pages after the first max_length characters are not OCR'd (calls already
+    running are left to finish, but their text is dropped), since the caller would trim them anyway.
+    """
+    with tracing.span('ocr.client'):
+        google_client = get_vision_client()
+
+    contents = [(uploaded_file.read(), is_pdf(uploaded_file)) for uploaded_file in uploaded_files]
+    images = [(index, content) for index, (content, pdf) in enumerate(contents) if not pdf]
+    # (file index, page number) -> text
+    texts = {}
+
+    def submit(executor, function, *args):
+        # a fresh copy per call: a context can only be entered by one thread at a time
+        return executor.submit(contextvars.copy_context().run, function, google_client, *args)
+
+    def join_texts(before_index=None):
+        return '\n'.join(text.strip() for (index, page), text in sorted(texts.items())
+                         if page <= settings.MAX_UPLOAD_PAGES and text.strip()
+                         and (before_index is None or index < before_index))
+
+    def is_enough(before_index):
+        # only the files before before_index are complete, so only their text is known to come first
+        return max_length is not None and len(join_texts(before_index)) >= max_length
+
+    with tracing.span('ocr.batch', files=len(contents)), metrics.STAGE_SECONDS.time(stage='ocr'), \
+            ThreadPoolExecutor(max_workers=settings.OCR_MAX_CONCURRENCY) as executor:
+        image_calls = {}
+        for i in range(0, len(images), VISION_MAX_IMAGES_PER_CALL):
+            batch = images[i:i + VISION_MAX_IMAGES_PER_CALL]
+            call = submit(executor, _annotate_images, batch)
+            image_calls.update((index, call) for index, _ in batch)
+        # without page numbers the API reads the first 5 pages and tells how many the PDF has
+        pdf_calls = {index: submit(executor, _annotate_pdf, index, content, [])
+                     for index, (content, pdf) in enumerate(contents) if pdf}
+
+        last_index = len(contents)
+        for index, (content, pdf) in enumerate(contents):
+            if is_enough(index):
+                last_index = index
+                break
+            if not pdf:
+                texts.update(image_calls[index].result())
+                continue
+
+            pdf_texts, total_pages = pdf_calls[index].result()
+            texts.update(pdf_texts)
+            last_page = min(total_pages, settings.MAX_UPLOAD_PAGES)
+            remaining_calls = []
+            if not is_enough(index + 1):
+                for first_page in range(VISION_MAX_PAGES_PER_CALL + 1, last_page + 1, VISION_MAX_PAGES_PER_CALL):
+                    pages = list(range(first_page, min(first_page + VISION_MAX_PAGES_PER_CALL, last_page + 1)))
+                    remaining_calls.append(submit(executor, _annotate_pdf, index, content, pages))
+            for call in remaining_calls:
+                texts.update(call.result()[0])
+                if is_enough(index + 1):
+                    break
+        # calls that haven't started yet aren't needed any more
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    text = join_texts(last_index)
+    if not text:
+        print("ERROR :: No text detected for images")
+        return None
+    return text
+
+def _annotate_images(google_client, images: list) -> dict:
+    from google.cloud import vision
+
+    requests = [
+        vision.AnnotateImageRequest(image=vision.Image(content=content),
+                                    features=[vision.Feature(type_=vision.Feature.Type.TEXT_DETECTION)])
+        for _, content in images
+    ]
+    with tracing.span('ocr.batch_annotate_images', images=len(requests)):
+        try:
+            response = google_client.batch_annotate_images(requests=requests)
+        except Exception:
+            metrics.UPSTREAM_REQUESTS.inc(service='vision', task='ocr', outcome='error')
+            raise
+
+    texts = {}
+    for (index, _), image_response in zip(images, response.responses):
+        _check_vision_error(image_response)
+        if image_response.text_annotations:
+            texts[(index, 1)] = image_response.text_annotations[0].description
+    return texts
+
+def _annotate_pdf(google_client, index: int, content: bytes, pages: list[int]) -> tuple[dict, int]:
+    from google.cloud import vision
+
+    request = vision.AnnotateFileRequest(
+        input_config=vision.InputConfig(content=content, mime_type='application/pdf'),
+        features=[vision.Feature(type_=vision.Feature.Type.DOCUMENT_TEXT_DETECTION)],
+        pages=pages,
+    )
+    with tracing.span('ocr.batch_annotate_files', pages=len(pages)):
+        try:
+            response = google_client.batch_annotate_files(requests=[request])
+        except Exception:
+            metrics.UPSTREAM_REQUESTS.inc(service='vision', task='ocr', outcome='error')
+            raise
+
+    file_response = response.responses[0]
+    texts = {}
+    for page, page_response in enumerate(file_response.responses, start=pages[0] if pages else 1):
+        _check_vision_error(page_response)
+        if page_response.full_text_annotation.text:
+            texts[(index, page_response.context.page_number or page)] = page_response.full_text_annotation.text
+    return texts, file_response.total_pages
+
+def _check_vision_error(response):
+    metrics.UPSTREAM_REQUESTS.inc(service='vision', task='ocr', outcome='error' if response.error.message else 'success')
+    if response.error.message:
+        raise Exception(
+            f'{response.error.message}\nFor more info on error messages, check: '
+            'https://cloud.google.com/apis/design/errors'
+        )
+
 # NOTE:: THE CREDENTIAL IN THE ENV VARIABLE IS ACTUALLY FROM THE CONTENT OF API-KEY JSON FILE ENCODED IN BASE64
 def get_google_api_credentials():
     base64_encoded_key = os.environ.get('GOOGLE_VISION_CREDENTIALS_JSON_BASE64')
 
     if base64_encoded_key:
+        from google.oauth2 import service_account
+
         json_data = base64.b64decode(base64_encoded_key)
         service_account_info = json.loads(json_data)
 
@@ -1,13 +1,41 @@
 from .cache import CACHE_STORE
 from .JsonResponse import JsonResponse
-from . import services, utils
+from . import admission, analysis_jobs, batcher, cluster, fragments, metrics, services, tracing, utils
 from django.shortcuts import render
 from django import forms
 from django.conf import settings
-from django.http import HttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import (HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, HttpResponseNotAllowed,
+                         HttpResponseNotFound, HttpResponseNotModified, StreamingHttpResponse)
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.views.decorators.csrf import csrf_exempt
 from pydantic import ValidationError
+import asyncio
+import gzip
+import hashlib
+import hmac
+import json
+import re
 import time
 
+ACCEPTS_GZIP = re.compile(r'\bgzip\b')
+
+
+class MultipleFileInput(forms.FileInput):
+    allow_multiple_selected = True
+
+class MultipleFileField(forms.FileField):
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('widget', MultipleFileInput())
+        super().__init__(*args, **kwargs)
+
+    def clean(self, data, initial=None):
+        files = data if isinstance(data, (list, tuple)) else [data] if data else []
+        if len(files) > settings.MAX_UPLOAD_FILES:
+            raise forms.ValidationError(f'Upload at most {settings.MAX_UPLOAD_FILES} files.')
+        return [super(MultipleFileField, self).clean(file, initial) for file in files]
+
 
 class InputForm(forms.Form):
     jp_text = forms.CharField(
@@ -21,41 +49,251 @@ class InputForm(forms.Form):
             }            
         )
     )
-    image_file = forms.FileField(
-        label='Upload an image with Japanese text. Larger files may take longer to process.', 
+    image_file = MultipleFileField(
+        label='Upload images or PDFs with Japanese text. Larger files may take longer to process.', 
         required = False,
-        widget=forms.FileInput(
+        widget=MultipleFileInput(
             attrs={
-                "accept": "image/*",
+                "accept": "image/*,application/pdf",
                 "class": "form-control"
             }
         )
     )
 
+def load_analysis(key: str) -> analysis_jobs.AnalysisResult:
+    """The cached analysis of key, from the owner node if there is one, or else a new one."""
+    with tracing.span('cache.lookup', cache='analysis'):
+        cached = CACHE_STORE.has_analysis(key)
+    if not cached and cluster.PEER_CACHE.enabled:
+        with tracing.span('cache.peer'):
+            cached = cluster.PEER_CACHE.fill_from_owner(key) and CACHE_STORE.has_analysis(key)
+
+    if cached:
+        metrics.CACHE_LOOKUPS.inc(cache='analysis', result='hit')
+        return analysis_jobs.AnalysisResult(CACHE_STORE.get_analysis(key), False)
+
+    metrics.CACHE_LOOKUPS.inc(cache='analysis', result='miss')
+    # returns empty JSON if API response is invalid
+    return analysis_jobs.analyze(key)
+
+def revalidate_client_copy(request, key: str, variant: str = '') -> HttpResponse | None:
+    """
+    304 if the server has no analysis of key but the browser revalidates one it got for the current
+    CLIENT_CACHE_VERSION, e.g. after a restart or eviction. Its copy is still good, so there's no need to
+    analyze the text again just to compare ETags.
+    """
+    etag = request.headers.get('If-None-Match', '').strip()
+    if not etag or CACHE_STORE.has_analysis(key) or not get_analysis_etag_pattern(variant).fullmatch(etag):
+        return None
+    response = HttpResponseNotModified()
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
 def analyze(request):
     key = str(request.GET.get('key', '')).strip()
-    json_result = ''
+    response = revalidate_client_copy(request, key)
+    if response:
+        return response
+    result = load_analysis(key)
+    json_result = result.analysis
+    if result.retry_after:
+        # translation only for now, the page can ask again later
+        response = HttpResponse(json_result, content_type='application/json', status=503)
+        response['Retry-After'] = str(result.retry_after)
+        return response
+
+    if not json_result or json_result == '{}':
+        return HttpResponse(json_result, content_type='application/json')
+
+    # browsers keep analyses in localStorage and revalidate them with If-None-Match
+    etag = get_analysis_etag(json_result)
+    response = get_conditional_response(request, etag=etag) or HttpResponse(json_result, content_type='application/json')
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+def analysis_fragment(request):
+    """The analysis of key as HTML to insert in the page (see fragments.py), or 204 if there is none."""
+    key = str(request.GET.get('key', '')).strip()
+    response = revalidate_client_copy(request, key, 'html')
+    if response:
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+    result = load_analysis(key)
+    if result.retry_after:
+        response = HttpResponse(status=503)
+        response['Retry-After'] = str(result.retry_after)
+        return response
+
+    try:
+        fragment = fragments.get_fragment(key, result.analysis)
+    except ValidationError:
+        return HttpResponse(status=204)
+
+    # weak, since the same HTML is sent gzipped or not
+    etag = 'W/' + get_analysis_etag(result.analysis, 'html')
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        if ACCEPTS_GZIP.search(request.headers.get('Accept-Encoding', '')):
+            response = HttpResponse(fragment, content_type='text/html; charset=utf-8')
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(gzip.decompress(fragment), content_type='text/html; charset=utf-8')
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
+
+
+def get_analysis_etag(json_result: str, variant: str = '') -> str:
+    digest = hashlib.blake2b(json_result.encode('utf-8'), digest_size=8).hexdigest()
+    if variant:
+        digest += f'-{variant}'
+    return f'"{settings.CLIENT_CACHE_VERSION}-{digest}"'
+
+def get_analysis_etag_pattern(variant: str = '') -> re.Pattern:
+    """Matches the ETags get_analysis_etag gives for the current CLIENT_CACHE_VERSION, weak or not."""
+    suffix = f'-{re.escape(variant)}' if variant else ''
+    return re.compile(rf'(W/)?"{re.escape(settings.CLIENT_CACHE_VERSION)}-[0-9a-f]{{16}}{suffix}"')
+
+
+@csrf_exempt
+def peer_cache(request, key):
+    """Internal endpoint for cluster.PEER_CACHE: GET returns this node's entry for key, PUT stores one."""
+    token = request.headers.get(cluster.PEER_TOKEN_HEADER, '').encode('utf-8')
+    if not cluster.PEER_CACHE.enabled or not settings.CACHE_PEER_SECRET \
+            or not hmac.compare_digest(token, settings.CACHE_PEER_SECRET.encode('utf-8')):
+        return HttpResponseNotFound()
+
+    if request.method == 'GET':
+        entry = cluster.get_local_entry(key)
+        if entry is None:
+            return HttpResponseNotFound()
+        return HttpResponse(json.dumps(entry, ensure_ascii=False), content_type='application/json')
+
+    if request.method == 'PUT':
+        try:
+            entry = json.loads(request.body)
+        except ValueError:
+            return HttpResponseBadRequest()
+        if not cluster.store_entry(key, entry):
+            return HttpResponseBadRequest()
+        return HttpResponse(status=204)
+
+    return HttpResponseNotAllowed(['GET', 'PUT'])
+
+
+async def analysis_events(request):
+    """
+    Server-sent events for the analysis of key: one 'analysis' event (with the ETag as its id) when it is
+    ready, or a 'failed' event. The analysis runs in a background job that outlives the connection, so a
+    client that reconnects (EventSource does so by itself) waits for the same job instead of starting over.
+    """
+    if not settings.ANALYSIS_EVENTS or not isinstance(request, ASGIRequest):
+        # the page falls back to fetching /analyze/
+        return HttpResponseNotFound()
+
+    key = str(request.GET.get('key', '')).strip()
+    response = StreamingHttpResponse(analysis_event_stream(key), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # don't let a reverse proxy buffer the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+async def analysis_event_stream(key: str):
+    subscribed_at = time.time()
+    yield 'retry: 2000\n\n'
 
-    if CACHE_STORE.has_analysis(key):
-        json_result = CACHE_STORE.get_analysis(key)        
+    result = analysis_jobs.get_result(key)
+    if result is None and cluster.PEER_CACHE.enabled:
+        await asyncio.to_thread(cluster.PEER_CACHE.fill_from_owner, key)
+        result = analysis_jobs.get_result(key)
+    metrics.CACHE_LOOKUPS.inc(cache='analysis', result='miss' if result is None else 'hit')
+
+    job = None
+    deadline = time.monotonic() + settings.ANALYSIS_JOB_TIMEOUT
+    last_message = time.monotonic()
+    while result is None:
+        if job is None:
+            job = analysis_jobs.start(key)
+            if job is None and not analysis_jobs.is_claimed(key) and not CACHE_STORE.has_translation(key):
+                # unknown key, or known only to another worker
+                result = analysis_jobs.AnalysisResult('{}', True)
+                break
+
+        if job is not None:
+            done, _ = await asyncio.wait([asyncio.wrap_future(job)], timeout=settings.ANALYSIS_EVENTS_KEEPALIVE)
+            if done:
+                result = job.result()
+                break
+        else:
+            # running in another worker
+            await asyncio.sleep(settings.ANALYSIS_EVENTS_POLL_INTERVAL)
+            result = analysis_jobs.get_result(key, since=subscribed_at)
+            if result is not None:
+                break
+
+        if time.monotonic() > deadline:
+            result = analysis_jobs.AnalysisResult('{}', True)
+            break
+        if time.monotonic() - last_message >= settings.ANALYSIS_EVENTS_KEEPALIVE:
+            last_message = time.monotonic()
+            yield ': keep-alive\n\n'
+
+    if result.retry_after:
+        yield format_event('failed', json.dumps({'retry_after': result.retry_after}))
+    elif result.failed:
+        yield format_event('failed', '{}')
     else:
-        jp_text = CACHE_STORE.get_original_text(key)
-        json_result = services.openAI_analyze(jp_text) 
-
-        try: 
-            JsonResponse.model_validate_json(json_result) 
-            CACHE_STORE.add_analysis(key, json_result)  
-        except ValidationError as e:
-            if settings.DEBUG:
-                print(json_result)
-                print(e)
-            # return empty JSON if API response is invalid
-            json_result = '{}'
-                 
-    return HttpResponse(json_result, content_type='application/json')
+        yield format_event('analysis', result.analysis, get_analysis_etag(result.analysis))
+
+
+def format_event(event: str, data: str, event_id: str | None = None) -> str:
+    lines = [f'event: {event}']
+    if event_id:
+        lines.append(f'id: {event_id}')
+    lines.extend(f'data: {line}' for line in data.splitlines())
+    return '\n'.join(lines) + '\n\n'
 
 
     
+def metrics_view(request):
+    if settings.METRICS_TOKEN and request.headers.get('Authorization') != f'Bearer {settings.METRICS_TOKEN}':
+        return HttpResponseForbidden()
+    # memory_usage() walks the whole cache, so it is only measured when metrics are scraped
+    body = metrics.REGISTRY.render() + metrics.render_cache_memory(CACHE_STORE.memory_usage())
+    return HttpResponse(body, content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def translate_and_analyze(jp_text: str) -> str:
+    """Translate and analyze with one LLM call, filling both caches. Falls back to translation only."""
+    route = services.select_route(jp_text, 'analyze')
+    json_result = services.openAI_translate_and_analyze(jp_text, route)
+
+    try:
+        with tracing.span('validation'), metrics.STAGE_SECONDS.time(stage='validation'):
+            analysis = JsonResponse.model_validate_json(json_result)
+    except ValidationError as e:
+        services.record_validation_failure(route, 'analyze', jp_text)
+        if settings.DEBUG:
+            print(json_result)
+            print(e)
+        analysis = None
+
+    if analysis and analysis.english_translation:
+        result = analysis.english_translation
+        key = CACHE_STORE.add_translation(jp_text=jp_text, en_text=result)
+        CACHE_STORE.add_analysis(key, json_result)
+    else:
+        # the page can still fetch the analysis separately
+        result = services.openAI_translate(jp_text)
+        CACHE_STORE.add_translation(jp_text=jp_text, en_text=result)
+
+    return result
+
+
 def index(request):
     form = InputForm()
         
@@ -72,25 +310,32 @@ def index(request):
 
 def translate_only(request):
         
-        form = InputForm(request.POST, request.FILES)
+        # reading request.POST/FILES is where the upload is received and buffered
+        with tracing.span('upload'):
+            form = InputForm(request.POST, request.FILES)
+            form_valid = form.is_valid()
         error_message = ''
         time_taken = 'Time Taken:  '
 
-        if not form.is_valid():
+        if not form_valid:
             error_message = 'Invalid input. Please enter Japanese text only.'
             return render(request, 'index.html', {'form': form, 'error_message': error_message})
         
         # Check if both text and image are empty
-        uploaded_file = form.files['image_file'] if form.files else None
+        uploaded_files = form.cleaned_data.get('image_file') or []
         jp_text = form.cleaned_data.get('jp_text', '')
         
-        if not jp_text and not uploaded_file:
+        if not jp_text and not uploaded_files:
             error_message = 'Please enter Japanese text or upload an image.'
             return render(request, 'index.html', {'form': form, 'error_message': error_message})
         
-        if uploaded_file:
+        if uploaded_files:
             start_time = time.time()        
-            jp_text = utils.extract_text_from_image(uploaded_file)
+            if len(uploaded_files) == 1 and not utils.is_pdf(uploaded_files[0]):
+                jp_text = utils.extract_text_from_image(uploaded_files[0])
+            else:
+                # all pages in one batch, merged in page order
+                jp_text = utils.extract_text_from_files(uploaded_files, max_length=settings.MAX_TEXT_LENGTH)
             end_time = time.time()
             time_taken += f"{end_time - start_time:.2f} seconds (OCR), "
             if not jp_text:
@@ -101,16 +346,41 @@ def translate_only(request):
             jp_text = jp_text[:settings.MAX_TEXT_LENGTH]         
             error_message = "**Text in image has exceeded the allowed limit. Extra characters are trimmed."       
         
-        key = CACHE_STORE.get_key(jp_text)
-        if CACHE_STORE.has_translation(key):
+        with tracing.span('cache.lookup', cache='translation'):
+            key = CACHE_STORE.get_key(jp_text)
+            if not CACHE_STORE.has_translation(key):
+                # e.g. the same page OCR'd again with slightly different output
+                key = CACHE_STORE.find_similar_key(jp_text) or key
+            cached = CACHE_STORE.has_translation(key)
+        if not cached and cluster.PEER_CACHE.enabled:
+            with tracing.span('cache.peer'):
+                cached = cluster.PEER_CACHE.fill_from_owner(key)
+
+        if cached:
+            metrics.CACHE_LOOKUPS.inc(cache='translation', result='hit')
             result = CACHE_STORE.get_translation(key)
             time_taken += '0 seconds (translation)'
         else:
-            start_time = time.time()        
-            result = services.openAI_translate(jp_text)    
+            metrics.CACHE_LOOKUPS.inc(cache='translation', result='miss')
+            start_time = time.time()
+            try:
+                if settings.COMBINED_TRANSLATION_ANALYSIS:
+                    with admission.ADMISSION.slot('translate'):
+                        result = translate_and_analyze(jp_text)
+                else:
+                    # takes one slot per upstream call, however many requests share it
+                    result = batcher.BATCHER.translate(jp_text)
+                    CACHE_STORE.add_translation(jp_text=jp_text, en_text=result)
+            except admission.Overloaded as e:
+                error_message = f'The server is busy. Please try again in {e.retry_after} seconds.'
+                response = render(request, 'index.html', {'form': form, 'error_message': error_message}, status=503)
+                response['Retry-After'] = str(e.retry_after)
+                return response
             end_time = time.time()
-            time_taken += f"{end_time - start_time:.2f} seconds (translation)"
-            CACHE_STORE.add_translation(jp_text=jp_text, en_text=result)
+            if result:
+                cluster.PEER_CACHE.publish(key)
+            mode = 'translation and analysis' if settings.COMBINED_TRANSLATION_ANALYSIS else 'translation'
+            time_taken += f"{end_time - start_time:.2f} seconds ({mode})"
 
         if not result:
             error_message = 'Unable to process request. Please try again later.'
@@ -121,7 +391,12 @@ def translate_only(request):
             'error_message': error_message,
             'input_text': jp_text,
             'key' : key,
-            'translation': result
+            'translation': result,
+            'client_cache_version': settings.CLIENT_CACHE_VERSION,
+            'client_cache_max_entries': settings.CLIENT_CACHE_MAX_ENTRIES,
+            'client_cache_max_bytes': settings.CLIENT_CACHE_MAX_BYTES,
+            'analysis_fragments': settings.ANALYSIS_FRAGMENTS,
+            'analysis_events': settings.ANALYSIS_EVENTS,
         }
 
         if settings.DEBUG: